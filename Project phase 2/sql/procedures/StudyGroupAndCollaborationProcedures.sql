@@ -30,6 +30,9 @@ CREATE INDEX idx_jr_status_reqdate_group ON Join_Request(join_status, request_da
 -- Chat_Message: chat history lookup by group and sent_time.
 CREATE INDEX idx_chat_group_time ON Chat_Message(group_id, sent_time);
 
+-- Chat_Message: "messages after id X" delta reads are a range scan on (group_id, message_id)
+CREATE INDEX idx_chat_group_msg ON Chat_Message(group_id, message_id);
+
 -- Message_Request: covering index for inbox filtering, sorting, and projection.
 CREATE INDEX idx_mr_target_created ON Message_Request(target_user_id, created_at, request_id, requester_user_id, request_status);
 
@@ -40,6 +43,10 @@ CREATE INDEX idx_courses_code_name
 CREATE INDEX idx_dm_convo_time
   ON Direct_Message(conversation_id, sent_at);
 
+-- keyset ("before message_id") paging through DM history
+CREATE INDEX idx_dm_convo_msg
+  ON Direct_Message(conversation_id, message_id);
+
 -- Support lookups by (group_id, user_id) for membership & owner checks
 CREATE INDEX idx_gm_group_user
   ON Group_Member(group_id, user_id);
@@ -52,6 +59,22 @@ CREATE INDEX idx_jr_group_user_status
 CREATE INDEX idx_dc_users
   ON Direct_Conversation(user_one_id, user_two_id);
 
+-- FULLTEXT indexes for /search (SearchAllContent): MATCH ... AGAINST
+-- instead of unindexed LIKE '%q%'. The ngram parser tokenizes into
+-- ngram_token_size-character pieces (default 2), so code fragments like
+-- "cos4" and words without spaces still match.
+CREATE FULLTEXT INDEX ft_courses_code_name
+  ON Courses(course_code, course_name) WITH PARSER ngram;
+
+CREATE FULLTEXT INDEX ft_quiz_title_desc
+  ON Quiz(title, description) WITH PARSER ngram;
+
+CREATE FULLTEXT INDEX ft_flashcardset_title_desc
+  ON FlashcardSet(title, description) WITH PARSER ngram;
+
+CREATE FULLTEXT INDEX ft_resource_title_desc
+  ON Resource(title, description) WITH PARSER ngram;
+
 /* 
    GROUP SUMMARY TABLE
    Stores precomputed aggregates to improve performance for
@@ -62,9 +85,21 @@ CREATE TABLE `Group_Summary` (
   `group_id` INT NOT NULL,                      -- Matches Study_Group.group_id
   `member_count` INT NOT NULL DEFAULT 0,        -- Cached total members
   `last_session` DATE NULL,                     -- Most recent session date
+  `message_count` INT NOT NULL DEFAULT 0,       -- Chat messages ever posted (unread = this - read_count)
+  `last_message_id` INT NULL,                   -- Latest Chat_Message in the group
+  `course_id` INT NULL,                         -- Copied from Study_Group (public group paging)
+  `is_private` BOOLEAN NOT NULL DEFAULT FALSE,  -- Copied from Study_Group
+  `max_members` INT NULL,                       -- Copied from Study_Group
+  `session_key` DATE AS (COALESCE(`last_session`, '1000-01-01')) STORED,  -- last_session, never-met groups sort last
+  `has_space` BOOLEAN AS (`max_members` IS NULL OR `member_count` < `max_members`) STORED,
   `updated_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
                 ON UPDATE CURRENT_TIMESTAMP,    -- Auto-updated timestamp
   PRIMARY KEY (`group_id`),
+  -- keyset pages of a course's public groups (GetPublicGroupsPage): same
+  -- (course_id, is_private) prefix as idx_group_course_priv, then the sort key
+  KEY `idx_gs_public_page` (`course_id`, `is_private`, `session_key`, `member_count`, `group_id`),
+  -- the same, for groups with a free seat (?has_space=1)
+  KEY `idx_gs_public_open` (`course_id`, `is_private`, `has_space`, `session_key`, `member_count`, `group_id`),
   CONSTRAINT `fk_gs_group`
     FOREIGN KEY (`group_id`)
     REFERENCES `Study_Group`(`group_id`)
@@ -76,7 +111,8 @@ CREATE TABLE `Group_Summary` (
    Seeds Group_Summary with existing data
 */
 
-INSERT INTO Group_Summary (group_id, member_count, last_session)
+INSERT INTO Group_Summary (group_id, member_count, last_session, message_count, last_message_id,
+                           course_id, is_private, max_members)
 SELECT
   g.group_id,
   COALESCE((
@@ -88,11 +124,64 @@ SELECT
     SELECT MAX(s.session_date)
     FROM Study_Session s
     WHERE s.group_id = g.group_id
-  ) AS last_session
+  ) AS last_session,
+  (
+    SELECT COUNT(*)
+    FROM Chat_Message c
+    WHERE c.group_id = g.group_id
+  ) AS message_count,
+  (
+    SELECT MAX(c.message_id)
+    FROM Chat_Message c
+    WHERE c.group_id = g.group_id
+  ) AS last_message_id,
+  g.course_id,
+  g.is_private,
+  g.max_members
 FROM Study_Group g
 ON DUPLICATE KEY UPDATE
   member_count = VALUES(member_count),
-  last_session = VALUES(last_session);
+  last_session = VALUES(last_session),
+  message_count = VALUES(message_count),
+  last_message_id = VALUES(last_message_id),
+  course_id = VALUES(course_id),
+  is_private = VALUES(is_private),
+  max_members = VALUES(max_members);
+
+
+/*
+   CHAT READ MARKERS
+   One row per group member: how many of the group's messages they have
+   read. Unread = Group_Summary.message_count - read_count, so posting a
+   message touches one summary row instead of one row per member.
+ */
+
+CREATE TABLE `Chat_Read_Marker` (
+  `group_id` INT NOT NULL,
+  `user_id` INT NOT NULL,
+  `read_count` INT NOT NULL DEFAULT 0,          -- Group_Summary.message_count when last read
+  `last_read_message_id` INT NULL,              -- Newest message the member has seen
+  `updated_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+                ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (`user_id`, `group_id`),
+  CONSTRAINT `fk_crm_group`
+    FOREIGN KEY (`group_id`)
+    REFERENCES `Study_Group`(`group_id`)
+    ON DELETE CASCADE,
+  CONSTRAINT `fk_crm_user`
+    FOREIGN KEY (`user_id`)
+    REFERENCES `Users`(`user_id`)
+    ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+-- existing members start with everything read
+INSERT INTO Chat_Read_Marker (group_id, user_id, read_count, last_read_message_id)
+SELECT gm.group_id, gm.user_id, gs.message_count, gs.last_message_id
+FROM Group_Member gm
+JOIN Group_Summary gs ON gs.group_id = gm.group_id
+ON DUPLICATE KEY UPDATE
+  read_count = VALUES(read_count),
+  last_read_message_id = VALUES(last_read_message_id);
 
 
 /* 
@@ -102,6 +191,38 @@ ON DUPLICATE KEY UPDATE
 
 DELIMITER //
 
+-- A new group gets its summary row up front, with the columns public
+-- group paging filters on.
+DROP TRIGGER IF EXISTS sg_after_insert//
+CREATE TRIGGER sg_after_insert
+AFTER INSERT ON Study_Group
+FOR EACH ROW
+BEGIN
+  INSERT INTO Group_Summary (group_id, course_id, is_private, max_members)
+  VALUES (NEW.group_id, NEW.course_id, NEW.is_private, NEW.max_members)
+  ON DUPLICATE KEY UPDATE
+    course_id = VALUES(course_id),
+    is_private = VALUES(is_private),
+    max_members = VALUES(max_members);
+END//
+
+-- Keep the copied columns in step when a group is edited.
+DROP TRIGGER IF EXISTS sg_after_update//
+CREATE TRIGGER sg_after_update
+AFTER UPDATE ON Study_Group
+FOR EACH ROW
+BEGIN
+  IF NOT (NEW.course_id <=> OLD.course_id)
+     OR NOT (NEW.is_private <=> OLD.is_private)
+     OR NOT (NEW.max_members <=> OLD.max_members) THEN
+    UPDATE Group_Summary
+    SET course_id = NEW.course_id,
+        is_private = NEW.is_private,
+        max_members = NEW.max_members
+    WHERE group_id = NEW.group_id;
+  END IF;
+END//
+
 -- When a member joins a group, increment count (insert if new)
 DROP TRIGGER IF EXISTS gm_after_insert//
 CREATE TRIGGER gm_after_insert
@@ -111,6 +232,15 @@ BEGIN
   INSERT INTO Group_Summary (group_id, member_count)
   VALUES (NEW.group_id, 1)
   ON DUPLICATE KEY UPDATE member_count = member_count + 1;
+
+  -- new members start with the existing history read
+  INSERT INTO Chat_Read_Marker (group_id, user_id, read_count, last_read_message_id)
+  SELECT NEW.group_id, NEW.user_id, gs.message_count, gs.last_message_id
+  FROM Group_Summary gs
+  WHERE gs.group_id = NEW.group_id
+  ON DUPLICATE KEY UPDATE
+    read_count = VALUES(read_count),
+    last_read_message_id = VALUES(last_read_message_id);
 END//
 
 -- When a member leaves or is removed, decrement count safely.
@@ -122,6 +252,10 @@ BEGIN
   UPDATE Group_Summary
   SET member_count = GREATEST(member_count - 1, 0)
   WHERE group_id = OLD.group_id;
+
+  DELETE FROM Chat_Read_Marker
+  WHERE user_id = OLD.user_id
+    AND group_id = OLD.group_id;
 END//
 
 -- When a new study session is added, update the group’s last_session date.
@@ -137,8 +271,165 @@ BEGIN
                       NEW.session_date, last_session);
 END//
 
+-- When a chat message is posted, count it (unread counts derive from this).
+-- Posting counts as reading the group up to the new message.
+DROP TRIGGER IF EXISTS chat_after_insert//
+CREATE TRIGGER chat_after_insert
+AFTER INSERT ON Chat_Message
+FOR EACH ROW
+BEGIN
+  INSERT INTO Group_Summary (group_id, message_count, last_message_id)
+  VALUES (NEW.group_id, 1, NEW.message_id)
+  ON DUPLICATE KEY UPDATE
+    message_count = message_count + 1,
+    last_message_id = GREATEST(COALESCE(last_message_id, 0), NEW.message_id);
+
+  UPDATE Chat_Read_Marker crm
+  JOIN Group_Summary gs ON gs.group_id = crm.group_id
+  SET crm.read_count = gs.message_count,
+      crm.last_read_message_id = gs.last_message_id
+  WHERE crm.user_id = NEW.user_id
+    AND crm.group_id = NEW.group_id;
+END//
+
+DELIMITER ;
+
+
+/*
+   DM INBOX TABLE
+   One row per (participant, conversation) holding the latest message and
+   the participant's unread count, so the inbox is a range scan on
+   (user_id, last_sent_at) instead of a latest-message lookup per conversation.
+ */
+
+CREATE TABLE `DM_Inbox` (
+  `user_id` INT NOT NULL,                       -- Participant this row belongs to
+  `conversation_id` INT NOT NULL,               -- Matches Direct_Conversation.conversation_id
+  `other_user_id` INT NOT NULL,                 -- The other participant
+  `last_message_id` INT NULL,                   -- Latest Direct_Message in the conversation
+  `last_preview` VARCHAR(255) NULL,             -- First 255 chars of that message
+  `last_sent_at` DATETIME NULL,                 -- When it was sent (NULL: no messages yet)
+  `unread_count` INT NOT NULL DEFAULT 0,        -- Messages from the other participant not yet read
+  `last_read_message_id` INT NULL,              -- Newest message this participant has read
+  PRIMARY KEY (`user_id`, `conversation_id`),
+  KEY `idx_inbox_user_sent` (`user_id`, `last_sent_at`, `conversation_id`),
+  CONSTRAINT `fk_inbox_conversation`
+    FOREIGN KEY (`conversation_id`)
+    REFERENCES `Direct_Conversation`(`conversation_id`)
+    ON DELETE CASCADE,
+  CONSTRAINT `fk_inbox_user`
+    FOREIGN KEY (`user_id`)
+    REFERENCES `Users`(`user_id`)
+    ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+
+/*
+   Seeds DM_Inbox with existing conversations (existing messages count as read)
+*/
+
+INSERT INTO DM_Inbox (user_id, conversation_id, other_user_id,
+                      last_message_id, last_preview, last_sent_at, unread_count,
+                      last_read_message_id)
+SELECT
+  p.user_id,
+  p.conversation_id,
+  p.other_user_id,
+  m.message_id,
+  LEFT(m.content, 255),
+  m.sent_at,
+  0,
+  m.message_id
+FROM (
+  SELECT conversation_id, user_one_id AS user_id, user_two_id AS other_user_id
+  FROM Direct_Conversation
+  UNION ALL
+  SELECT conversation_id, user_two_id, user_one_id
+  FROM Direct_Conversation
+) AS p
+LEFT JOIN Direct_Message m
+  ON m.message_id = (
+        SELECT MAX(dm.message_id)
+        FROM Direct_Message dm
+        WHERE dm.conversation_id = p.conversation_id
+  )
+ON DUPLICATE KEY UPDATE
+  last_message_id = VALUES(last_message_id),
+  last_preview = VALUES(last_preview),
+  last_sent_at = VALUES(last_sent_at);
+
+
+/*
+   AUTO-MAINTAINS
+   Keeps DM_Inbox in sync as conversations start and messages are sent.
+ */
+
+DELIMITER //
+
+-- New conversation: one inbox row per participant
+DROP TRIGGER IF EXISTS dc_after_insert//
+CREATE TRIGGER dc_after_insert
+AFTER INSERT ON Direct_Conversation
+FOR EACH ROW
+BEGIN
+  INSERT IGNORE INTO DM_Inbox (user_id, conversation_id, other_user_id)
+  VALUES (NEW.user_one_id, NEW.conversation_id, NEW.user_two_id),
+         (NEW.user_two_id, NEW.conversation_id, NEW.user_one_id);
+END//
+
+-- New message: move both rows' last message forward, bump the recipient's unread count.
+-- Sending counts as reading the conversation up to the new message.
+-- Assignments run left to right, so last_message_id is compared before it is overwritten.
+DROP TRIGGER IF EXISTS dm_after_insert//
+CREATE TRIGGER dm_after_insert
+AFTER INSERT ON Direct_Message
+FOR EACH ROW
+BEGIN
+  UPDATE DM_Inbox
+  SET unread_count = IF(user_id = NEW.sender_user_id, 0, unread_count + 1),
+      last_read_message_id = IF(user_id = NEW.sender_user_id,
+                                GREATEST(COALESCE(last_read_message_id, 0), NEW.message_id),
+                                last_read_message_id),
+      last_preview = IF(last_message_id IS NULL OR NEW.message_id > last_message_id,
+                        LEFT(NEW.content, 255), last_preview),
+      last_sent_at = IF(last_message_id IS NULL OR NEW.message_id > last_message_id,
+                        NEW.sent_at, last_sent_at),
+      last_message_id = GREATEST(COALESCE(last_message_id, 0), NEW.message_id)
+  WHERE conversation_id = NEW.conversation_id;
+END//
+
 DELIMITER ;
 
+
+/*
+   MATCH SCORE TABLE
+   Precomputed StudyBuddy Match scores: one row per (viewer, candidate)
+   pair that shares a course and scores >= 80 from the viewer's side
+   (scores are directional: "no preference" is the viewer's). Kept fresh
+   by RefreshMatchScoresForUser on profile/course changes, so suggestions
+   are an indexed top-N instead of re-scoring every candidate per request.
+ */
+
+CREATE TABLE `Match_Score` (
+  `user_id` INT NOT NULL,                       -- Viewer (who the suggestion is for)
+  `other_user_id` INT NOT NULL,                 -- Candidate
+  `score` SMALLINT NOT NULL,                    -- Same rules as GetStudyBuddyMatches
+  `shared_courses` TINYINT NOT NULL,
+  `updated_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+                ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (`user_id`, `other_user_id`),
+  KEY `idx_ms_user_rank` (`user_id`, `score` DESC, `shared_courses` DESC, `other_user_id`),
+  KEY `idx_ms_other` (`other_user_id`),
+  CONSTRAINT `fk_ms_user`
+    FOREIGN KEY (`user_id`)
+    REFERENCES `Match_Profile`(`user_id`)
+    ON DELETE CASCADE,
+  CONSTRAINT `fk_ms_other`
+    FOREIGN KEY (`other_user_id`)
+    REFERENCES `Match_Profile`(`user_id`)
+    ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
 -- Trigger to enforce one owner only
 DELIMITER //
 CREATE TRIGGER one_owner_only
@@ -174,7 +465,10 @@ ANALYZE TABLE
   Match_Profile,
   Message_Request,
   Resource,
-  Group_Summary;
+  Group_Summary,
+  Chat_Read_Marker,
+  DM_Inbox,
+  Match_Score;
 
 DELIMITER //
 
@@ -202,6 +496,78 @@ BEGIN
 END//
 
 
+-- One page of a course's public groups, in GetPublicGroupsForCourse's
+-- order (latest session, then most members; group_id breaks ties).
+-- Keyset ("seek") paging: pass the previous page's last
+-- (session_key, member_count, group_id), or NULLs for the first page. The
+-- page is a range read of idx_gs_public_page / idx_gs_public_open, so deep
+-- pages cost the same as the first.
+--   p_has_space -- only groups with a free seat
+--   p_this_week -- only groups with a session in the current week (Mon-Sun);
+--                  an idx_session_group_date_start probe per group, since
+--                  last_session (the sort key) may already be next week's
+-- Ex CALL GetPublicGroupsPage(420, 20, NULL, NULL, NULL, FALSE, FALSE);
+DROP PROCEDURE IF EXISTS GetPublicGroupsPage//
+CREATE PROCEDURE GetPublicGroupsPage(
+    IN p_course_id INT,
+    IN p_limit INT,
+    IN p_after_session DATE,
+    IN p_after_members INT,
+    IN p_after_group INT,
+    IN p_has_space BOOLEAN,
+    IN p_this_week BOOLEAN
+)
+BEGIN
+  DECLARE v_week_start DATE DEFAULT CURDATE() - INTERVAL WEEKDAY(CURDATE()) DAY;
+  DECLARE v_week_end DATE DEFAULT CURDATE() + INTERVAL (6 - WEEKDAY(CURDATE())) DAY;
+
+  IF p_has_space THEN
+    SELECT gs.group_id, g.group_name, gs.max_members,
+           gs.member_count AS members,
+           gs.last_session,
+           gs.session_key
+    FROM Group_Summary AS gs FORCE INDEX (idx_gs_public_open)
+    JOIN Study_Group AS g ON g.group_id = gs.group_id
+    WHERE gs.course_id = p_course_id
+      AND gs.is_private = FALSE
+      AND gs.has_space = TRUE
+      AND (NOT p_this_week OR EXISTS (
+            SELECT 1
+            FROM Study_Session AS s
+            WHERE s.group_id = gs.group_id
+              AND s.session_date BETWEEN v_week_start AND v_week_end))
+      AND (p_after_group IS NULL
+           OR gs.session_key < p_after_session
+           OR (gs.session_key = p_after_session
+               AND (gs.member_count < p_after_members
+                    OR (gs.member_count = p_after_members AND gs.group_id < p_after_group))))
+    ORDER BY gs.session_key DESC, gs.member_count DESC, gs.group_id DESC
+    LIMIT p_limit;
+  ELSE
+    SELECT gs.group_id, g.group_name, gs.max_members,
+           gs.member_count AS members,
+           gs.last_session,
+           gs.session_key
+    FROM Group_Summary AS gs FORCE INDEX (idx_gs_public_page)
+    JOIN Study_Group AS g ON g.group_id = gs.group_id
+    WHERE gs.course_id = p_course_id
+      AND gs.is_private = FALSE
+      AND (NOT p_this_week OR EXISTS (
+            SELECT 1
+            FROM Study_Session AS s
+            WHERE s.group_id = gs.group_id
+              AND s.session_date BETWEEN v_week_start AND v_week_end))
+      AND (p_after_group IS NULL
+           OR gs.session_key < p_after_session
+           OR (gs.session_key = p_after_session
+               AND (gs.member_count < p_after_members
+                    OR (gs.member_count = p_after_members AND gs.group_id < p_after_group))))
+    ORDER BY gs.session_key DESC, gs.member_count DESC, gs.group_id DESC
+    LIMIT p_limit;
+  END IF;
+END//
+
+
 -- All groups a user belongs to (+ their role)
 -- Ex CALL GetUserGroups(1001);
 DROP PROCEDURE IF EXISTS GetUserGroups//
@@ -262,11 +628,51 @@ CREATE PROCEDURE GetChatMessagesForGroup(
     IN p_group_id INT,
     IN p_limit INT
 )
+BEGIN
+  -- message_id order (same as sent_time, but unique) so the keyset pages
+  -- from GetChatMessagesBefore continue exactly where this one stops
+  SELECT c.message_id, c.user_id, c.content, c.sent_time
+  FROM Chat_Message AS c
+  WHERE c.group_id = p_group_id
+  ORDER BY c.message_id DESC
+  LIMIT p_limit;
+END//
+
+
+-- Chat scrollback: the page of messages older than p_before_id, newest first
+-- Seeks idx_chat_group_msg, so page N costs the same as page 1
+-- Ex CALL GetChatMessagesBefore(1, 5120, 50);
+DROP PROCEDURE IF EXISTS GetChatMessagesBefore//
+CREATE PROCEDURE GetChatMessagesBefore(
+    IN p_group_id INT,
+    IN p_before_id INT,
+    IN p_limit INT
+)
+BEGIN
+  SELECT c.message_id, c.user_id, c.content, c.sent_time
+  FROM Chat_Message AS c
+  WHERE c.group_id = p_group_id
+    AND c.message_id < p_before_id
+  ORDER BY c.message_id DESC
+  LIMIT p_limit;
+END//
+
+
+-- Chat delta: only messages newer than p_after_id, oldest first
+-- (so a client catching up never skips any when more than p_limit arrived)
+-- Ex CALL GetChatMessagesAfter(1, 5120, 50);
+DROP PROCEDURE IF EXISTS GetChatMessagesAfter//
+CREATE PROCEDURE GetChatMessagesAfter(
+    IN p_group_id INT,
+    IN p_after_id INT,
+    IN p_limit INT
+)
 BEGIN
   SELECT c.message_id, c.user_id, c.content, c.sent_time
   FROM Chat_Message AS c
   WHERE c.group_id = p_group_id
-  ORDER BY c.sent_time DESC, c.message_id DESC
+    AND c.message_id > p_after_id
+  ORDER BY c.message_id ASC
   LIMIT p_limit;
 END//
 
@@ -679,6 +1085,70 @@ BEGIN
     LIMIT p_limit;
 END//
 
+-- Unified search over courses, quizzes, flashcard sets and resources using
+-- the ngram FULLTEXT indexes. Always returns four result sets in that order,
+-- each ordered by relevance and capped by its own limit (0 = skip the type;
+-- MySQL answers LIMIT 0 without reading the index).
+-- Ex CALL SearchAllContent('database', 5, 5, 5, 5);
+DROP PROCEDURE IF EXISTS SearchAllContent//
+CREATE PROCEDURE SearchAllContent(
+    IN p_query VARCHAR(255),
+    IN p_course_limit INT,
+    IN p_quiz_limit INT,
+    IN p_set_limit INT,
+    IN p_resource_limit INT
+)
+BEGIN
+    SELECT
+        c.course_id,
+        c.course_code,
+        c.course_name,
+        col.college_name,
+        MATCH(c.course_code, c.course_name) AGAINST (p_query IN NATURAL LANGUAGE MODE) AS relevance
+    FROM Courses c
+    LEFT JOIN Colleges col ON col.college_id = c.college_id
+    WHERE MATCH(c.course_code, c.course_name) AGAINST (p_query IN NATURAL LANGUAGE MODE)
+    ORDER BY relevance DESC, c.course_code, c.course_id
+    LIMIT p_course_limit;
+
+    SELECT
+        q.quiz_id,
+        q.title,
+        q.description,
+        q.course_id,
+        q.created_at,
+        MATCH(q.title, q.description) AGAINST (p_query IN NATURAL LANGUAGE MODE) AS relevance
+    FROM Quiz q
+    WHERE MATCH(q.title, q.description) AGAINST (p_query IN NATURAL LANGUAGE MODE)
+    ORDER BY relevance DESC, q.quiz_id DESC
+    LIMIT p_quiz_limit;
+
+    SELECT
+        fs.set_id,
+        fs.title,
+        fs.description,
+        fs.course_id,
+        fs.created_at,
+        MATCH(fs.title, fs.description) AGAINST (p_query IN NATURAL LANGUAGE MODE) AS relevance
+    FROM FlashcardSet fs
+    WHERE MATCH(fs.title, fs.description) AGAINST (p_query IN NATURAL LANGUAGE MODE)
+    ORDER BY relevance DESC, fs.set_id DESC
+    LIMIT p_set_limit;
+
+    SELECT
+        r.resource_id,
+        r.title,
+        r.description,
+        r.filetype,
+        r.source,
+        r.upload_date,
+        MATCH(r.title, r.description) AGAINST (p_query IN NATURAL LANGUAGE MODE) AS relevance
+    FROM Resource r
+    WHERE MATCH(r.title, r.description) AGAINST (p_query IN NATURAL LANGUAGE MODE)
+    ORDER BY relevance DESC, r.resource_id DESC
+    LIMIT p_resource_limit;
+END//
+
 -- Create a group and auto-join creator as owner
 DROP PROCEDURE IF EXISTS CreateStudyGroupWithOwner//
 CREATE PROCEDURE CreateStudyGroupWithOwner(
@@ -1043,7 +1513,10 @@ BEGIN
     INSERT INTO Chat_Message (group_id, user_id, content)
     VALUES (p_group_id, p_user_id, p_content);
 
-    SELECT LAST_INSERT_ID() AS message_id;
+    -- sent_time comes back too so the API can push the full message to live chat streams
+    SELECT message_id, sent_time
+    FROM Chat_Message
+    WHERE message_id = LAST_INSERT_ID();
 END//
 
 -- Start or find a direct conversation + ensure message request row
@@ -1099,29 +1572,55 @@ BEGIN
             ELSE CURRENT_TIMESTAMP
         END;
 
-    SELECT v_convo_id AS conversation_id;
+    -- request details let the API push a live "message_request" event to the target
+    SELECT
+        v_convo_id AS conversation_id,
+        mr.request_id,
+        mr.request_status
+    FROM Message_Request mr
+    WHERE mr.requester_user_id = p_requester_id
+      AND mr.target_user_id = p_target_id;
 END//
 
 
--- Get direct messages in a conversation
+-- Get the latest direct messages in a conversation (oldest first)
 DROP PROCEDURE IF EXISTS GetDirectMessages//
 CREATE PROCEDURE GetDirectMessages(
     IN p_conversation_id INT,
     IN p_limit           INT
 )
 BEGIN
-    SELECT
-        dm.message_id,
-        dm.sender_user_id,
-        u.first_name,
-        u.last_name,
-        dm.content,
-        dm.sent_at AS sent_time
-    FROM Direct_Message dm
-    JOIN Users u ON u.user_id = dm.sender_user_id
-    WHERE dm.conversation_id = p_conversation_id
-    ORDER BY dm.sent_at ASC, dm.message_id ASC
-    LIMIT p_limit;
+    -- INT max: "before the newest message" = the latest page
+    CALL GetDirectMessagesBefore(p_conversation_id, 2147483647, p_limit);
+END//
+
+
+-- DM scrollback: the page of messages older than p_before_id, oldest first
+-- Seeks idx_dm_convo_msg newest-first, then flips the page for display
+DROP PROCEDURE IF EXISTS GetDirectMessagesBefore//
+CREATE PROCEDURE GetDirectMessagesBefore(
+    IN p_conversation_id INT,
+    IN p_before_id       INT,
+    IN p_limit           INT
+)
+BEGIN
+    SELECT page.*
+    FROM (
+        SELECT
+            dm.message_id,
+            dm.sender_user_id,
+            u.first_name,
+            u.last_name,
+            dm.content,
+            dm.sent_at AS sent_time
+        FROM Direct_Message dm
+        JOIN Users u ON u.user_id = dm.sender_user_id
+        WHERE dm.conversation_id = p_conversation_id
+          AND dm.message_id < p_before_id
+        ORDER BY dm.message_id DESC
+        LIMIT p_limit
+    ) AS page
+    ORDER BY page.message_id ASC;
 END//
 
 
@@ -1136,10 +1635,23 @@ BEGIN
     INSERT INTO Direct_Message (conversation_id, sender_user_id, content)
     VALUES (p_conversation_id, p_sender_id, p_content);
 
-    SELECT LAST_INSERT_ID() AS message_id;
+    -- recipient + sent_time let the API push the message to the other participant
+    SELECT
+        dm.message_id,
+        dm.sent_at AS sent_time,
+        CASE
+            WHEN dc.user_one_id = p_sender_id THEN dc.user_two_id
+            ELSE dc.user_one_id
+        END AS recipient_user_id
+    FROM Direct_Message dm
+    JOIN Direct_Conversation dc
+      ON dc.conversation_id = dm.conversation_id
+    WHERE dm.message_id = LAST_INSERT_ID();
 END//
 
--- Inbox: all conversations for a user
+-- Inbox: all conversations for a user, latest activity first
+-- Reads the trigger-maintained DM_Inbox rows (idx_inbox_user_sent range scan);
+-- the pending request, if any, is a unique-key lookup in either direction
 DROP PROCEDURE IF EXISTS GetDmInboxForUser//
 CREATE PROCEDURE GetDmInboxForUser(
     IN p_user_id INT,
@@ -1147,48 +1659,36 @@ CREATE PROCEDURE GetDmInboxForUser(
 )
 BEGIN
     SELECT
-        dc.conversation_id,
-        CASE
-            WHEN dc.user_one_id = p_user_id THEN dc.user_two_id
-            ELSE dc.user_one_id
-        END AS other_user_id,
+        i.conversation_id,
+        i.other_user_id,
         u.first_name,
         u.last_name,
-        m.content AS last_message,
-        m.sent_at AS last_sent_at,
-        mr.request_status,
+        i.last_preview AS last_message,
+        i.last_sent_at,
+        COALESCE(mr_out.request_status, mr_in.request_status) AS request_status,
         CASE
-            WHEN mr.requester_user_id = p_user_id THEN 1
+            WHEN mr_out.request_id IS NOT NULL THEN 1
             ELSE 0
-        END AS is_requester
-    FROM Direct_Conversation dc
+        END AS is_requester,
+        i.unread_count,
+        i.last_read_message_id,
+        o.last_read_message_id AS other_last_read_message_id
+    FROM DM_Inbox i
     JOIN Users u
-      ON u.user_id = CASE
-            WHEN dc.user_one_id = p_user_id THEN dc.user_two_id
-            ELSE dc.user_one_id
-        END
-    LEFT JOIN Direct_Message m
-      ON m.message_id = (
-            SELECT dm2.message_id
-            FROM Direct_Message dm2
-            WHERE dm2.conversation_id = dc.conversation_id
-            ORDER BY dm2.sent_at DESC, dm2.message_id DESC
-            LIMIT 1
-      )
-    LEFT JOIN Message_Request mr
-      ON mr.request_status = 'pending'
-     AND (
-            (mr.requester_user_id = p_user_id AND mr.target_user_id = CASE
-                WHEN dc.user_one_id = p_user_id THEN dc.user_two_id
-                ELSE dc.user_one_id
-            END)
-         OR (mr.target_user_id = p_user_id AND mr.requester_user_id = CASE
-                WHEN dc.user_one_id = p_user_id THEN dc.user_two_id
-                ELSE dc.user_one_id
-            END)
-      )
-    WHERE (dc.user_one_id = p_user_id OR dc.user_two_id = p_user_id)
-    ORDER BY last_sent_at DESC, dc.conversation_id DESC
+      ON u.user_id = i.other_user_id
+    LEFT JOIN DM_Inbox o
+      ON o.user_id = i.other_user_id
+     AND o.conversation_id = i.conversation_id
+    LEFT JOIN Message_Request mr_out
+      ON mr_out.requester_user_id = p_user_id
+     AND mr_out.target_user_id = i.other_user_id
+     AND mr_out.request_status = 'pending'
+    LEFT JOIN Message_Request mr_in
+      ON mr_in.requester_user_id = i.other_user_id
+     AND mr_in.target_user_id = p_user_id
+     AND mr_in.request_status = 'pending'
+    WHERE i.user_id = p_user_id
+    ORDER BY i.last_sent_at DESC, i.conversation_id DESC
     LIMIT p_limit;
 END//
 
@@ -1256,6 +1756,11 @@ BEGIN
             FROM Direct_Conversation
             WHERE user_one_id = v_u1 AND user_two_id = v_u2
         );
+
+        SELECT conversation_id
+        INTO v_convo_id
+        FROM Direct_Conversation
+        WHERE user_one_id = v_u1 AND user_two_id = v_u2;
     ELSE
         SELECT conversation_id
         INTO v_convo_id
@@ -1271,8 +1776,433 @@ BEGIN
         END IF;
     END IF;
 
-    SELECT v_new_status AS request_status;
+    -- requester + conversation let the API push the outcome to the requester
+    SELECT
+        v_new_status AS request_status,
+        v_requester AS requester_user_id,
+        v_convo_id AS conversation_id;
+END//
+
+
+-- Mark a DM conversation read for one participant, up to p_message_id
+-- (NULL = everything). Markers only move forward. Returns the new state.
+-- Call inside a transaction: the FOR UPDATE lock has to outlive the SELECT.
+DROP PROCEDURE IF EXISTS MarkDmRead//
+CREATE PROCEDURE MarkDmRead(
+    IN p_conversation_id INT,
+    IN p_user_id         INT,
+    IN p_message_id      INT
+)
+BEGIN
+    DECLARE v_found     INT DEFAULT 0;
+    DECLARE v_last      INT;
+    DECLARE v_read      INT;
+    DECLARE v_unread    INT DEFAULT 0;
+
+    -- row lock: a message sent meanwhile waits for us instead of being miscounted
+    SELECT 1, last_message_id, last_read_message_id
+    INTO v_found, v_last, v_read
+    FROM DM_Inbox
+    WHERE user_id = p_user_id
+      AND conversation_id = p_conversation_id
+    FOR UPDATE;
+
+    IF v_found = 0 THEN
+        SIGNAL SQLSTATE '45000'
+            SET MESSAGE_TEXT = 'NOT_A_PARTICIPANT';
+    END IF;
+
+    SET v_read = NULLIF(GREATEST(
+        COALESCE(v_read, 0),
+        COALESCE(LEAST(COALESCE(p_message_id, v_last), v_last), 0)
+    ), 0);
+
+    -- caught up is the common case; otherwise count what is left (bounded by the unread count)
+    IF v_read IS NOT NULL AND v_read < v_last THEN
+        SELECT COUNT(*)
+        INTO v_unread
+        FROM Direct_Message
+        WHERE conversation_id = p_conversation_id
+          AND message_id > v_read
+          AND sender_user_id <> p_user_id;
+    END IF;
+
+    UPDATE DM_Inbox
+    SET last_read_message_id = v_read,
+        unread_count = v_unread
+    WHERE user_id = p_user_id
+      AND conversation_id = p_conversation_id;
+
+    SELECT p_conversation_id AS conversation_id,
+           v_read AS last_read_message_id,
+           v_unread AS unread_count;
+END//
+
+
+-- Mark group chat read for one member, up to p_message_id (NULL = everything).
+-- Markers only move forward. Returns the new state.
+-- Call inside a transaction: the FOR UPDATE lock has to outlive the SELECT.
+DROP PROCEDURE IF EXISTS MarkGroupChatRead//
+CREATE PROCEDURE MarkGroupChatRead(
+    IN p_group_id   INT,
+    IN p_user_id    INT,
+    IN p_message_id INT
+)
+BEGIN
+    DECLARE v_found      INT DEFAULT 0;
+    DECLARE v_cur_read   INT;
+    DECLARE v_cur_count  INT;
+    DECLARE v_count      INT DEFAULT 0;
+    DECLARE v_last       INT;
+    DECLARE v_newer      INT DEFAULT 0;
+
+    SELECT 1, last_read_message_id, read_count
+    INTO v_found, v_cur_read, v_cur_count
+    FROM Chat_Read_Marker
+    WHERE user_id = p_user_id
+      AND group_id = p_group_id
+    FOR UPDATE;
+
+    IF v_found = 0 THEN
+        SIGNAL SQLSTATE '45000'
+            SET MESSAGE_TEXT = 'NOT_A_MEMBER';
+    END IF;
+
+    SELECT message_count, last_message_id
+    INTO v_count, v_last
+    FROM Group_Summary
+    WHERE group_id = p_group_id;
+
+    IF p_message_id IS NOT NULL AND p_message_id < v_last THEN
+        -- partial read: everything after p_message_id stays unread
+        SELECT COUNT(*)
+        INTO v_newer
+        FROM Chat_Message
+        WHERE group_id = p_group_id
+          AND message_id > p_message_id;
+        SET v_last = p_message_id;
+    END IF;
+
+    IF v_last IS NOT NULL AND v_last > COALESCE(v_cur_read, 0) THEN
+        UPDATE Chat_Read_Marker
+        SET read_count = v_count - v_newer,
+            last_read_message_id = v_last
+        WHERE user_id = p_user_id
+          AND group_id = p_group_id;
+        SET v_cur_read = v_last;
+        SET v_cur_count = v_count - v_newer;
+    END IF;
+
+    SELECT p_group_id AS group_id,
+           v_cur_read AS last_read_message_id,
+           GREATEST(v_count - v_cur_count, 0) AS unread_count;
+END//
+
+
+-- Every unread DM conversation and group chat for a user, in one call.
+-- Both halves are primary-key prefix scans on user_id.
+DROP PROCEDURE IF EXISTS GetUnreadCountsForUser//
+CREATE PROCEDURE GetUnreadCountsForUser(
+    IN p_user_id INT
+)
+BEGIN
+    SELECT
+        'dm' AS kind,
+        i.conversation_id AS id,
+        i.unread_count,
+        i.last_message_id
+    FROM DM_Inbox i
+    WHERE i.user_id = p_user_id
+      AND i.unread_count > 0
+
+    UNION ALL
+
+    SELECT
+        'group' AS kind,
+        crm.group_id AS id,
+        gs.message_count - crm.read_count AS unread_count,
+        gs.last_message_id
+    FROM Chat_Read_Marker crm
+    JOIN Group_Summary gs
+      ON gs.group_id = crm.group_id
+    WHERE crm.user_id = p_user_id
+      AND gs.message_count > crm.read_count;
+END//
+
+
+/* MATCH SCORE MAINTENANCE */
+
+-- Score of one candidate from one viewer's side. Exactly the rules in
+-- GetStudyBuddyMatches, which stays as the reference implementation.
+DROP FUNCTION IF EXISTS CalcMatchScore//
+CREATE FUNCTION CalcMatchScore(
+    p_my_college_id INT,
+    p_my_study_style VARCHAR(20),
+    p_my_meeting_pref VARCHAR(20),
+    p_my_study_goal VARCHAR(20),
+    p_my_focus_time_pref VARCHAR(20),
+    p_my_noise_pref VARCHAR(20),
+    p_my_age INT,
+    p_college_id INT,
+    p_study_style VARCHAR(20),
+    p_meeting_pref VARCHAR(20),
+    p_study_goal VARCHAR(20),
+    p_focus_time_pref VARCHAR(20),
+    p_noise_pref VARCHAR(20),
+    p_age INT,
+    p_shared_courses INT
+)
+RETURNS INT
+DETERMINISTIC
+NO SQL
+BEGIN
+    RETURN
+          CASE WHEN p_college_id = p_my_college_id THEN 40 ELSE 0 END
+
+        + CASE
+            WHEN p_my_study_style = 'no preference' THEN 20
+            WHEN p_study_style = p_my_study_style THEN 20
+            ELSE 0
+          END
+
+        + CASE
+            WHEN p_my_meeting_pref = 'no preference' THEN 15
+            WHEN p_meeting_pref = p_my_meeting_pref THEN 15
+            ELSE 0
+          END
+
+        + CASE
+            WHEN p_my_study_goal = 'all of the above' THEN 10
+            WHEN p_study_goal = p_my_study_goal THEN 10
+            ELSE 0
+          END
+
+        + CASE
+            WHEN p_my_focus_time_pref = 'no preference' THEN 5
+            WHEN p_focus_time_pref = p_my_focus_time_pref THEN 5
+            ELSE 0
+          END
+
+        + CASE
+            WHEN p_my_noise_pref = 'no preference' THEN 5
+            WHEN p_noise_pref = p_my_noise_pref THEN 5
+            ELSE 0
+          END
+
+        + LEAST(p_shared_courses, 2) * 10
+
+        + CASE
+            WHEN p_my_age IS NOT NULL AND p_age IS NOT NULL THEN
+                 CASE
+                     WHEN ABS(p_age - p_my_age) <= 2 THEN 10
+                     WHEN ABS(p_age - p_my_age) <= 4 THEN 5
+                     ELSE 0
+                 END
+            ELSE 0
+          END;
+END//
+
+
+-- Recompute every Match_Score row involving one user, in both directions.
+-- Only pairs sharing a course with the user are touched, so the cost follows
+-- the size of the user's courses, not the number of profiles.
+-- Call after changing the user's Match_Profile, course list or college.
+DROP PROCEDURE IF EXISTS RefreshMatchScoresForUser//
+CREATE PROCEDURE RefreshMatchScoresForUser(
+    IN p_user_id INT
+)
+BEGIN
+    DELETE FROM Match_Score WHERE user_id = p_user_id;
+    DELETE FROM Match_Score WHERE other_user_id = p_user_id;
+
+    INSERT INTO Match_Score (user_id, other_user_id, score, shared_courses)
+    WITH shared AS (
+        SELECT
+            mpc_other.user_id AS other_user_id,
+            COUNT(*) AS shared_courses
+        FROM Match_Profile_Course mpc_me
+        JOIN Match_Profile_Course mpc_other
+          ON mpc_other.course_id = mpc_me.course_id
+         AND mpc_other.user_id <> p_user_id
+        WHERE mpc_me.user_id = p_user_id
+        GROUP BY mpc_other.user_id
+    ),
+    pairs AS (
+        SELECT
+            s.shared_courses,
+            me.user_id AS me_id,
+            u_me.college_id AS me_college_id,
+            me.study_style AS me_study_style,
+            me.meeting_pref AS me_meeting_pref,
+            me.study_goal AS me_study_goal,
+            me.focus_time_pref AS me_focus_time_pref,
+            me.noise_pref AS me_noise_pref,
+            me.age AS me_age,
+            o.user_id AS o_id,
+            u_o.college_id AS o_college_id,
+            o.study_style AS o_study_style,
+            o.meeting_pref AS o_meeting_pref,
+            o.study_goal AS o_study_goal,
+            o.focus_time_pref AS o_focus_time_pref,
+            o.noise_pref AS o_noise_pref,
+            o.age AS o_age
+        FROM shared s
+        JOIN Match_Profile me ON me.user_id = p_user_id
+        JOIN Users u_me ON u_me.user_id = me.user_id
+        JOIN Match_Profile o ON o.user_id = s.other_user_id
+        JOIN Users u_o ON u_o.user_id = o.user_id
+    ),
+    scored AS (
+        -- p_user_id viewing the others
+        SELECT
+            me_id AS user_id,
+            o_id AS other_user_id,
+            CalcMatchScore(me_college_id, me_study_style, me_meeting_pref, me_study_goal,
+                           me_focus_time_pref, me_noise_pref, me_age,
+                           o_college_id, o_study_style, o_meeting_pref, o_study_goal,
+                           o_focus_time_pref, o_noise_pref, o_age,
+                           shared_courses) AS score,
+            shared_courses
+        FROM pairs
+
+        UNION ALL
+
+        -- the others viewing p_user_id
+        SELECT
+            o_id,
+            me_id,
+            CalcMatchScore(o_college_id, o_study_style, o_meeting_pref, o_study_goal,
+                           o_focus_time_pref, o_noise_pref, o_age,
+                           me_college_id, me_study_style, me_meeting_pref, me_study_goal,
+                           me_focus_time_pref, me_noise_pref, me_age,
+                           shared_courses),
+            shared_courses
+        FROM pairs
+    )
+    SELECT user_id, other_user_id, score, shared_courses
+    FROM scored
+    WHERE score >= 80;
+END//
+
+
+-- Suggestions from Match_Score: same columns, filters and order as
+-- GetStudyBuddyMatches. The request and age filters run at read time
+-- because they change without a profile upsert.
+DROP PROCEDURE IF EXISTS GetPrecomputedMatches//
+CREATE PROCEDURE GetPrecomputedMatches(
+    IN p_user_id INT,
+    IN p_limit INT
+)
+BEGIN
+    DECLARE v_my_min_age TINYINT UNSIGNED;
+    DECLARE v_my_max_age TINYINT UNSIGNED;
+
+    SELECT preferred_min_age, preferred_max_age
+    INTO v_my_min_age, v_my_max_age
+    FROM Match_Profile
+    WHERE user_id = p_user_id;
+
+    SELECT
+        ms.other_user_id,
+        u.first_name,
+        u.last_name,
+        u.college_id,
+        mp.study_style,
+        mp.meeting_pref,
+        mp.study_goal,
+        mp.focus_time_pref,
+        mp.noise_pref,
+        mp.age,
+        mp.preferred_min_age,
+        mp.preferred_max_age,
+        mp.bio,
+        mp.profile_image_url,
+        ms.shared_courses,
+        ms.score AS match_score
+    FROM Match_Score ms
+    JOIN Match_Profile mp
+      ON mp.user_id = ms.other_user_id
+    JOIN Users u
+      ON u.user_id = ms.other_user_id
+    WHERE ms.user_id = p_user_id
+
+      -- don't show if there's already a pending/accepted message request
+      -- (two unique-key lookups on uq_message_request_pair)
+      AND NOT EXISTS (
+          SELECT 1
+          FROM Message_Request mr
+          WHERE mr.requester_user_id = p_user_id
+            AND mr.target_user_id = ms.other_user_id
+            AND mr.request_status IN ('pending', 'accepted')
+      )
+      AND NOT EXISTS (
+          SELECT 1
+          FROM Message_Request mr
+          WHERE mr.requester_user_id = ms.other_user_id
+            AND mr.target_user_id = p_user_id
+            AND mr.request_status IN ('pending', 'accepted')
+      )
+
+      -- respect my preferred age range (if set)
+      AND (
+          v_my_min_age IS NULL
+          OR v_my_max_age IS NULL
+          OR mp.age IS NULL
+          OR (mp.age BETWEEN v_my_min_age AND v_my_max_age)
+      )
+
+    ORDER BY
+        ms.score DESC,
+        ms.shared_courses DESC,
+        ms.other_user_id
+    LIMIT p_limit;
+END//
+
+
+-- College is part of the score: re-score a user's pairs when it changes
+DROP TRIGGER IF EXISTS users_after_update_college//
+CREATE TRIGGER users_after_update_college
+AFTER UPDATE ON Users
+FOR EACH ROW
+BEGIN
+  IF NOT (OLD.college_id <=> NEW.college_id) THEN
+    CALL RefreshMatchScoresForUser(NEW.user_id);
+  END IF;
 END//
 
 DELIMITER ;
 
+
+/*
+   Seeds Match_Score for every existing profile in one pass
+*/
+
+INSERT INTO Match_Score (user_id, other_user_id, score, shared_courses)
+SELECT user_id, other_user_id, score, shared_courses
+FROM (
+  SELECT
+    s.user_id,
+    s.other_user_id,
+    CalcMatchScore(u_me.college_id, me.study_style, me.meeting_pref, me.study_goal,
+                   me.focus_time_pref, me.noise_pref, me.age,
+                   u_o.college_id, o.study_style, o.meeting_pref, o.study_goal,
+                   o.focus_time_pref, o.noise_pref, o.age,
+                   s.shared_courses) AS score,
+    s.shared_courses
+  FROM (
+    SELECT a.user_id, b.user_id AS other_user_id, COUNT(*) AS shared_courses
+    FROM Match_Profile_Course a
+    JOIN Match_Profile_Course b
+      ON b.course_id = a.course_id
+     AND b.user_id <> a.user_id
+    GROUP BY a.user_id, b.user_id
+  ) AS s
+  JOIN Match_Profile me ON me.user_id = s.user_id
+  JOIN Users u_me ON u_me.user_id = s.user_id
+  JOIN Match_Profile o ON o.user_id = s.other_user_id
+  JOIN Users u_o ON u_o.user_id = s.other_user_id
+) AS scored
+WHERE score >= 80
+ON DUPLICATE KEY UPDATE
+  score = VALUES(score),
+  shared_courses = VALUES(shared_courses);
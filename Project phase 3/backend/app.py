@@ -1,4 +1,4 @@
-from flask import Flask, jsonify, send_from_directory
+from flask import Flask, jsonify
 from flask_cors import CORS
 import os
 from dotenv import load_dotenv
@@ -8,6 +8,7 @@ from routes.chat_routes import bp as chat_bp
 from routes.course_routes import bp as courses_bp
 from routes.match_routes import bp as match_bp
 from routes.direct_message_routes import bp as dm_bp
+from routes.unread_routes import bp as unread_bp
 
 from routes.auth_routes import auth_bp
 from routes.user_routes import user_bp
@@ -15,7 +16,13 @@ from routes.quiz_routes import quiz_bp
 from routes.flashcard_routes import flashcard_bp
 
 from routes.resource_routes import bp as resources_bp
+from routes.monitoring_routes import bp as monitoring_bp
+from routes.search_routes import bp as search_bp
+import db
 from db import get_db_connection as get_db
+from utils import metrics
+from utils import course_search, static_files
+from utils.image_pipeline import get_image_pipeline, is_pending
 
 # Load environment variables
 load_dotenv()
@@ -66,6 +73,15 @@ def create_app():
     upload_folder = os.path.join(base_dir, "uploads")
     os.makedirs(upload_folder, exist_ok=True)
     app.config["UPLOAD_FOLDER"] = upload_folder
+    # UPLOADS_SENDFILE=x-sendfile lets the front-end server send upload bytes
+    static_files.init_app(app)
+    # course picker autocomplete index, built in the background
+    course_search.init_app(app)
+
+    # one pooled DB connection per request, released on teardown
+    db.init_app(app)
+    # request count / latency / size / DB time per endpoint, served at /metrics
+    metrics.init_app(app)
 
     # Allow vite dev server to talk to the backend
     CORS(
@@ -80,17 +96,25 @@ def create_app():
                 ],
             }
         },
-        supports_credentials=True
+        supports_credentials=True,
+        # keyset pagination cursors travel in a response header
+        expose_headers=["X-Next-Cursor"],
     )
 
     @app.route("/")
     def health():
         return jsonify({"status": "backend running"})
 
-    # serve uploaded files (profile pics, resources, etc.)
+    # serve uploaded files (profile pics, resources, etc.) with Range,
+    # ETag / 304 and long-lived caching for content-addressed names
     @app.route("/uploads/<path:filename>")
     def uploaded_file(filename):
-        return send_from_directory(app.config["UPLOAD_FOLDER"], filename)
+        # a profile image variant may still be encoding right after the upload;
+        # wait_for only knows this worker's uploads, so ask other workers' clients to retry
+        get_image_pipeline().wait_for(filename)
+        if is_pending(app.config["UPLOAD_FOLDER"], filename):
+            return jsonify({"detail": "Image is still being processed"}), 503, {"Retry-After": "1"}
+        return static_files.send_upload(app.config["UPLOAD_FOLDER"], filename)
 
     # Study group & chat blueprints (these already have url_prefix="/groups" inside)
     app.register_blueprint(studygroup_bp)
@@ -100,6 +124,8 @@ def create_app():
     app.register_blueprint(courses_bp)
     app.register_blueprint(match_bp)
     app.register_blueprint(dm_bp)
+    # unread badge counts for DMs + group chats
+    app.register_blueprint(unread_bp)
 
     # Auth & user profile
     app.register_blueprint(auth_bp, url_prefix="/auth")
@@ -112,6 +138,12 @@ def create_app():
     #Resources
     app.register_blueprint(resources_bp)
 
+    # Unified FULLTEXT search across courses, quizzes, flashcards, resources
+    app.register_blueprint(search_bp)
+
+    # Liveness / readiness probes for the load balancer, Prometheus /metrics
+    app.register_blueprint(monitoring_bp)
+
     return app
 
 if __name__ == "__main__":
@@ -1,11 +1,27 @@
 import mysql.connector
+from mysql.connector import errors as mysql_errors
+import json
+import logging
 import os
+import re
+import threading
+import time
+from collections import deque
 from dotenv import load_dotenv
+from flask import g, has_request_context, request
 
 # Load .env if present
 load_dotenv()
 
-def get_db_connection():
+logger = logging.getLogger("studybuddy.db")
+
+# statements slower than this are logged (with parameters redacted)
+SLOW_QUERY_SECONDS = float(os.getenv("DB_SLOW_QUERY_MS", 200)) / 1000.0
+# the same statement shape this many times in one request is flagged as N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("DB_N_PLUS_ONE_THRESHOLD", 5))
+
+
+def _open_connection():
     return mysql.connector.connect(
         host=os.getenv("MYSQL_HOST", "localhost"),
         port=int(os.getenv("MYSQL_PORT", 3306)),
@@ -17,4 +33,524 @@ def get_db_connection():
     )
 
 
-#feel free to change this -- putting this here for my routes as of right now. Also feel free to delete this comment!
+_WHITESPACE = re.compile(r"\s+")
+_IN_LIST = re.compile(r"\(\s*%s(?:\s*,\s*%s)*\s*\)")
+_CALL = re.compile(r"^call\s+`?(\w+)", re.IGNORECASE)
+_TABLE_AFTER = {
+    "select": re.compile(r"\bfrom\s+`?(\w+)", re.IGNORECASE),
+    "delete": re.compile(r"\bfrom\s+`?(\w+)", re.IGNORECASE),
+    "insert": re.compile(r"\binto\s+`?(\w+)", re.IGNORECASE),
+    "replace": re.compile(r"\binto\s+`?(\w+)", re.IGNORECASE),
+    "update": re.compile(r"^update\s+`?(\w+)", re.IGNORECASE),
+}
+
+_statement_listeners = []
+_pool_listeners = []
+
+
+def add_statement_listener(fn):
+    """fn(label, elapsed_seconds, slow, n_plus_one) runs after every statement."""
+    if fn not in _statement_listeners:
+        _statement_listeners.append(fn)
+
+
+def add_pool_listener(fn):
+    """fn(event) runs for every pool checkout ("checkout") and give-up ("timeout"); keep it cheap."""
+    if fn not in _pool_listeners:
+        _pool_listeners.append(fn)
+
+
+def normalize_statement(sql):
+    """Collapse whitespace and IN (%s, %s, ...) lists so equal shapes compare equal."""
+    if isinstance(sql, (bytes, bytearray)):
+        sql = sql.decode("utf-8", "replace")
+    return _IN_LIST.sub("(...)", _WHITESPACE.sub(" ", sql).strip())
+
+
+def statement_label(sql):
+    """
+    Low-cardinality name for a statement, used as a metrics label:
+    'CALL GetStudyBuddyMatches', 'SELECT Question', 'INSERT Answer', ...
+    """
+    m = _CALL.match(sql)
+    if m:
+        return f"CALL {m.group(1)}"
+    verb = sql.split(" ", 1)[0].lower()
+    pattern = _TABLE_AFTER.get(verb)
+    m = pattern.search(sql) if pattern else None
+    return f"{verb.upper()} {m.group(1)}" if m else verb.upper() or "UNKNOWN"
+
+
+def _redact(params):
+    # keep the shape for debugging, never the values (emails, passwords, messages...)
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {k: type(v).__name__ for k, v in params.items()}
+    try:
+        return [type(v).__name__ for v in params]
+    except TypeError:
+        return type(params).__name__
+
+
+def _record_db_time(elapsed):
+    if has_request_context():
+        g.db_seconds = g.get("db_seconds", 0.0) + elapsed
+
+
+def _observe_statement(sql, params, elapsed):
+    statement = normalize_statement(sql)
+    label = statement_label(statement)
+    endpoint = None
+    n_plus_one = False
+
+    if has_request_context():
+        endpoint = request.endpoint
+        g.db_queries = g.get("db_queries", 0) + 1
+        counts = g.get("db_statement_counts")
+        if counts is None:
+            counts = g.db_statement_counts = {}
+        counts[statement] = counts.get(statement, 0) + 1
+
+        if counts[statement] == N_PLUS_ONE_THRESHOLD:
+            n_plus_one = True
+            logger.warning(json.dumps({
+                "event": "db.n_plus_one",
+                "label": label,
+                "statement": statement[:500],
+                "repeats": N_PLUS_ONE_THRESHOLD,
+                "endpoint": endpoint,
+                "path": request.path,
+            }))
+
+    slow = elapsed >= SLOW_QUERY_SECONDS
+    if slow:
+        logger.warning(json.dumps({
+            "event": "db.slow_query",
+            "label": label,
+            "statement": statement[:500],
+            "params": _redact(params),
+            "elapsed_ms": round(elapsed * 1000, 2),
+            "endpoint": endpoint,
+        }))
+
+    for fn in _statement_listeners:
+        fn(label, elapsed, slow, n_plus_one)
+
+
+class InstrumentedCursor:
+    """
+    Wraps a mysql-connector cursor and times every round trip.
+
+    - all time goes into the request's DB time (g.db_seconds)
+    - execute/executemany/callproc are counted per request (g.db_queries),
+      logged when slower than DB_SLOW_QUERY_MS, and flagged when the same
+      statement shape repeats DB_N_PLUS_ONE_THRESHOLD times in one request
+    - statement listeners (utils/metrics.py) get a per-statement callback
+    """
+
+    _cursor = None
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._cursor.close()
+
+    def _timed(self, fn, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _record_db_time(time.perf_counter() - started)
+
+    def _statement(self, sql, params, fn, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            _record_db_time(elapsed)
+            _observe_statement(sql, params, elapsed)
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        return self._statement(
+            operation, params, self._cursor.execute, operation, params, *args, **kwargs
+        )
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        # log the shape of the first row only
+        first = seq_params[0] if isinstance(seq_params, (list, tuple)) and seq_params else None
+        return self._statement(
+            operation, first, self._cursor.executemany, operation, seq_params, *args, **kwargs
+        )
+
+    def callproc(self, procname, args=(), *more, **kwargs):
+        return self._statement(
+            f"CALL {procname}", args, self._cursor.callproc, procname, args, *more, **kwargs
+        )
+
+    def fetchone(self):
+        return self._timed(self._cursor.fetchone)
+
+    def fetchmany(self, *args, **kwargs):
+        return self._timed(self._cursor.fetchmany, *args, **kwargs)
+
+    def fetchall(self):
+        return self._timed(self._cursor.fetchall)
+
+    def nextset(self):
+        return self._timed(self._cursor.nextset)
+
+
+class PooledConnection:
+    """
+    Thin proxy around a pooled mysql-connector connection.
+
+    Everything is forwarded to the real connection except close(), which
+    hands the connection back to the pool instead of tearing down the socket.
+    That way the routes keep their usual try/finally conn.close() pattern.
+    """
+
+    _conn = None
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise mysql_errors.OperationalError(msg="Connection already returned to the pool")
+        return getattr(self._conn, name)
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs))
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool._checkin(conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __del__(self):
+        # a route forgot conn.close() -- don't leak the pool slot
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """
+    Fixed-size pool of MySQL connections with overflow.
+
+    - size:         connections kept open while idle
+    - max_overflow: extra connections allowed under load, closed when returned
+    - timeout:      seconds to wait for a free connection before PoolError
+    - recycle:      connections idle longer than this (seconds) are reopened
+    - pre_ping:     COM_PING a connection on checkout, reopen if it is dead
+    """
+
+    def __init__(self, size=5, max_overflow=10, timeout=10.0, recycle=1800,
+                 pre_ping=True, connect=_open_connection):
+        self.size = max(1, size)
+        self.max_overflow = max(0, max_overflow)
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.pid = os.getpid()
+
+        self._connect = connect
+        self._idle = deque()  # (conn, last_used)
+        self._total = 0       # open connections, idle + checked out
+        self._cond = threading.Condition()
+
+        # counters for /readyz
+        self._waiting = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._wait_samples = deque(maxlen=1024)  # seconds spent waiting per checkout
+
+    @property
+    def capacity(self):
+        return self.size + self.max_overflow
+
+    def checkout(self, timeout=None):
+        started = time.monotonic()
+        deadline = started + (self.timeout if timeout is None else timeout)
+
+        conn = None
+        with self._cond:
+            while not self._idle and self._total >= self.capacity:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    for fn in _pool_listeners:
+                        fn("timeout")
+                    raise mysql_errors.PoolError(
+                        msg=f"Connection pool exhausted ({self.capacity} connections in use)"
+                    )
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+            self._checkouts += 1
+            self._wait_samples.append(time.monotonic() - started)
+
+            if self._idle:
+                conn, last_used = self._idle.pop()
+            else:
+                self._total += 1
+
+        for fn in _pool_listeners:
+            fn("checkout")
+
+        if conn is None:
+            return PooledConnection(self, self._new_connection())
+
+        if self._is_usable(conn, last_used):
+            return PooledConnection(self, conn)
+
+        # stale or dead; reopen it in the same slot
+        self._close_quietly(conn)
+        return PooledConnection(self, self._new_connection())
+
+    def _new_connection(self):
+        # caller already holds a slot in _total; give it back on failure
+        try:
+            return self._connect()
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            raise
+
+    def _is_usable(self, conn, last_used):
+        if self.recycle and time.monotonic() - last_used > self.recycle:
+            return False
+        if not self.pre_ping:
+            return True
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def _checkin(self, conn):
+        if os.getpid() != self.pid:
+            # inherited across fork(); the socket belongs to the parent
+            return
+
+        healthy = True
+        try:
+            if conn.unread_result:
+                conn.consume_results()
+            if conn.in_transaction:
+                conn.rollback()
+        except Exception:
+            healthy = False
+
+        with self._cond:
+            if healthy and len(self._idle) < self.size:
+                self._idle.append((conn, time.monotonic()))
+                conn = None
+            else:
+                self._total -= 1
+            self._cond.notify()
+
+        if conn is not None:
+            self._close_quietly(conn)
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def stats(self):
+        """Snapshot of pool usage, checkout wait percentiles in ms."""
+        with self._cond:
+            idle = len(self._idle)
+            total = self._total
+            waiting = self._waiting
+            checkouts = self._checkouts
+            timeouts = self._timeouts
+            waits = sorted(self._wait_samples)
+
+        def pct(p):
+            if not waits:
+                return 0.0
+            idx = min(len(waits) - 1, int(round(p / 100.0 * (len(waits) - 1))))
+            return round(waits[idx] * 1000, 3)
+
+        return {
+            "size": self.size,
+            "max_overflow": self.max_overflow,
+            "capacity": self.capacity,
+            "open": total,
+            "idle": idle,
+            "in_use": total - idle,
+            "waiting": waiting,
+            "checkouts": checkouts,
+            "timeouts": timeouts,
+            "wait_ms": {
+                "p50": pct(50),
+                "p95": pct(95),
+                "p99": pct(99),
+                "max": pct(100),
+            },
+        }
+
+    def saturated(self):
+        """True when every connection is checked out and no overflow is left."""
+        with self._cond:
+            return not self._idle and self._total >= self.capacity
+
+    def dispose(self):
+        """Close every idle connection. Checked-out ones close on return."""
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+            self._total -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+# pools inherited from a parent process; kept referenced so their sockets
+# are never closed (and COM_QUIT sent) from the child
+_orphaned_pools = []
+
+
+def _env_flag(name, default):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def get_pool():
+    global _pool
+    pool = _pool
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+
+    with _pool_lock:
+        if _pool is not None and _pool.pid != os.getpid():
+            _orphaned_pools.append(_pool)
+            _pool = None
+        if _pool is None:
+            _pool = ConnectionPool(
+                size=int(os.getenv("MYSQL_POOL_SIZE", 5)),
+                max_overflow=int(os.getenv("MYSQL_POOL_MAX_OVERFLOW", 10)),
+                timeout=float(os.getenv("MYSQL_POOL_TIMEOUT", 10)),
+                recycle=int(os.getenv("MYSQL_POOL_RECYCLE", 1800)),
+                pre_ping=_env_flag("MYSQL_POOL_PRE_PING", True),
+            )
+        return _pool
+
+
+def _reset_pool_after_fork():
+    global _pool, _pool_lock
+    if _pool is not None:
+        _orphaned_pools.append(_pool)
+    _pool = None
+    _pool_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_pool_after_fork)
+
+
+class RequestConnection:
+    """
+    One pooled connection shared by everything that runs inside a request.
+
+    close() is a no-op so routes and helpers (utils/transactions.py) can keep
+    closing what they open; the connection goes back to the pool in the
+    app teardown hook. Transactions nest: only the outermost
+    start_transaction()/commit() pair reaches MySQL, and a rollback anywhere
+    rolls back the whole request's transaction.
+    """
+
+    _conn = None
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._tx_depth = 0
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise mysql_errors.OperationalError(msg="Request connection already released")
+        return getattr(self._conn, name)
+
+    def start_transaction(self, *args, **kwargs):
+        if self._tx_depth == 0 and not self._conn.in_transaction:
+            self._conn.start_transaction(*args, **kwargs)
+        self._tx_depth += 1
+
+    def commit(self):
+        if self._tx_depth > 1:
+            self._tx_depth -= 1
+            return
+        self._tx_depth = 0
+        self._conn.commit()
+
+    def rollback(self):
+        self._tx_depth = 0
+        self._conn.rollback()
+
+    def close(self):
+        pass
+
+    def release(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            # anything still open here was never committed
+            self._tx_depth = 0
+            conn.close()
+
+
+def get_db_connection():
+    """
+    Inside a Flask request: the request's shared connection (checked out on
+    first use, returned to the pool at teardown).
+    Outside a request (startup seeding, scripts): a fresh pool checkout.
+    Either way, call .close() when done, as every route already does.
+    """
+    if not has_request_context():
+        return get_pool().checkout()
+
+    conn = g.get("db_conn")
+    if conn is None:
+        conn = g.db_conn = RequestConnection(get_pool().checkout())
+    return conn
+
+
+def release_request_connection(exc=None):
+    """Hand the request's connection back to the pool (teardown hook)."""
+    conn = g.pop("db_conn", None)
+    if conn is not None:
+        conn.release()
+
+
+def init_app(app):
+    app.teardown_appcontext(release_request_connection)
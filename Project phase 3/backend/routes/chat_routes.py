@@ -1,23 +1,108 @@
 # Jacob Craig 
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response
 from mysql.connector import Error as MySQLError
 from datetime import datetime
+from concurrent.futures import TimeoutError as FutureTimeout
 
 from db import get_db_connection
+from utils.chat_cache import get_chat_cache
+from utils.chat_writer import (
+    CHAT_WRITE_TIMEOUT, ChatWriteQueueFull, add_commit_listener, get_chat_writer, get_write_mode,
+)
+from utils.pubsub import get_broker, sse_stream
+from utils.pagination import NEXT_CURSOR_HEADER, InvalidCursor, cursor_id, encode_cursor
 
 bp = Blueprint("chat", __name__, url_prefix="/groups")
 
 
-@bp.route("/<int:group_id>/chat", methods=["GET"])
-def get_chat_messages(group_id: int):
-    """
-    Returns latest chat messages for a group.
-    Wraps GetChatMessagesForGroup stored procedure.
-    Query param: ?limit=50
-    """
-    limit = request.args.get("limit", default=50, type=int)
+# most messages replayed to a reconnecting chat stream
+CHAT_REPLAY_LIMIT = 200
+
+
+def _chat_channel(group_id):
+    return f"chat:{group_id}"
+
+
+def _publish_message(group_id, message):
+    """Hand a committed message to the recent-message buffer and live streams."""
+    get_chat_cache().append(group_id, message)
+    # push to everyone with the group's chat stream open
+    get_broker().publish(_chat_channel(group_id), message)
+
+
+def _on_batched_commit(pending, message_id, sent):
+    _publish_message(pending.group_id, {
+        "message_id": message_id,
+        "user_id": pending.user_id,
+        "content": pending.content,
+        "sent_time": sent.isoformat() if isinstance(sent, datetime) else sent,
+        "client_seq": pending.client_seq,
+    })
+
+
+add_commit_listener(_on_batched_commit)
+
+
+def _queue_chat_message(group_id, user_id, content, mode):
+    """POST path for CHAT_WRITE_MODE=batch|async (see utils/chat_writer.py)."""
+    try:
+        pending = get_chat_writer().submit(group_id, user_id, content, timeout=CHAT_WRITE_TIMEOUT)
+    except ChatWriteQueueFull:
+        return jsonify({"detail": "Chat is busy, try again"}), 503
+
+    if mode == "async":
+        # acknowledged before it is durable; the stream event carries the same client_seq
+        return jsonify({"client_seq": pending.client_seq, "status": "queued"}), 202
+
+    try:
+        message_id, _ = pending.future.result(timeout=CHAT_WRITE_TIMEOUT)
+    except FutureTimeout:
+        return jsonify({"detail": "Timed out saving message"}), 503
+    except MySQLError as e:
+        return jsonify({"detail": str(e)}), 500
+
+    return jsonify({"message_id": message_id, "client_seq": pending.client_seq}), 201
+
+
+def _latest_messages(group_id, limit):
+    """Latest `limit` messages, newest first: from the ring buffer when it covers them."""
+    cache = get_chat_cache()
+    if not cache.enabled:
+        return _call_message_proc("GetChatMessagesForGroup", (group_id, limit))
+
+    messages = cache.latest(group_id, limit)
+    if messages is not None:
+        return messages
 
+    # read at least a full buffer so the next reads of this group are hits
+    fetch = max(limit, cache.capacity)
+    token = cache.seed_token(group_id)
+    messages = _call_message_proc("GetChatMessagesForGroup", (group_id, fetch))
+    cache.seed(group_id, messages, fetch, token)
+    return messages[:limit]
+
+
+def _messages_after(group_id, after_id, limit):
+    """Messages newer than after_id, oldest first."""
+    messages = get_chat_cache().after(group_id, after_id, limit)
+    if messages is None:
+        messages = _call_message_proc("GetChatMessagesAfter", (group_id, after_id, limit))
+    return messages
+
+
+def _serialize_message(row_dict):
+    sent = row_dict["sent_time"]
+    return {
+        "message_id": row_dict["message_id"],
+        "user_id": row_dict["user_id"],
+        "content": row_dict["content"],
+        "sent_time": sent.isoformat() if isinstance(sent, datetime) else sent,
+    }
+
+
+def _call_message_proc(proc_name, args):
+    """Run one of the chat read procedures and return serialized messages."""
     conn = None
     cursor = None
 
@@ -25,31 +110,15 @@ def get_chat_messages(group_id: int):
         conn = get_db_connection()
         cursor = conn.cursor()
 
-        cursor.callproc("GetChatMessagesForGroup", (group_id, limit))
+        cursor.callproc(proc_name, args)
 
         messages = []
-
         for result in cursor.stored_results():
             rows = result.fetchall()
             col_names = result.column_names  # ['message_id','user_id','content','sent_time']
             for row in rows:
-                row_dict = dict(zip(col_names, row))
-                sent = row_dict["sent_time"]
-                messages.append(
-                    {
-                        "message_id": row_dict["message_id"],
-                        "user_id": row_dict["user_id"],
-                        "content": row_dict["content"],
-                        "sent_time": sent.isoformat()
-                        if isinstance(sent, datetime)
-                        else sent,
-                    }
-                )
-
-        return jsonify(messages), 200
-
-    except MySQLError as e:
-        return jsonify({"detail": str(e)}), 500
+                messages.append(_serialize_message(dict(zip(col_names, row))))
+        return messages
 
     finally:
         if cursor is not None:
@@ -58,11 +127,66 @@ def get_chat_messages(group_id: int):
             conn.close()
 
 
+@bp.route("/<int:group_id>/chat", methods=["GET"])
+def get_chat_messages(group_id: int):
+    """
+    Returns latest chat messages for a group, newest first.
+    Wraps GetChatMessagesForGroup stored procedure.
+    Query param: ?limit=50
+
+    Served from the in-memory ring buffer (utils/chat_cache.py) when it
+    covers the requested window; MySQL otherwise.
+
+    Scrollback: when a full page comes back, the X-Next-Cursor response
+    header holds an opaque cursor; ?before=<cursor> returns the next older
+    page (GetChatMessagesBefore, a keyset seek on (group_id, message_id)).
+
+    Delta mode: ?after_id=<message_id> returns only messages newer than that
+    id, oldest first (GetChatMessagesAfter), or 204 No Content when there are
+    none -- for clients that poll instead of using /chat/stream.
+    """
+    limit = request.args.get("limit", default=50, type=int)
+    after_id = request.args.get("after_id", type=int)
+
+    try:
+        before_id = cursor_id(request.args.get("before"))
+    except InvalidCursor:
+        return jsonify({"detail": "Invalid cursor"}), 400
+
+    try:
+        if after_id is not None:
+            messages = _messages_after(group_id, after_id, limit)
+            if not messages:
+                return "", 204
+            return jsonify(messages), 200
+
+        if before_id is not None:
+            messages = get_chat_cache().before(group_id, before_id, limit)
+            if messages is None:
+                messages = _call_message_proc("GetChatMessagesBefore", (group_id, before_id, limit))
+        else:
+            messages = _latest_messages(group_id, limit)
+
+        headers = {}
+        if messages and len(messages) >= limit:
+            # newest first, so the last row is the oldest one on this page
+            headers[NEXT_CURSOR_HEADER] = encode_cursor({"id": messages[-1]["message_id"]})
+
+        return jsonify(messages), 200, headers
+
+    except MySQLError as e:
+        return jsonify({"detail": str(e)}), 500
+
+
 @bp.route("/<int:group_id>/chat", methods=["POST"])
 def post_chat_message(group_id: int):
     """
     Inserts a new chat message via AddChatMessage.
     Body JSON: { "user_id": 1005, "content": "hello" }
+
+    With CHAT_WRITE_MODE=batch the insert is group-committed with other
+    queued messages (still 201 once durable); with async it returns 202
+    {"client_seq": n} before the message is written.
     """
     data = request.get_json(silent=True) or {}
     user_id = data.get("user_id")
@@ -71,6 +195,10 @@ def post_chat_message(group_id: int):
     if not user_id or not content:
         return jsonify({"detail": "user_id and content are required"}), 400
 
+    mode = get_write_mode()
+    if mode != "sync":
+        return _queue_chat_message(group_id, int(user_id), content, mode)
+
     conn = None
     cursor = None
 
@@ -82,10 +210,12 @@ def post_chat_message(group_id: int):
         cursor.callproc("AddChatMessage", (group_id, int(user_id), content))
 
         message_id = None
+        sent = None
         for result in cursor.stored_results():
             row = result.fetchone()
             if row:
                 message_id = row[0] if not isinstance(row, dict) else row["message_id"]
+                sent = row[1] if len(row) > 1 else None
                 break
 
         conn.commit()
@@ -93,6 +223,13 @@ def post_chat_message(group_id: int):
         if message_id is None:
             return jsonify({"detail": "Failed to create message"}), 500
 
+        _publish_message(group_id, {
+            "message_id": message_id,
+            "user_id": int(user_id),
+            "content": content,
+            "sent_time": sent.isoformat() if isinstance(sent, datetime) else sent,
+        })
+
         return jsonify({"message_id": message_id}), 201
 
     except MySQLError as e:
@@ -105,3 +242,98 @@ def post_chat_message(group_id: int):
             cursor.close()
         if conn is not None:
             conn.close()
+
+
+@bp.route("/<int:group_id>/chat/read", methods=["POST"])
+def mark_chat_read(group_id: int):
+    """
+    Mark the group's chat read for one member.
+    Body JSON: { "user_id": 1005, "message_id": 42 }  (message_id optional: everything)
+
+    Wraps MarkGroupChatRead; returns the new last_read_message_id and unread_count.
+    """
+    data = request.get_json(silent=True) or {}
+    user_id = data.get("user_id")
+    message_id = data.get("message_id")
+
+    if not user_id:
+        return jsonify({"detail": "user_id is required"}), 400
+
+    conn = None
+    cursor = None
+
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor(dictionary=True)
+
+        # the marker's FOR UPDATE lock only holds inside a transaction
+        # (pooled connections autocommit), so a message sent meanwhile waits
+        conn.start_transaction()
+        try:
+            cursor.callproc(
+                "MarkGroupChatRead",
+                (group_id, int(user_id), int(message_id) if message_id else None),
+            )
+        except MySQLError as e:
+            conn.rollback()
+            if "NOT_A_MEMBER" in str(e):
+                return jsonify({"detail": "Not a member of this group"}), 403
+            return jsonify({"detail": str(e)}), 500
+
+        state = None
+        for result in cursor.stored_results():
+            row = result.fetchone()
+            if row:
+                state = row
+                break
+
+        conn.commit()
+
+        return jsonify(state or {"group_id": group_id, "unread_count": 0}), 200
+
+    except MySQLError as e:
+        if conn is not None:
+            conn.rollback()
+        return jsonify({"detail": str(e)}), 500
+
+    finally:
+        if cursor is not None:
+            cursor.close()
+        if conn is not None:
+            conn.close()
+
+
+@bp.route("/<int:group_id>/chat/stream", methods=["GET"])
+def stream_chat_messages(group_id: int):
+    """
+    Server-Sent Events stream of new chat messages for a group.
+    Each event is `event: message` with the same JSON shape as GET /chat items.
+    Replaces polling GET /groups/<id>/chat; load history with that once first.
+
+    On reconnect the browser sends Last-Event-ID (or pass ?after_id=); messages
+    posted while it was away are replayed before live ones.
+    """
+    after_id = request.headers.get("Last-Event-ID", type=int)
+    if after_id is None:
+        after_id = request.args.get("after_id", type=int)
+
+    # subscribe before reading the backlog so nothing falls in between;
+    # sse_stream drops live events the replay already covered
+    sub = get_broker().subscribe(_chat_channel(group_id))
+
+    missed = []
+    if after_id is not None:
+        try:
+            missed = _messages_after(group_id, after_id, CHAT_REPLAY_LIMIT)
+        except MySQLError as e:
+            sub.close()
+            return jsonify({"detail": str(e)}), 500
+
+    return Response(
+        sse_stream(sub, event="message", id_key="message_id", initial=missed),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # don't let nginx buffer the stream
+        },
+    )
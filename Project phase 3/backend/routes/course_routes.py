@@ -1,19 +1,37 @@
 # Jacob Craig
 
+import os
+
 from flask import Blueprint, request, jsonify
 from mysql.connector import Error as MySQLError
 from db import get_db_connection
+from utils.course_search import MODES, get_course_search
+from utils.course_search_cache import get_course_search_cache
 
 bp = Blueprint("courses", __name__, url_prefix="/courses")
 
+# index     -- in-memory n-gram index (utils/course_search.py), default
+# procedure -- CALL SearchCoursesSmart, LIKE '%q%' over Courses per keystroke
+COURSE_SEARCH_BACKEND = os.getenv("COURSE_SEARCH_BACKEND", "index").strip().lower()
+
 
 @bp.route("/search", methods=["GET"])
 def search_courses():
     """
-    Smart search over course_code / course_name.
+    Smart search over course_code / course_name. Served from the in-memory
+    n-gram index with SearchCoursesSmart's ranking unless
+    COURSE_SEARCH_BACKEND=procedure.
 
     Query params:
-      ?q=cos 420&limit=8
+      ?q=cos 420&limit=8&mode=auto
+
+      mode: strict -- substring matches only (SearchCoursesSmart)
+            fuzzy  -- strict matches, then typo-tolerant ones ("datbase systms", "cos420")
+            auto   -- strict, falling back to fuzzy when nothing matches (default)
+      Fuzzy matching needs the index; with COURSE_SEARCH_BACKEND=procedure
+      every mode is strict, and results are cached per worker so a query
+      can be answered from an earlier, shorter one
+      (utils/course_search_cache.py).
 
     Returns:
       [
@@ -28,11 +46,26 @@ def search_courses():
     """
     q = (request.args.get("q") or "").strip()
     limit = request.args.get("limit", default=8, type=int)
+    mode = (request.args.get("mode") or "auto").strip().lower()
+
+    if mode not in MODES:
+        return jsonify({"detail": f"mode must be one of {', '.join(MODES)}"}), 400
 
     if len(q) < 2:
         # too short – avoid spamming DB
         return jsonify([]), 200
 
+    if COURSE_SEARCH_BACKEND != "procedure":
+        try:
+            return jsonify(get_course_search().search(q, limit, mode)), 200
+        except MySQLError as e:
+            return jsonify({"detail": str(e)}), 500
+
+    cache = get_course_search_cache()
+    cached = cache.get(q, limit)
+    if cached is not None:
+        return jsonify(cached), 200
+
     conn = None
     cursor = None
 
@@ -40,8 +73,12 @@ def search_courses():
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
 
+        # fetch past `limit` so the next keystrokes can be filtered from this set
+        fetched = cache.fetch_limit(limit)
+        token = cache.token()
+
         # CALL SearchCoursesSmart(p_query, p_limit)
-        cursor.callproc("SearchCoursesSmart", (q, limit))
+        cursor.callproc("SearchCoursesSmart", (q, fetched))
 
         results = []
         for result in cursor.stored_results():
@@ -56,7 +93,8 @@ def search_courses():
                     }
                 )
 
-        return jsonify(results), 200
+        cache.put(q, results, fetched, token)
+        return jsonify(results[:limit]), 200
 
     except MySQLError as e:
         return jsonify({"detail": str(e)}), 500
@@ -1,12 +1,59 @@
 # Jacob Craig
 
-from flask import Blueprint, request, jsonify
+from datetime import datetime
+
+from flask import Blueprint, request, jsonify, Response
 from mysql.connector import Error as MySQLError
 from db import get_db_connection
+from utils.match_cache import get_suggestions_cache
+from utils.pagination import NEXT_CURSOR_HEADER, InvalidCursor, cursor_id, encode_cursor
+from utils.pubsub import get_broker, sse_stream
 
 bp = Blueprint("dm", __name__, url_prefix="/dm")
 
 
+def _user_channel(user_id):
+    return f"user:{user_id}"
+
+
+def _push_to_user(user_id, event_type, payload):
+    """Publish a typed event to one user's /dm/stream (after the commit)."""
+    payload = dict(payload, type=event_type)
+    for key, value in payload.items():
+        if isinstance(value, datetime):
+            payload[key] = value.isoformat()
+    get_broker().publish(_user_channel(user_id), payload)
+
+
+@bp.route("/stream", methods=["GET"])
+def stream_user_events():
+    """
+    Server-Sent Events stream of everything addressed to one user:
+      - event: dm                -- a new direct message for them
+      - event: message_request   -- someone sent them a message request
+      - event: request_response  -- their request was accepted / rejected
+    Query param: ?user_id=1005
+
+    Replaces polling /dm/<id>/messages, /dm/inbox and /dm/requests. There is
+    no replay: after a reconnect, refetch the inbox once.
+    """
+    user_id = request.args.get("user_id", type=int)
+
+    if not user_id:
+        return jsonify({"detail": "user_id is required"}), 400
+
+    sub = get_broker().subscribe(_user_channel(user_id))
+
+    return Response(
+        sse_stream(sub, event="dm"),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # don't let nginx buffer the stream
+        },
+    )
+
+
 @bp.route("/start", methods=["POST"])
 def start_conversation():
     """
@@ -43,10 +90,12 @@ def start_conversation():
             return jsonify({"detail": msg}), 500
 
         conversation_id = None
+        req = None
         for result in cur.stored_results():
             row = result.fetchone()
             if row:
                 conversation_id = row["conversation_id"]
+                req = row
                 break
 
         conn.commit()
@@ -54,6 +103,19 @@ def start_conversation():
         if conversation_id is None:
             return jsonify({"detail": "Failed to start conversation"}), 500
 
+        # a pending request hides each user from the other's match suggestions
+        get_suggestions_cache().invalidate_users((int(requester_id), int(target_id)))
+
+        # an already-accepted pair just reopens the conversation; no new request to announce
+        if req.get("request_status") == "pending":
+            _push_to_user(int(target_id), "message_request", {
+                "request_id": req.get("request_id"),
+                "requester_user_id": int(requester_id),
+                "target_user_id": int(target_id),
+                "conversation_id": conversation_id,
+                "request_status": "pending",
+            })
+
         return jsonify({"conversation_id": conversation_id}), 200
 
     except MySQLError as e:
@@ -71,18 +133,30 @@ def start_conversation():
 @bp.route("/<int:conversation_id>/messages", methods=["GET"])
 def get_messages(conversation_id: int):
     """
-    Get latest messages for a 1-1 conversation.
+    Get latest messages for a 1-1 conversation (oldest first within the page).
     Wraps GetDirectMessages(p_conversation_id, p_limit).
+
+    Scrollback: a full page sets the X-Next-Cursor response header;
+    ?before=<cursor> returns the page of older messages
+    (GetDirectMessagesBefore, a keyset seek on (conversation_id, message_id)).
     """
     limit = request.args.get("limit", default=50, type=int)
 
+    try:
+        before_id = cursor_id(request.args.get("before"))
+    except InvalidCursor:
+        return jsonify({"detail": "Invalid cursor"}), 400
+
     conn = None
     cur = None
     try:
         conn = get_db_connection()
         cur = conn.cursor(dictionary=True)
 
-        cur.callproc("GetDirectMessages", (conversation_id, limit))
+        if before_id is not None:
+            cur.callproc("GetDirectMessagesBefore", (conversation_id, before_id, limit))
+        else:
+            cur.callproc("GetDirectMessages", (conversation_id, limit))
 
         rows = []
         for result in cur.stored_results():
@@ -92,7 +166,12 @@ def get_messages(conversation_id: int):
                     r["sent_time"] = r["sent_time"].isoformat()
                 rows.append(r)
 
-        return jsonify(rows), 200
+        headers = {}
+        if rows and len(rows) >= limit:
+            # oldest first, so the first row is the oldest one on this page
+            headers[NEXT_CURSOR_HEADER] = encode_cursor({"id": rows[0]["message_id"]})
+
+        return jsonify(rows), 200, headers
 
     except MySQLError as e:
         return jsonify({"detail": str(e)}), 500
@@ -131,10 +210,12 @@ def send_message(conversation_id: int):
         )
 
         message_id = None
+        sent = None
         for result in cur.stored_results():
             row = result.fetchone()
             if row:
                 message_id = row["message_id"]
+                sent = row
                 break
 
         conn.commit()
@@ -142,6 +223,15 @@ def send_message(conversation_id: int):
         if message_id is None:
             return jsonify({"detail": "Failed to send message"}), 500
 
+        if sent.get("recipient_user_id") is not None:
+            _push_to_user(sent["recipient_user_id"], "dm", {
+                "conversation_id": conversation_id,
+                "message_id": message_id,
+                "sender_user_id": int(sender_id),
+                "content": content,
+                "sent_time": sent.get("sent_time"),
+            })
+
         return jsonify({"status": "ok", "message_id": message_id}), 201
 
     except MySQLError as e:
@@ -156,11 +246,74 @@ def send_message(conversation_id: int):
             conn.close()
 
 
+@bp.route("/<int:conversation_id>/read", methods=["POST"])
+def mark_read(conversation_id: int):
+    """
+    Mark a conversation read for one participant.
+    body: { "user_id": 1005, "message_id": 42 }  (message_id optional: everything)
+
+    Wraps MarkDmRead(p_conversation_id, p_user_id, p_message_id); read
+    markers only move forward. Returns the new last_read_message_id and
+    unread_count.
+    """
+    data = request.get_json(silent=True) or {}
+    user_id = data.get("user_id")
+    message_id = data.get("message_id")
+
+    if not user_id:
+        return jsonify({"detail": "user_id is required"}), 400
+
+    conn = None
+    cur = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor(dictionary=True)
+
+        # the marker's FOR UPDATE lock only holds inside a transaction
+        # (pooled connections autocommit), so a message sent meanwhile waits
+        conn.start_transaction()
+        try:
+            cur.callproc(
+                "MarkDmRead",
+                (conversation_id, int(user_id), int(message_id) if message_id else None),
+            )
+        except MySQLError as e:
+            conn.rollback()
+            if "NOT_A_PARTICIPANT" in str(e):
+                return jsonify({"detail": "Not a participant in this conversation"}), 403
+            return jsonify({"detail": str(e)}), 500
+
+        state = None
+        for result in cur.stored_results():
+            row = result.fetchone()
+            if row:
+                state = row
+                break
+
+        conn.commit()
+
+        return jsonify(state or {"conversation_id": conversation_id, "unread_count": 0}), 200
+
+    except MySQLError as e:
+        if conn:
+            conn.rollback()
+        return jsonify({"detail": str(e)}), 500
+
+    finally:
+        if cur:
+            cur.close()
+        if conn:
+            conn.close()
+
+
 @bp.route("/inbox", methods=["GET"])
 def get_inbox():
     """
-    All conversations for a user + last message + request status.
-    Wraps GetDmInboxForUser(p_user_id, p_limit).
+    All conversations for a user + last message + request status + unread_count.
+    last_read_message_id / other_last_read_message_id are the two read
+    markers (read receipts).
+    Wraps GetDmInboxForUser(p_user_id, p_limit), which reads the
+    trigger-maintained DM_Inbox table; last_message is a 255-char preview.
     """
     user_id = request.args.get("user_id", type=int)
     limit = request.args.get("limit", default=50, type=int)
@@ -270,14 +423,26 @@ def respond_to_request(request_id: int, action: str):
             return jsonify({"detail": msg}), 500
 
         new_status = None
+        outcome = None
         for result in cur.stored_results():
             row = result.fetchone()
             if row:
                 new_status = row["request_status"]
+                outcome = row
                 break
 
         conn.commit()
 
+        if outcome is not None and outcome.get("requester_user_id") is not None:
+            # a rejected pair becomes matchable again
+            get_suggestions_cache().invalidate_users((outcome["requester_user_id"], int(user_id)))
+            _push_to_user(outcome["requester_user_id"], "request_response", {
+                "request_id": request_id,
+                "request_status": new_status,
+                "target_user_id": int(user_id),
+                "conversation_id": outcome.get("conversation_id"),
+            })
+
         if new_status is None:
             return jsonify({"status": "ok"}), 200
 
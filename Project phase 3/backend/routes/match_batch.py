@@ -0,0 +1,202 @@
+"""
+Offline batch job: recompute Match_Score for every StudyBuddy Match user.
+
+    python -m routes.match_batch [--workers 4] [--chunk-size 2000] [--top 0]
+
+For cold starts and nightly refreshes. Profiles are loaded once, then the
+sorted user ids are split into chunks and scored across a process pool with
+the engine's vectorized GetStudyBuddyMatches rules (utils/match_engine.py).
+Each worker replaces its chunk's Match_Score rows (those where the chunk's
+users are the viewer) in one transaction: DELETE, then multi-row INSERTs.
+
+Progress is checkpointed after every committed chunk (--checkpoint, one JSON
+line per finished user-id range). Re-running after an interruption skips
+ranges already done. The file is removed when a run completes, so the next
+run starts from scratch; --fresh ignores an existing one.
+
+--top N keeps only each user's N best rows. The default (0) keeps every
+qualifying row like RefreshMatchScoresForUser does. GetPrecomputedMatches
+still filters by age range and message requests at read time, so a cap can
+leave fewer than `limit` suggestions.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from mysql.connector import Error as MySQLError  # noqa: E402
+
+from db import get_db_connection  # noqa: E402
+from utils.course_index import CourseIndex  # noqa: E402
+from utils.match_engine import MatchEngine, pair_scores  # noqa: E402
+
+DEFAULT_CHECKPOINT = os.path.join(os.path.dirname(__file__), "..", "match_batch.checkpoint")
+
+# rows per INSERT statement
+INSERT_BATCH = 1000
+
+# set in each worker by _init_worker
+_table = None
+_index = None
+
+
+def _init_worker(table):
+    global _table, _index
+    _table = table
+    _index = CourseIndex.from_table(table)
+
+
+def _score_chunk(user_ids, top):
+    rows = []
+    for user_id in user_ids:
+        other_ids, scores, shared = pair_scores(_table, _index, user_id)
+        if top and len(other_ids) > top:
+            # GetPrecomputedMatches order: score DESC, shared DESC, other id
+            order = np.lexsort((other_ids, -shared.astype(np.int32), -scores.astype(np.int32)))[:top]
+            other_ids, scores, shared = other_ids[order], scores[order], shared[order]
+        rows.extend(zip([user_id] * len(other_ids), other_ids.tolist(), scores.tolist(), shared.tolist()))
+    return rows
+
+
+def _write_chunk(user_ids, rows):
+    conn = None
+    cur = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        conn.start_transaction()
+        # by id, not by range: after a resume a chunk's range can span finished users
+        for start in range(0, len(user_ids), INSERT_BATCH):
+            batch = user_ids[start:start + INSERT_BATCH]
+            cur.execute(
+                "DELETE FROM Match_Score WHERE user_id IN (" + ", ".join(["%s"] * len(batch)) + ")",
+                batch,
+            )
+        for start in range(0, len(rows), INSERT_BATCH):
+            batch = rows[start:start + INSERT_BATCH]
+            cur.execute(
+                "INSERT INTO Match_Score (user_id, other_user_id, score, shared_courses) VALUES "
+                + ", ".join(["(%s, %s, %s, %s)"] * len(batch)),
+                [value for row in batch for value in row],
+            )
+        conn.commit()
+    except MySQLError:
+        if conn is not None:
+            conn.rollback()
+        raise
+    finally:
+        if cur is not None:
+            cur.close()
+        if conn is not None:
+            conn.close()
+
+
+def run_chunk(user_ids, top, dry_run):
+    """Worker entry point: score and write one chunk; returns (lo, hi, users, rows, seconds)."""
+    started = time.perf_counter()
+    rows = _score_chunk(user_ids, top)
+    lo, hi = user_ids[0], user_ids[-1]
+    if not dry_run:
+        _write_chunk(user_ids, rows)
+    return lo, hi, len(user_ids), len(rows), time.perf_counter() - started
+
+
+def read_checkpoint(path):
+    done = []
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    entry = json.loads(line)
+                    done.append((entry["lo"], entry["hi"]))
+    return done
+
+
+def pending_chunks(user_ids, done, chunk_size):
+    """Chunks of the user ids not covered by a finished range."""
+    if done:
+        covered = np.zeros(len(user_ids), dtype=bool)
+        for lo, hi in done:
+            covered |= (user_ids >= lo) & (user_ids <= hi)
+        user_ids = user_ids[~covered]
+    return [user_ids[i:i + chunk_size].tolist() for i in range(0, len(user_ids), chunk_size)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--chunk-size", type=int, default=2000, help="users per chunk / transaction")
+    parser.add_argument("--top", type=int, default=0, help="keep each user's N best rows (0 = all)")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT)
+    parser.add_argument("--fresh", action="store_true", help="ignore an existing checkpoint")
+    parser.add_argument("--dry-run", action="store_true", help="score everything, write nothing")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    table = MatchEngine(ttl=float("inf")).table()
+    print(f"loaded {len(table):,} profiles in {time.perf_counter() - t0:.1f}s")
+
+    if args.fresh and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    done = [] if args.dry_run else read_checkpoint(args.checkpoint)
+    chunks = pending_chunks(table.user_ids, done, max(1, args.chunk_size))
+    total_users = sum(len(c) for c in chunks)
+    if done:
+        print(f"resuming: {len(done)} chunks already done, {total_users:,} users left")
+    if not chunks:
+        print("nothing to do")
+        return
+
+    failures = 0
+    users_done = rows_done = 0
+    started = time.perf_counter()
+    checkpoint = None if args.dry_run else open(args.checkpoint, "a")
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                                 initargs=(table,)) as pool:
+            futures = [pool.submit(run_chunk, chunk, args.top, args.dry_run) for chunk in chunks]
+            for future in as_completed(futures):
+                try:
+                    lo, hi, users, rows, seconds = future.result()
+                except Exception as e:
+                    failures += 1
+                    print(f"chunk failed: {e}", file=sys.stderr)
+                    continue
+
+                if checkpoint is not None:
+                    checkpoint.write(json.dumps({"lo": lo, "hi": hi, "users": users, "rows": rows}) + "\n")
+                    checkpoint.flush()
+
+                users_done += users
+                rows_done += rows
+                elapsed = time.perf_counter() - started
+                rate = users_done / elapsed if elapsed else 0.0
+                eta = (total_users - users_done) / rate if rate else 0.0
+                print(f"users {lo}-{hi}: {rows:,} rows in {seconds:.1f}s | "
+                      f"{users_done:,}/{total_users:,} users, {rate:,.0f} users/s, "
+                      f"{rows_done / elapsed:,.0f} rows/s, eta {eta:.0f}s")
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"\n{users_done:,} users, {rows_done:,} Match_Score rows in {elapsed:.1f}s "
+          f"({users_done / elapsed:,.0f} users/s, {rows_done / elapsed:,.0f} rows/s, {args.workers} workers)")
+
+    if failures:
+        print(f"{failures} chunks failed; re-run to resume from {args.checkpoint}", file=sys.stderr)
+        sys.exit(1)
+    if checkpoint is not None and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,12 +3,24 @@
 from flask import Blueprint, request, jsonify, current_app
 from mysql.connector import Error as MySQLError
 from db import get_db_connection
+from utils.image_pipeline import UnsupportedImage, check_image, get_image_pipeline, upload_path, variant_names
+from utils.match_cache import get_suggestions_cache
+from utils.match_engine import get_match_engine
 from werkzeug.utils import secure_filename
+import logging
 import os
 import uuid
 
 bp = Blueprint("match", __name__)
 
+logger = logging.getLogger("studybuddy.match")
+
+# where /match/suggestions reads from:
+#   precomputed -- GetPrecomputedMatches over the Match_Score table (default)
+#   procedure   -- GetStudyBuddyMatches, re-scores every candidate per request
+#   engine      -- utils/match_engine.py, NumPy scoring over profiles held in memory
+MATCH_SUGGESTIONS_BACKEND = os.getenv("MATCH_SUGGESTIONS_BACKEND", "precomputed").strip().lower()
+
 
 @bp.route("/match/profile", methods=["GET"])
 def get_match_profile():
@@ -120,6 +132,9 @@ def upsert_match_profile():
         conn = get_db_connection()
         cur = conn.cursor(dictionary=True)
 
+        # profile, course list and Match_Score rows commit together (or not at all)
+        conn.start_transaction()
+
         cur.execute(
             "CALL UpsertMatchProfile(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
             (
@@ -140,6 +155,11 @@ def upsert_match_profile():
         while cur.nextset():
             pass
 
+        cur.execute(
+            "SELECT course_id FROM Match_Profile_Course WHERE user_id = %s", (user_id,)
+        )
+        old_course_ids = [r["course_id"] for r in cur.fetchall()]
+
         # reset course list
         cur.execute(
             "DELETE FROM Match_Profile_Course WHERE user_id = %s", (user_id,)
@@ -155,7 +175,30 @@ def upsert_match_profile():
                 values,
             )
 
+        # re-score only the pairs this user is part of, in the same transaction
+        cur.callproc("RefreshMatchScoresForUser", (user_id,))
+
+        # cached suggestions that may list this user: anyone on the old or new courses
+        cache = get_suggestions_cache()
+        affected = {int(user_id)}
+        touched = list(set(old_course_ids) | set(course_ids))
+        if cache.enabled and touched:
+            placeholders = ", ".join(["%s"] * len(touched))
+            cur.execute(
+                f"SELECT DISTINCT user_id FROM Match_Profile_Course WHERE course_id IN ({placeholders})",
+                touched,
+            )
+            affected.update(r["user_id"] for r in cur.fetchall())
+
         conn.commit()
+        cache.invalidate_users(affected)
+
+        if MATCH_SUGGESTIONS_BACKEND == "engine":
+            try:
+                get_match_engine().refresh_user(user_id)
+            except MySQLError:
+                # saved already; the engine catches up on its next reload
+                logger.exception("match engine refresh failed for user %s", user_id)
 
         return jsonify({"status": "ok"}), 200
 
@@ -174,10 +217,73 @@ def upsert_match_profile():
             pass
 
 
+def _engine_matches(cur, user_id, limit):
+    """
+    GetStudyBuddyMatches rows, ranked by the in-memory engine; MySQL is only
+    asked for the caller's message requests and the display columns.
+    """
+    cur.execute(
+        """
+        SELECT target_user_id AS other_user_id FROM Message_Request
+        WHERE requester_user_id = %s AND request_status IN ('pending', 'accepted')
+        UNION
+        SELECT requester_user_id FROM Message_Request
+        WHERE target_user_id = %s AND request_status IN ('pending', 'accepted')
+        """,
+        (user_id, user_id),
+    )
+    blocked = {r["other_user_id"] for r in cur.fetchall()}
+
+    ranked = get_match_engine().suggest(user_id, limit, blocked)
+    if not ranked:
+        return []
+
+    placeholders = ", ".join(["%s"] * len(ranked))
+    cur.execute(
+        f"""
+        SELECT
+          u.user_id AS other_user_id,
+          u.first_name,
+          u.last_name,
+          u.college_id,
+          mp.study_style,
+          mp.meeting_pref,
+          mp.study_goal,
+          mp.focus_time_pref,
+          mp.noise_pref,
+          mp.age,
+          mp.preferred_min_age,
+          mp.preferred_max_age,
+          mp.bio,
+          mp.profile_image_url
+        FROM Match_Profile mp
+        JOIN Users u ON u.user_id = mp.user_id
+        WHERE mp.user_id IN ({placeholders})
+        """,
+        [other_id for other_id, _, _ in ranked],
+    )
+    by_id = {r["other_user_id"]: r for r in cur.fetchall()}
+
+    rows = []
+    for other_id, score, shared in ranked:
+        row = by_id.get(other_id)
+        if row is None:
+            # profile deleted since the engine loaded it
+            continue
+        row["shared_courses"] = shared
+        row["match_score"] = score
+        rows.append(row)
+    return rows
+
+
 @bp.route("/match/suggestions", methods=["GET"])
 def get_study_buddy_matches():
     """
-    Get match suggestions for a user on StudyBuddy Match
+    Get match suggestions for a user on StudyBuddy Match.
+    Reads the precomputed Match_Score top-N (GetPrecomputedMatches) unless
+    MATCH_SUGGESTIONS_BACKEND=procedure selects GetStudyBuddyMatches or
+    MATCH_SUGGESTIONS_BACKEND=engine scores in memory. Results are cached
+    per (user, limit) until a related profile or message request changes.
     """
     user_id = request.args.get("user_id", type=int)
     limit = request.args.get("limit", default=20, type=int)
@@ -185,6 +291,12 @@ def get_study_buddy_matches():
     if not user_id:
         return jsonify({"detail": "user_id is required"}), 400
 
+    cache = get_suggestions_cache()
+    cached = cache.get(user_id, limit)
+    if cached is not None:
+        return jsonify(cached), 200
+    token = cache.token(user_id)
+
     conn = None
     cur = None
 
@@ -192,12 +304,16 @@ def get_study_buddy_matches():
         conn = get_db_connection()
         cur = conn.cursor(dictionary=True)
 
-        cur.execute("CALL GetStudyBuddyMatches(%s, %s)", (user_id, limit))
+        if MATCH_SUGGESTIONS_BACKEND == "engine":
+            rows = _engine_matches(cur, user_id, limit)
+        else:
+            proc = "GetStudyBuddyMatches" if MATCH_SUGGESTIONS_BACKEND == "procedure" else "GetPrecomputedMatches"
+            cur.execute(f"CALL {proc}(%s, %s)", (user_id, limit))
 
-        rows = cur.fetchall() or []
+            rows = cur.fetchall() or []
 
-        while cur.nextset():
-            pass
+            while cur.nextset():
+                pass
 
         formatted = []
         for r in rows:
@@ -205,6 +321,7 @@ def get_study_buddy_matches():
             r["match_score"] = int(r.get("match_score", 0) or 0)
             formatted.append(r)
 
+        cache.put(user_id, limit, formatted, token)
         return jsonify(formatted), 200
 
     except MySQLError as e:
@@ -224,6 +341,8 @@ def get_study_buddy_matches():
 def upload_profile_image():
     """
     Upload a profile image and return a URL that can be stored in Match_Profile.
+    Resized WebP/JPEG variants are encoded in the background; their URLs are
+    returned right away and are served as soon as they are ready.
     """
     if "file" not in request.files:
         return jsonify({"detail": "No file uploaded"}), 400
@@ -237,16 +356,25 @@ def upload_profile_image():
     if ext.lower() not in [".png", ".jpg", ".jpeg", ".gif", ".webp"]:
         return jsonify({"detail": "Unsupported file type"}), 400
 
+    try:
+        check_image(file.stream)
+    except UnsupportedImage:
+        return jsonify({"detail": "Unsupported file type"}), 400
+
     upload_folder = current_app.config.get("UPLOAD_FOLDER")
     if not upload_folder:
         return jsonify({"detail": "Upload folder not configured"}), 500
 
-    new_name = f"{uuid.uuid4().hex}{ext.lower()}"
-    save_path = os.path.join(upload_folder, new_name)
-    file.save(save_path)
+    image_id = uuid.uuid4().hex
+    raw_path = upload_path(upload_folder, image_id)
+    file.save(raw_path)
+    get_image_pipeline().submit(raw_path, upload_folder, image_id)
 
-    # absolute URL back to frontend
+    # absolute URLs back to frontend
     base = request.url_root.rstrip("/")
-    file_url = f"{base}/uploads/{new_name}"
+    variants = {
+        variant: {ext: f"{base}/uploads/{name}" for ext, name in names.items()}
+        for variant, names in variant_names(image_id).items()
+    }
 
-    return jsonify({"url": file_url}), 201
+    return jsonify({"url": variants["full"]["jpg"], "variants": variants}), 201
@@ -0,0 +1,74 @@
+from flask import Blueprint, jsonify, Response
+from mysql.connector import Error as MySQLError
+import time
+
+from db import get_pool
+from utils.metrics import REGISTRY
+
+bp = Blueprint("monitoring", __name__)
+
+# how long /readyz waits for a pooled connection before calling the worker unready
+READY_CHECKOUT_TIMEOUT = 0.5
+
+
+@bp.route("/healthz", methods=["GET"])
+def healthz():
+    """
+    Liveness: the process is up and serving. Never touches MySQL.
+    """
+    return jsonify({"status": "ok"}), 200
+
+
+@bp.route("/readyz", methods=["GET"])
+def readyz():
+    """
+    Readiness: can this worker serve DB-backed requests right now?
+
+    503 when the pool is saturated (every connection checked out) or MySQL
+    does not answer a ping. The body always carries the pool stats:
+      {
+        "status": "ready" | "saturated" | "db_unavailable",
+        "db_ping_ms": 0.41,
+        "pool": { "size", "in_use", "idle", "waiting", "wait_ms": {...}, ... }
+      }
+    """
+    pool = get_pool()
+
+    if pool.saturated():
+        return jsonify({
+            "status": "saturated",
+            "db_ping_ms": None,
+            "pool": pool.stats(),
+        }), 503
+
+    conn = None
+    try:
+        conn = pool.checkout(timeout=READY_CHECKOUT_TIMEOUT)
+        started = time.perf_counter()
+        conn.ping(reconnect=False)
+        ping_ms = round((time.perf_counter() - started) * 1000, 3)
+    except MySQLError as e:
+        return jsonify({
+            "status": "db_unavailable",
+            "detail": str(e),
+            "db_ping_ms": None,
+            "pool": pool.stats(),
+        }), 503
+    finally:
+        if conn is not None:
+            conn.close()
+
+    return jsonify({
+        "status": "ready",
+        "db_ping_ms": ping_ms,
+        "pool": pool.stats(),
+    }), 200
+
+
+@bp.route("/metrics", methods=["GET"])
+def metrics():
+    """
+    Prometheus scrape endpoint: per-endpoint request counts, latency and
+    response-size histograms, DB time per request, and pool gauges.
+    """
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
@@ -2,7 +2,7 @@
 import os
 from flask import Blueprint, request, jsonify, session, current_app
 from db import get_db_connection
-from werkzeug.utils import secure_filename
+from utils.static_files import save_content_addressed
 
 bp = Blueprint("resources", __name__)
 
@@ -151,15 +151,13 @@ def upload_resource_file():
     if not _allowed_resource_file(file.filename):
         return jsonify({"error": "Unsupported file type"}), 400
 
-    filename = secure_filename(file.filename)
+    ext = file.filename.rsplit(".", 1)[1].lower()
 
-    # uploads/resources/<filename>
+    # uploads/resources/<sha256>.<ext>: the name changes with the content,
+    # so /uploads can serve it as immutable
     base_upload = current_app.config["UPLOAD_FOLDER"]
     resources_dir = os.path.join(base_upload, "resources")
-    os.makedirs(resources_dir, exist_ok=True)
-
-    full_path = os.path.join(resources_dir, filename)
-    file.save(full_path)
+    filename = save_content_addressed(file, resources_dir, ext)
 
     relative_path = f"resources/{filename}"
     url = f"/uploads/{relative_path}"
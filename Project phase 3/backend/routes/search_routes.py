@@ -0,0 +1,94 @@
+from flask import Blueprint, request, jsonify
+from mysql.connector import Error as MySQLError
+from db import get_db_connection
+
+bp = Blueprint("search", __name__)
+
+# SearchAllContent's limit arguments and result sets, in order
+SEARCH_TYPES = ("courses", "quizzes", "flashcard_sets", "resources")
+
+DEFAULT_PER_TYPE = 5
+MAX_PER_TYPE = 20
+
+
+def _per_type_limits(args):
+    """
+    ?limit=5 caps every type; ?types=courses,quizzes restricts which are
+    searched; ?courses=8 etc. overrides one type's cap.
+    """
+    default = min(max(args.get("limit", default=DEFAULT_PER_TYPE, type=int), 0), MAX_PER_TYPE)
+    wanted = args.get("types")
+    wanted = {t.strip() for t in wanted.split(",")} if wanted else set(SEARCH_TYPES)
+
+    unknown = wanted - set(SEARCH_TYPES)
+    if unknown:
+        raise ValueError(f"unknown types: {', '.join(sorted(unknown))}")
+
+    limits = {}
+    for name in SEARCH_TYPES:
+        if name not in wanted:
+            limits[name] = 0
+            continue
+        cap = args.get(name, default=default, type=int)
+        limits[name] = min(max(cap, 0), MAX_PER_TYPE)
+    return limits
+
+
+@bp.route("/search", methods=["GET"])
+def search_all():
+    """
+    Unified search over courses, quizzes, flashcard sets and resources
+    (FULLTEXT ngram indexes, see SearchAllContent).
+
+    Query params:
+      ?q=database&limit=5&types=courses,resources&quizzes=10
+
+    Returns:
+      {
+        "query": "database",
+        "results": {
+          "courses": [{course_id, course_code, course_name, college_name, relevance}],
+          "quizzes": [{quiz_id, title, description, course_id, created_at, relevance}],
+          "flashcard_sets": [{set_id, title, description, course_id, created_at, relevance}],
+          "resources": [{resource_id, title, description, filetype, source, upload_date, relevance}]
+        }
+      }
+    Each list is ordered by relevance and capped by its own limit.
+    """
+    q = (request.args.get("q") or "").strip()
+
+    try:
+        limits = _per_type_limits(request.args)
+    except ValueError as e:
+        return jsonify({"detail": str(e)}), 400
+
+    results = {name: [] for name in SEARCH_TYPES}
+    # ngram tokens are 2 characters by default; shorter queries can't match
+    if len(q) < 2 or not any(limits.values()):
+        return jsonify({"query": q, "results": results}), 200
+
+    conn = None
+    cur = None
+
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor(dictionary=True)
+
+        cur.callproc("SearchAllContent", (q[:255], *(limits[name] for name in SEARCH_TYPES)))
+
+        for name, result in zip(SEARCH_TYPES, cur.stored_results()):
+            rows = result.fetchall()
+            for r in rows:
+                r["relevance"] = round(float(r.get("relevance") or 0), 4)
+            results[name] = rows
+
+        return jsonify({"query": q, "results": results}), 200
+
+    except MySQLError as e:
+        return jsonify({"detail": str(e)}), 500
+
+    finally:
+        if cur is not None:
+            cur.close()
+        if conn is not None:
+            conn.close()
@@ -7,10 +7,30 @@ from flask import Blueprint, request, jsonify
 from mysql.connector import Error as MySQLError
 
 from db import get_db_connection
+from utils.pagination import NEXT_CURSOR_HEADER, InvalidCursor, decode_cursor, encode_cursor
 
 bp = Blueprint("studygroups", __name__, url_prefix="/groups")
 
 
+def _arg_flag(name):
+    value = request.args.get(name)
+    return value is not None and value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _public_groups_cursor(cursor):
+    """(session_key, member_count, group_id) of the last group on the previous page."""
+    key = decode_cursor(cursor)
+    if key is None:
+        return None, None, None
+    session, members, group_id = key.get("s"), key.get("m"), key.get("g")
+    if not isinstance(members, int) or not isinstance(group_id, int) or not isinstance(session, str):
+        raise InvalidCursor("cursor is missing its sort key")
+    try:
+        return date.fromisoformat(session), members, group_id
+    except ValueError as e:
+        raise InvalidCursor(str(e))
+
+
 @bp.route("", methods=["POST"])
 def create_group():
     """
@@ -143,8 +163,16 @@ def request_join_group(group_id: int):
 def get_public_groups():
     """
     Returns public groups for a course, ordered by last_session + member count.
-    Wraps the GetPublicGroupsForCourse stored procedure.
-    Query params: ?course_id=420&limit=20
+    Wraps the GetPublicGroupsPage stored procedure (keyset pages read from
+    Group_Summary).
+    Query params: ?course_id=420&limit=20&has_space=1&this_week=1
+
+      has_space -- only groups with a free seat
+      this_week -- only groups with a session in the current week (Mon-Sun)
+
+    When a full page comes back, the X-Next-Cursor response header holds an
+    opaque cursor; ?after=<cursor> (with the same filters) returns the next
+    page.
     """
     course_id = request.args.get("course_id", type=int)
     limit = request.args.get("limit", default=20, type=int)
@@ -152,6 +180,11 @@ def get_public_groups():
     if not course_id:
         return jsonify({"detail": "Missing course_id"}), 400
 
+    try:
+        after_session, after_members, after_group = _public_groups_cursor(request.args.get("after"))
+    except InvalidCursor:
+        return jsonify({"detail": "Invalid cursor"}), 400
+
     conn = None
     cursor = None
 
@@ -159,9 +192,21 @@ def get_public_groups():
         conn = get_db_connection()
         cursor = conn.cursor()
 
-        cursor.callproc("GetPublicGroupsForCourse", (course_id, limit))
+        cursor.callproc(
+            "GetPublicGroupsPage",
+            (
+                course_id,
+                limit,
+                after_session,
+                after_members,
+                after_group,
+                _arg_flag("has_space"),
+                _arg_flag("this_week"),
+            ),
+        )
 
         groups = []
+        last_key = None
 
         for result in cursor.stored_results():
             rows = result.fetchall()
@@ -181,8 +226,17 @@ def get_public_groups():
                         "last_session": row_dict.get("last_session"),
                     }
                 )
+                last_key = {
+                    "s": row_dict["session_key"].isoformat(),
+                    "m": safe_members,
+                    "g": row_dict["group_id"],
+                }
 
-        return jsonify(groups), 200
+        headers = {}
+        if last_key is not None and len(groups) >= limit:
+            headers[NEXT_CURSOR_HEADER] = encode_cursor(last_key)
+
+        return jsonify(groups), 200, headers
 
     except MySQLError as e:
         return jsonify({"detail": str(e)}), 500
@@ -0,0 +1,49 @@
+from flask import Blueprint, request, jsonify
+from mysql.connector import Error as MySQLError
+
+from db import get_db_connection
+
+bp = Blueprint("unread", __name__)
+
+
+@bp.route("/unread", methods=["GET"])
+def get_unread_counts():
+    """
+    All unread counts for a user in one call, for badges.
+    Wraps GetUnreadCountsForUser(p_user_id).
+    Query param: ?user_id=1005
+
+    Response: { "dm": {"<conversation_id>": n}, "groups": {"<group_id>": n},
+                "total": n }. Only conversations/groups with unread messages appear.
+    """
+    user_id = request.args.get("user_id", type=int)
+
+    if not user_id:
+        return jsonify({"detail": "user_id is required"}), 400
+
+    conn = None
+    cur = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor(dictionary=True)
+
+        cur.callproc("GetUnreadCountsForUser", (user_id,))
+
+        counts = {"dm": {}, "groups": {}}
+        total = 0
+        for result in cur.stored_results():
+            for r in result.fetchall():
+                bucket = counts["dm"] if r["kind"] == "dm" else counts["groups"]
+                bucket[str(r["id"])] = int(r["unread_count"])
+                total += int(r["unread_count"])
+
+        counts["total"] = total
+        return jsonify(counts), 200
+
+    except MySQLError as e:
+        return jsonify({"detail": str(e)}), 500
+    finally:
+        if cur:
+            cur.close()
+        if conn:
+            conn.close()
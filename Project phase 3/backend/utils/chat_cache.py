@@ -0,0 +1,206 @@
+"""
+Per-group ring buffer of recent chat messages.
+
+Most chat reads ask for the same latest page of a few hot groups. Each
+worker keeps the newest CHAT_CACHE_MESSAGES messages of recently read
+groups in memory. The buffer is seeded on the first read and extended by
+post_chat_message. Idle groups are evicted LRU-first once there are more
+than CHAT_CACHE_MAX_GROUPS or the buffers pass CHAT_CACHE_MAX_BYTES.
+
+A buffer only sees writes made by its own worker, so every buffer is
+reseeded from MySQL CHAT_CACHE_TTL seconds after it was loaded. With
+several workers a reader can lag writes on another worker by up to that
+long. With one worker the buffer is always exact.
+
+Set CHAT_CACHE_MESSAGES=0 to turn the cache off.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+
+from utils.metrics import CACHE_BYTES, CACHE_ENTRIES, CACHE_EVICTIONS, CACHE_REQUESTS, REGISTRY
+
+CACHE_NAME = "chat"
+
+CHAT_CACHE_MESSAGES = int(os.getenv("CHAT_CACHE_MESSAGES", "200"))
+CHAT_CACHE_MAX_GROUPS = int(os.getenv("CHAT_CACHE_MAX_GROUPS", "1000"))
+CHAT_CACHE_MAX_BYTES = int(os.getenv("CHAT_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+CHAT_CACHE_TTL = float(os.getenv("CHAT_CACHE_TTL", "5"))
+
+# write counters are striped by group so a seed can tell whether a post raced it
+_WRITE_STRIPES = 64
+
+# rough per-message overhead (dict + ints + timestamp string) on top of the content
+_MESSAGE_OVERHEAD = 400
+
+
+def _message_size(message):
+    return _MESSAGE_OVERHEAD + sys.getsizeof(message.get("content") or "")
+
+
+class _GroupBuffer:
+    __slots__ = ("messages", "complete", "loaded_at", "size")
+
+    def __init__(self, messages, complete, capacity):
+        # oldest -> newest, ids strictly increasing
+        self.messages = deque(messages, maxlen=capacity)
+        # True when no older messages exist in MySQL than the oldest one here
+        self.complete = complete
+        self.loaded_at = time.monotonic()
+        self.size = sum(_message_size(m) for m in self.messages)
+
+
+class ChatCache:
+    def __init__(self, capacity=CHAT_CACHE_MESSAGES, max_groups=CHAT_CACHE_MAX_GROUPS,
+                 max_bytes=CHAT_CACHE_MAX_BYTES, ttl=CHAT_CACHE_TTL):
+        self.capacity = capacity
+        self.max_groups = max_groups
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._groups = OrderedDict()
+        self._bytes = 0
+        self._writes = [0] * _WRITE_STRIPES
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.capacity > 0
+
+    def _buffer(self, group_id):
+        """Live buffer for a group (marked most recently used), or None. Caller holds the lock."""
+        buf = self._groups.get(group_id)
+        if buf is None:
+            return None
+        if time.monotonic() - buf.loaded_at > self.ttl:
+            self._drop(group_id)
+            return None
+        self._groups.move_to_end(group_id)
+        return buf
+
+    def _drop(self, group_id):
+        buf = self._groups.pop(group_id, None)
+        if buf is not None:
+            self._bytes -= buf.size
+
+    def _evict(self):
+        while self._groups and (len(self._groups) > self.max_groups or self._bytes > self.max_bytes):
+            group_id = next(iter(self._groups))
+            self._drop(group_id)
+            CACHE_EVICTIONS.inc(cache=CACHE_NAME)
+
+    def _count(self, hit):
+        CACHE_REQUESTS.inc(cache=CACHE_NAME, result="hit" if hit else "miss")
+
+    # reads -- each returns None when the buffer can't answer exactly
+
+    def latest(self, group_id, limit):
+        """Newest `limit` messages, newest first."""
+        with self._lock:
+            buf = self._buffer(group_id)
+            hit = buf is not None and (limit <= len(buf.messages) or buf.complete)
+            if hit:
+                result = list(buf.messages)[-limit:][::-1] if limit > 0 else []
+        self._count(hit)
+        return result if hit else None
+
+    def after(self, group_id, after_id, limit):
+        """Up to `limit` messages with id > after_id, oldest first."""
+        with self._lock:
+            buf = self._buffer(group_id)
+            # the buffer holds every message from its oldest id onwards
+            hit = buf is not None and (
+                buf.complete or (bool(buf.messages) and after_id >= buf.messages[0]["message_id"])
+            )
+            if hit:
+                result = [m for m in buf.messages if m["message_id"] > after_id][:limit]
+        self._count(hit)
+        return result if hit else None
+
+    def before(self, group_id, before_id, limit):
+        """Up to `limit` messages with id < before_id, newest first."""
+        with self._lock:
+            buf = self._buffer(group_id)
+            hit = False
+            if buf is not None:
+                older = [m for m in buf.messages if m["message_id"] < before_id]
+                hit = len(older) >= limit or buf.complete
+                if hit:
+                    result = older[::-1][:limit]
+        self._count(hit)
+        return result if hit else None
+
+    # writes
+
+    def seed_token(self, group_id):
+        """Take before reading the rows passed to seed()."""
+        with self._lock:
+            return self._writes[group_id % _WRITE_STRIPES]
+
+    def seed(self, group_id, newest_first, requested, token):
+        """
+        Load a group from a GetChatMessagesForGroup result (newest first).
+        `requested` is the limit that query ran with; a shorter result means
+        the group has no older messages. Skipped if a message was posted
+        since `token` was taken: the rows may or may not include it.
+        """
+        if not self.enabled:
+            return
+        rows = newest_first[:self.capacity][::-1]
+        complete = len(newest_first) < requested and len(rows) == len(newest_first)
+        buf = _GroupBuffer(rows, complete, self.capacity)
+        with self._lock:
+            if self._writes[group_id % _WRITE_STRIPES] != token:
+                return
+            self._drop(group_id)
+            self._groups[group_id] = buf
+            self._bytes += buf.size
+            self._evict()
+
+    def append(self, group_id, message):
+        """Add a message this worker just committed. Ignored for groups not cached."""
+        with self._lock:
+            self._writes[group_id % _WRITE_STRIPES] += 1
+            buf = self._buffer(group_id)
+            if buf is None:
+                return
+            if buf.messages and message["message_id"] <= buf.messages[-1]["message_id"]:
+                # concurrent posts committed out of id order; reload rather than reorder
+                self._drop(group_id)
+                return
+            delta = _message_size(message)
+            if len(buf.messages) == buf.messages.maxlen:
+                # the deque drops its oldest message on append
+                delta -= _message_size(buf.messages[0])
+                buf.complete = False
+            buf.messages.append(message)
+            buf.size += delta
+            self._bytes += delta
+            self._evict()
+
+    def invalidate(self, group_id):
+        with self._lock:
+            self._writes[group_id % _WRITE_STRIPES] += 1
+            self._drop(group_id)
+
+    def stats(self):
+        with self._lock:
+            return {"groups": len(self._groups), "bytes": self._bytes}
+
+
+_cache = ChatCache()
+
+
+def _collect_stats():
+    stats = _cache.stats()
+    CACHE_ENTRIES.set(stats["groups"], cache=CACHE_NAME)
+    CACHE_BYTES.set(stats["bytes"], cache=CACHE_NAME)
+
+
+REGISTRY.add_collector(_collect_stats)
+
+
+def get_chat_cache():
+    return _cache
@@ -0,0 +1,238 @@
+"""
+Batched (group-commit / write-behind) inserts for group chat messages.
+
+CHAT_WRITE_MODE picks how POST /groups/<id>/chat writes:
+
+- sync (default): one AddChatMessage call and commit per request.
+- batch: the request is queued and waits. A writer thread commits
+  everything queued in the last CHAT_WRITE_FLUSH_MS milliseconds (or
+  CHAT_WRITE_BATCH_SIZE messages) in one transaction. Still durable when
+  the 201 goes out, but one commit/fsync covers the whole batch.
+- async: the request is queued and answered 202 at once with a
+  `client_seq`. The message is written with the next batch. A crash, or
+  a batch MySQL rejects, loses messages that were already acknowledged --
+  at most one flush window's worth. Only use it where that is acceptable.
+
+Every queued message gets a per-process `client_seq` up front. In async mode
+it is also on the live-stream event, so a client can match its own post.
+Messages are published to chat streams and the recent-message buffer only
+after their batch commits.
+"""
+
+import atexit
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from mysql.connector import Error as MySQLError
+
+from db import get_db_connection
+
+logger = logging.getLogger("studybuddy.chat_writer")
+
+CHAT_WRITE_MODE = os.getenv("CHAT_WRITE_MODE", "sync").strip().lower()
+CHAT_WRITE_BATCH_SIZE = int(os.getenv("CHAT_WRITE_BATCH_SIZE", "100"))
+CHAT_WRITE_FLUSH_MS = float(os.getenv("CHAT_WRITE_FLUSH_MS", "5"))
+# messages waiting to be written before POSTs get 503
+CHAT_WRITE_QUEUE_SIZE = int(os.getenv("CHAT_WRITE_QUEUE_SIZE", "10000"))
+# how long a batch-mode POST waits for its commit
+CHAT_WRITE_TIMEOUT = float(os.getenv("CHAT_WRITE_TIMEOUT", "5"))
+
+MODES = ("sync", "batch", "async")
+
+_STOP = object()
+
+_listeners = []
+
+
+class ChatWriteQueueFull(Exception):
+    pass
+
+
+class PendingMessage:
+    __slots__ = ("client_seq", "group_id", "user_id", "content", "future")
+
+    def __init__(self, client_seq, group_id, user_id, content):
+        self.client_seq = client_seq
+        self.group_id = group_id
+        self.user_id = user_id
+        self.content = content
+        # resolves to (message_id, sent_time) once committed
+        self.future = Future()
+
+
+class ChatWriter:
+    def __init__(self, batch_size=CHAT_WRITE_BATCH_SIZE, flush_ms=CHAT_WRITE_FLUSH_MS,
+                 queue_size=CHAT_WRITE_QUEUE_SIZE, connect=get_db_connection):
+        self.batch_size = max(1, batch_size)
+        self.flush_seconds = flush_ms / 1000.0
+        self._connect = connect
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._seq = itertools.count(1)
+        self._multi_row = None
+        self._thread = threading.Thread(target=self._run, name="chat-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, group_id, user_id, content, timeout=None):
+        pending = PendingMessage(next(self._seq), group_id, user_id, content)
+        try:
+            self._queue.put(pending, timeout=timeout)
+        except queue.Full:
+            raise ChatWriteQueueFull()
+        return pending
+
+    def close(self, timeout=5.0):
+        """Flush what is queued and stop the writer thread."""
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def _next_batch(self):
+        first = self._queue.get()
+        if first is _STOP:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.flush_seconds
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                # finish this batch, stop on the next loop
+                self._queue.put_nowait(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self._flush(batch)
+            except Exception:
+                logger.exception("chat write batch crashed")
+                for pending in batch:
+                    if not pending.future.done():
+                        pending.future.set_exception(RuntimeError("chat write failed"))
+
+    def _flush(self, batch):
+        try:
+            rows = self._write(batch)
+        except MySQLError as e:
+            if len(batch) == 1:
+                self._fail(batch[0], e)
+                return
+            # one bad row (e.g. a deleted group) must not sink the others
+            logger.warning("chat batch of %d failed (%s); retrying one by one", len(batch), e)
+            for pending in batch:
+                self._flush([pending])
+            return
+
+        for pending, (message_id, sent_time) in zip(batch, rows):
+            pending.future.set_result((message_id, sent_time))
+            for fn in _listeners:
+                try:
+                    fn(pending, message_id, sent_time)
+                except Exception:
+                    logger.exception("chat write listener failed")
+
+    def _fail(self, pending, error):
+        logger.error("chat message for group %s dropped: %s", pending.group_id, error)
+        pending.future.set_exception(error)
+
+    def _uses_multi_row(self, cursor):
+        """
+        A multi-row INSERT gets consecutive ids (first = LAST_INSERT_ID()) only
+        with innodb_autoinc_lock_mode 0 or 1. Mode 2 may interleave ids with
+        concurrent inserts, so fall back to one INSERT per row (still one commit).
+        """
+        if self._multi_row is None:
+            cursor.execute("SELECT @@innodb_autoinc_lock_mode")
+            row = cursor.fetchone()
+            self._multi_row = row is not None and int(row[0]) <= 1
+        return self._multi_row
+
+    def _write(self, batch):
+        """Insert a batch in one transaction; returns [(message_id, sent_time)] in batch order."""
+        conn = None
+        cursor = None
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            conn.start_transaction()
+
+            params = [(p.group_id, p.user_id, p.content) for p in batch]
+            if len(batch) > 1 and self._uses_multi_row(cursor):
+                cursor.execute(
+                    "INSERT INTO Chat_Message (group_id, user_id, content) VALUES "
+                    + ", ".join(["(%s, %s, %s)"] * len(batch)),
+                    [value for row in params for value in row],
+                )
+                ids = list(range(cursor.lastrowid, cursor.lastrowid + len(batch)))
+            else:
+                ids = []
+                for row in params:
+                    cursor.execute(
+                        "INSERT INTO Chat_Message (group_id, user_id, content) VALUES (%s, %s, %s)",
+                        row,
+                    )
+                    ids.append(cursor.lastrowid)
+
+            cursor.execute(
+                "SELECT message_id, sent_time FROM Chat_Message WHERE message_id IN ("
+                + ", ".join(["%s"] * len(ids)) + ")",
+                ids,
+            )
+            sent = dict(cursor.fetchall())
+
+            conn.commit()
+            return [(message_id, sent.get(message_id)) for message_id in ids]
+
+        except MySQLError:
+            if conn is not None:
+                conn.rollback()
+            raise
+        finally:
+            if cursor is not None:
+                cursor.close()
+            if conn is not None:
+                conn.close()
+
+
+def add_commit_listener(fn):
+    """fn(pending, message_id, sent_time) runs on the writer thread after each message commits."""
+    if fn not in _listeners:
+        _listeners.append(fn)
+
+
+def get_write_mode():
+    return CHAT_WRITE_MODE if CHAT_WRITE_MODE in MODES else "sync"
+
+
+_writer = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+
+
+def get_chat_writer():
+    """The process's writer thread, started on first use (and again after a fork)."""
+    global _writer, _writer_pid
+    if _writer is not None and _writer_pid == os.getpid():
+        return _writer
+
+    with _writer_lock:
+        if _writer is None or _writer_pid != os.getpid():
+            _writer = ChatWriter()
+            _writer_pid = os.getpid()
+            atexit.register(_writer.close)
+        return _writer
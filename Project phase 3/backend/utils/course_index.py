@@ -0,0 +1,70 @@
+"""
+Inverted index course_id -> sorted user ids, for StudyBuddy Match candidates.
+
+A match candidate must share a course with the caller, so the candidates
+are exactly the union of the caller's (at most five) posting lists, and a
+candidate's shared-course count is how many of those lists it appears in.
+Both come from concatenating the lists and counting duplicates. The cost
+follows the caller's course sizes, not the number of profiles.
+
+Like ProfileTable the index is copy-on-write: update() returns a new index
+that shares every posting list except the ones the user joined or left.
+"""
+
+import numpy as np
+
+# ProfileTable.courses padding (utils.match_engine.NULL)
+NULL = -1
+
+
+class CourseIndex:
+    def __init__(self, postings):
+        self.postings = postings        # course_id -> int64[] user ids, sorted
+
+    def __len__(self):
+        return len(self.postings)
+
+    @classmethod
+    def from_table(cls, table):
+        rows, slots = np.nonzero(table.courses != NULL)
+        course_ids = table.courses[rows, slots]
+        users = table.user_ids[rows]
+        order = np.lexsort((users, course_ids))
+        course_ids, users = course_ids[order], users[order]
+
+        bounds = np.flatnonzero(np.diff(course_ids)) + 1
+        firsts = course_ids[np.concatenate(([0], bounds))] if len(course_ids) else ()
+        return cls({int(c): u for c, u in zip(firsts, np.split(users, bounds))})
+
+    def users(self, course_id):
+        return self.postings.get(int(course_id), np.empty(0, dtype=np.int64))
+
+    def shared_counts(self, course_ids):
+        """(user ids, shared-course counts) of everyone taking any of course_ids."""
+        lists = [self.users(c) for c in set(int(c) for c in course_ids) if c != NULL]
+        if not lists:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int16)
+        if len(lists) == 1:
+            return lists[0], np.ones(len(lists[0]), dtype=np.int16)
+        user_ids, counts = np.unique(np.concatenate(lists), return_counts=True)
+        return user_ids, counts.astype(np.int16)
+
+    def update(self, user_id, old_courses, new_courses):
+        """Copy of the index with user_id moved from old_courses to new_courses."""
+        old = {int(c) for c in old_courses if c != NULL}
+        new = {int(c) for c in new_courses if c != NULL}
+        if old == new:
+            return self
+
+        postings = dict(self.postings)
+        for course_id in old - new:
+            users = postings[course_id]
+            users = np.delete(users, np.searchsorted(users, user_id))
+            if len(users):
+                postings[course_id] = users
+            else:
+                del postings[course_id]
+        for course_id in new - old:
+            users = self.users(course_id)
+            postings[course_id] = np.insert(users, np.searchsorted(users, user_id), user_id)
+        return CourseIndex(postings)
@@ -0,0 +1,315 @@
+"""
+In-memory n-gram index for the course picker (GET /courses/search).
+
+SearchCoursesSmart matches `LIKE '%q%'` on course_code and course_name, so
+every keystroke full-scans Courses. The catalog is small and rarely changes,
+so each worker keeps it in memory instead:
+
+- text is normalized the way the column collation compares it: accents
+  removed (NFKD), casefolded, runs of whitespace collapsed;
+- every trigram (bigram, for two-character queries) of both fields maps to a
+  sorted NumPy array of course positions; a query intersects the arrays of
+  its own n-grams, smallest first, and the few survivors are checked with a
+  real substring test;
+- positions follow `ORDER BY course_code, course_name`, so sorting hits by
+  (rank tier, position) gives the procedure's order:
+  1 exact code, 2 code prefix, 3 name prefix, 4 name substring, 5 code substring.
+  Tiers 1-3 are prefix ranges found by bisecting the sorted codes / names;
+  the n-gram lookup only runs when they don't fill `limit`.
+
+Fuzzy mode (typos, "cos420" without the space) adds, after the strict hits:
+
+- compact-code matches: codes with spaces and punctuation removed, equal to
+  or starting with the compacted query (bisect over the sorted forms);
+- trigram similarity in the style of pg_trgm: each word is padded ("  w ")
+  and cut into trigrams, and one np.bincount over the query trigrams'
+  posting arrays counts the trigrams every course shares with the query. A
+  course qualifies when it holds at least COURSE_FUZZY_MIN_SIMILARITY of the
+  query's trigrams. It is ranked by that share, then by Jaccard similarity
+  (closer overall length wins).
+
+The catalog is loaded on first use. After COURSE_INDEX_TTL seconds a cheap
+fingerprint query (row count, max id, CRC of every code/name/college) runs,
+and the index is rebuilt only if the fingerprint changed. Call
+utils.course_search_cache.invalidate_courses() after writing Courses or
+Colleges to rebuild on the next search.
+"""
+
+import bisect
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+
+import numpy as np
+
+from db import get_db_connection
+
+logger = logging.getLogger("studybuddy.course_search")
+
+COURSE_INDEX_TTL = float(os.getenv("COURSE_INDEX_TTL", "60"))
+# share of the query's trigrams a course must contain to be a fuzzy match
+COURSE_FUZZY_MIN_SIMILARITY = float(os.getenv("COURSE_FUZZY_MIN_SIMILARITY", "0.5"))
+
+MODES = ("strict", "fuzzy", "auto")
+
+CATALOG_SQL = """
+    SELECT c.course_id, c.course_code, c.course_name, col.college_name
+    FROM Courses c
+    LEFT JOIN Colleges col ON col.college_id = c.college_id
+"""
+FINGERPRINT_SQL = """
+    SELECT COUNT(*), COALESCE(MAX(c.course_id), 0),
+           COALESCE(SUM(CRC32(CONCAT_WS('|', c.course_code, c.course_name, col.college_name))), 0)
+    FROM Courses c
+    LEFT JOIN Colleges col ON col.college_id = c.college_id
+"""
+
+_WHITESPACE = re.compile(r"\s+")
+_WORD = re.compile(r"[^\W_]+")
+_EMPTY = np.empty(0, dtype=np.int32)
+
+
+def normalize(text):
+    """Casefold, strip accents and collapse whitespace (like an _ai_ci collation)."""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _WHITESPACE.sub(" ", stripped.casefold()).strip()
+
+
+def ngrams(text, n):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def compact(text):
+    """Normalized text without spaces or punctuation: "COS 420" -> "cos420"."""
+    return "".join(_WORD.findall(text))
+
+
+def word_trigrams(text):
+    """pg_trgm-style trigrams of normalized text: every word padded as "  word "."""
+    grams = set()
+    for word in _WORD.findall(text):
+        grams |= ngrams(f"  {word} ", 3)
+    return grams
+
+
+class CourseSearchIndex:
+    def __init__(self, rows):
+        """rows: (course_id, course_code, course_name, college_name)."""
+        keyed = sorted(rows, key=lambda r: (normalize(r[1]), normalize(r[2]), r[0]))
+        self.courses = [
+            {
+                "course_id": r[0],
+                "course_code": r[1],
+                "course_name": r[2],
+                "college_name": r[3],
+            }
+            for r in keyed
+        ]
+        self.codes = [normalize(r[1]) for r in keyed]
+        self.names = [normalize(r[2]) for r in keyed]
+
+        postings = {}
+        for pos, (code, name) in enumerate(zip(self.codes, self.names)):
+            grams = set()
+            for n in (2, 3):
+                grams |= ngrams(code, n) | ngrams(name, n)
+            for gram in grams:
+                postings.setdefault(gram, []).append(pos)
+        self.postings = {gram: np.asarray(p, dtype=np.int32) for gram, p in postings.items()}
+
+        # names in sorted order, with their positions, for name-prefix ranges
+        by_name = sorted(range(len(self.names)), key=lambda pos: self.names[pos])
+        self.sorted_names = [self.names[pos] for pos in by_name]
+        self.name_positions = by_name
+
+        # fuzzy mode: compact codes, and word trigrams of "code name"
+        compacts = [compact(code) for code in self.codes]
+        by_compact = sorted(range(len(compacts)), key=lambda pos: compacts[pos])
+        self.sorted_compacts = [compacts[pos] for pos in by_compact]
+        self.compact_positions = by_compact
+
+        trigram_postings = {}
+        sizes = []
+        for pos, (code, name) in enumerate(zip(self.codes, self.names)):
+            grams = word_trigrams(f"{code} {name}")
+            sizes.append(len(grams))
+            for gram in grams:
+                trigram_postings.setdefault(gram, []).append(pos)
+        self.trigram_postings = {g: np.asarray(p, dtype=np.int32) for g, p in trigram_postings.items()}
+        self.trigram_sizes = np.asarray(sizes, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.courses)
+
+    def candidates(self, q):
+        """Positions whose code or name may contain q (superset; checked by the caller)."""
+        if len(q) < 2:
+            return np.arange(len(self.courses), dtype=np.int32)
+        grams = ngrams(q, 3) if len(q) >= 3 else {q}
+        lists = sorted((self.postings.get(g, _EMPTY) for g in grams), key=len)
+        result = lists[0]
+        for other in lists[1:]:
+            if not len(result):
+                break
+            result = np.intersect1d(result, other, assume_unique=True)
+        return result
+
+    def tier(self, pos, q):
+        """SearchCoursesSmart's rank_score, or None when q is in neither field."""
+        code, name = self.codes[pos], self.names[pos]
+        if code == q:
+            return 1
+        if code.startswith(q):
+            return 2
+        if name.startswith(q):
+            return 3
+        if q in name:
+            return 4
+        if q in code:
+            return 5
+        return None
+
+    def _prefix_hits(self, q):
+        """(tier, position) for tiers 1-3, already in order."""
+        end = q + "\U0010ffff"
+        lo, hi = bisect.bisect_left(self.codes, q), bisect.bisect_left(self.codes, end)
+        hits = [(1 if self.codes[pos] == q else 2, pos) for pos in range(lo, hi)]
+        hits.sort()
+        seen = set(range(lo, hi))
+
+        lo, hi = bisect.bisect_left(self.sorted_names, q), bisect.bisect_left(self.sorted_names, end)
+        hits += sorted((3, pos) for pos in self.name_positions[lo:hi] if pos not in seen)
+        return hits
+
+    def strict(self, q, limit):
+        """Positions SearchCoursesSmart would return for normalized q, in order."""
+        hits = self._prefix_hits(q)
+        if len(hits) < limit:
+            hits = []
+            for pos in self.candidates(q).tolist():
+                tier = self.tier(pos, q)
+                if tier is not None:
+                    hits.append((tier, pos))
+            hits.sort()
+        return [pos for _, pos in hits[:limit]]
+
+    def compact_matches(self, q):
+        """Positions whose compact code equals, then starts with, the compact query."""
+        cq = compact(q)
+        if len(cq) < 2:
+            return []
+        lo = bisect.bisect_left(self.sorted_compacts, cq)
+        hi = bisect.bisect_left(self.sorted_compacts, cq + "\U0010ffff")
+        exact = sorted(self.compact_positions[i] for i in range(lo, hi) if self.sorted_compacts[i] == cq)
+        prefix = sorted(self.compact_positions[i] for i in range(lo, hi) if self.sorted_compacts[i] != cq)
+        return exact + prefix
+
+    def similar(self, q, limit, min_similarity=COURSE_FUZZY_MIN_SIMILARITY):
+        """Positions ranked by trigram similarity to q (see module docstring)."""
+        grams = word_trigrams(q)
+        lists = [self.trigram_postings[g] for g in grams if g in self.trigram_postings]
+        if not lists:
+            return []
+        shared = np.bincount(np.concatenate(lists), minlength=len(self.courses))
+        found = shared / len(grams)
+        cand = np.flatnonzero(found >= min_similarity)
+        if not len(cand):
+            return []
+        inter = shared[cand]
+        jaccard = inter / (len(grams) + self.trigram_sizes[cand] - inter)
+        order = np.lexsort((cand, -jaccard, -found[cand]))[:limit]
+        return cand[order].tolist()
+
+    def search(self, query, limit, mode="strict"):
+        """
+        strict -- SearchCoursesSmart's results;
+        fuzzy  -- strict results, then compact-code and trigram matches;
+        auto   -- strict, switching to fuzzy only when strict finds nothing.
+        """
+        q = normalize(query)
+        if not q or limit <= 0:
+            return []
+        positions = self.strict(q, limit)
+        if mode == "fuzzy" or (mode == "auto" and not positions):
+            seen = set(positions)
+            for pos in self.compact_matches(q) + self.similar(q, limit):
+                if len(positions) >= limit:
+                    break
+                if pos not in seen:
+                    seen.add(pos)
+                    positions.append(pos)
+        return [dict(self.courses[pos]) for pos in positions]
+
+
+class CourseSearch:
+    """Holds the current index and keeps it in step with the Courses table."""
+
+    def __init__(self, ttl=COURSE_INDEX_TTL, connect=get_db_connection):
+        self.ttl = ttl
+        self._connect = connect
+        self._index = None
+        self._fingerprint = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _query(self, sql):
+        conn = self._connect()
+        cur = conn.cursor()
+        try:
+            cur.execute(sql)
+            return cur.fetchall()
+        finally:
+            cur.close()
+            conn.close()
+
+    def refresh(self, force=False):
+        """Rebuild if the catalog changed (or unconditionally with force)."""
+        with self._lock:
+            if not force and self._index is not None and time.monotonic() - self._checked_at <= self.ttl:
+                # another request refreshed it while this one waited
+                return self._index
+            fingerprint = tuple(int(v) for v in self._query(FINGERPRINT_SQL)[0])
+            if force or self._index is None or fingerprint != self._fingerprint:
+                started = time.perf_counter()
+                self._index = CourseSearchIndex(self._query(CATALOG_SQL))
+                logger.info("course search index: %d courses in %.0f ms",
+                            len(self._index), (time.perf_counter() - started) * 1000)
+            self._fingerprint = fingerprint
+            self._checked_at = time.monotonic()
+            return self._index
+
+    def index(self):
+        index = self._index
+        if index is None or time.monotonic() - self._checked_at > self.ttl:
+            index = self.refresh()
+        return index
+
+    def invalidate(self):
+        with self._lock:
+            self._fingerprint = None
+            self._checked_at = 0.0
+
+    def search(self, query, limit, mode="strict"):
+        return self.index().search(query, limit, mode)
+
+
+_search = CourseSearch()
+
+
+def get_course_search():
+    return _search
+
+
+def init_app(app):
+    """Build the index in the background at startup so the first keystroke doesn't wait."""
+    def warm():
+        try:
+            _search.refresh()
+        except Exception as e:
+            logger.warning("course search index not preloaded (%s); will load on first search", e)
+
+    threading.Thread(target=warm, name="course-search-warm", daemon=True).start()
@@ -0,0 +1,132 @@
+"""
+Latency + recall benchmark for course search (utils/course_search.py).
+
+    python -m utils.course_search_benchmark --sizes 1700 100000 --queries 2000
+
+Builds a synthetic catalog per size (USM-like subject codes, names drawn from
+a course vocabulary). Queries are real prefixes and typo'd versions of
+random courses: a dropped, swapped or replaced letter per word, and codes
+typed without the space. For each mode it reports p50/p95/p99 latency and,
+for the typo'd and space-less queries, how often the intended course is in
+the top `--limit` (prefixes like "COS" are ambiguous by nature; at 100k
+random names many courses share a name). Exits non-zero if a mode's p99 is
+over --budget-ms (5 ms by default).
+"""
+
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils.course_search import MODES, CourseSearchIndex  # noqa: E402
+
+SUBJECTS = [
+    "ACC", "ANT", "ART", "BIO", "BUS", "CHY", "COM", "COS", "CRM", "ECO", "EDU", "EGN", "ELE",
+    "ENG", "ENV", "ESP", "FIN", "FRE", "GEO", "GEY", "HRD", "HTY", "ITP", "LIN", "MAT", "MBA",
+    "MUS", "NUR", "PHI", "PHY", "POS", "PSY", "SOC", "SPA", "SWO", "THE", "TSM", "WGS",
+]
+WORDS = [
+    "introduction", "principles", "advanced", "topics", "database", "systems", "calculus",
+    "statistics", "organic", "chemistry", "physics", "mechanics", "literature", "writing",
+    "composition", "history", "american", "european", "world", "psychology", "development",
+    "sociology", "economics", "micro", "macro", "accounting", "finance", "marketing",
+    "management", "nursing", "health", "policy", "programming", "structures", "algorithms",
+    "networks", "security", "software", "engineering", "design", "analysis", "methods",
+    "research", "seminar", "ethics", "philosophy", "biology", "cell", "genetics", "ecology",
+    "environmental", "science", "geology", "linear", "algebra", "discrete", "probability",
+    "music", "theory", "theatre", "performance", "français", "español", "culture",
+]
+
+
+def synthetic_catalog(n, seed=11):
+    rng = random.Random(seed)
+    rows = []
+    for course_id in range(1, n + 1):
+        code = f"{rng.choice(SUBJECTS)} {rng.randint(100, 699)}"
+        name = " ".join(rng.sample(WORDS, rng.randint(2, 4))).title()
+        rows.append((course_id, code, name, "University of Southern Maine"))
+    return rows
+
+
+def typo(word, rng):
+    if len(word) < 4:
+        return word
+    i = rng.randrange(1, len(word) - 1)
+    kind = rng.choice(("drop", "swap", "replace"))
+    if kind == "drop":
+        return word[:i] + word[i + 1:]
+    if kind == "swap":
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    return word[:i] + rng.choice(string.ascii_lowercase) + word[i + 1:]
+
+
+def make_queries(rows, count, seed=5):
+    """(query, intended course_id, kind) triples."""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        course_id, code, name, _college = rng.choice(rows)
+        kind = rng.choice(("code_prefix", "code_compact", "name_prefix", "name_typo"))
+        if kind == "code_prefix":
+            q = code[:rng.randint(3, len(code))]
+        elif kind == "code_compact":
+            q = code.replace(" ", "").lower()
+        elif kind == "name_prefix":
+            q = name[:rng.randint(3, len(name))]
+        else:
+            words = name.lower().split()
+            q = " ".join(typo(w, rng) for w in words[:rng.randint(1, len(words))])
+        queries.append((q, course_id, kind))
+    return queries
+
+
+def _pct(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def run(sizes, n_queries, limit, budget_ms):
+    over_budget = 0
+    for n in sizes:
+        rows = synthetic_catalog(n)
+        t0 = time.perf_counter()
+        index = CourseSearchIndex(rows)
+        print(f"\n== {n:,} courses (index built in {time.perf_counter() - t0:.2f}s)")
+        queries = make_queries(rows, n_queries)
+
+        for mode in MODES:
+            timings = []
+            found = typos = 0
+            for q, course_id, kind in queries:
+                t = time.perf_counter()
+                results = index.search(q, limit, mode)
+                timings.append((time.perf_counter() - t) * 1000)
+                if kind in ("code_compact", "name_typo"):
+                    typos += 1
+                    found += any(r["course_id"] == course_id for r in results)
+            timings.sort()
+            p99 = _pct(timings, 0.99)
+            flag = "" if p99 <= budget_ms else f"   OVER {budget_ms} ms BUDGET"
+            over_budget += bool(flag)
+            print(f"  {mode:6}  p50 {_pct(timings, 0.50):6.3f} ms  p95 {_pct(timings, 0.95):6.3f} ms  "
+                  f"p99 {p99:6.3f} ms  typo'd target in top {limit}: {100.0 * found / max(typos, 1):5.1f}%{flag}")
+    return over_budget
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1700, 100_000])
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--limit", type=int, default=8)
+    parser.add_argument("--budget-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    over = run(args.sizes, args.queries, args.limit, args.budget_ms)
+    sys.exit(1 if over else 0)
+
+
+if __name__ == "__main__":
+    main()
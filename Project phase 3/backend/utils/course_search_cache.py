@@ -0,0 +1,182 @@
+"""
+Prefix-reuse cache for /courses/search with COURSE_SEARCH_BACKEND=procedure.
+
+The picker sends "co", "cos", "cos 4", "cos 42" within a second. Every
+course matching "cos 4" also matches "cos", so once the result set for a
+prefix is complete it can answer all the longer queries without MySQL:
+
+- on a miss the route asks SearchCoursesSmart for COURSE_SEARCH_CACHE_FETCH
+  rows instead of `limit`. Fewer rows than that means the set was not
+  truncated, so the entry is marked complete;
+- a longer query is answered from its longest complete cached prefix: keep
+  the rows whose code or name still contains it, re-rank them with the
+  procedure's tiers (exact code, code prefix, name prefix, name substring,
+  code substring), then order by code and name. The filtered set is complete
+  too, so it is stored under the longer query for the next keystroke;
+- a truncated entry only answers its own query, and only up to the rows it
+  holds.
+
+Queries are compared the way the column collation compares them (see
+course_search.normalize). Queries containing LIKE wildcards (% and _) are
+never cached, because the procedure treats them as patterns.
+
+Entries expire COURSE_SEARCH_CACHE_TTL seconds after they were stored, and
+invalidate() drops them all (call it after writing Courses or Colleges).
+Like the other caches this is per worker. Set
+COURSE_SEARCH_CACHE_MAX_ENTRIES=0 to turn it off.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from utils.course_search import get_course_search, normalize
+from utils.metrics import CACHE_ENTRIES, CACHE_EVICTIONS, CACHE_REQUESTS, REGISTRY
+
+CACHE_NAME = "course_search"
+
+COURSE_SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("COURSE_SEARCH_CACHE_MAX_ENTRIES", "2000"))
+COURSE_SEARCH_CACHE_TTL = float(os.getenv("COURSE_SEARCH_CACHE_TTL", "30"))
+# rows fetched on a miss; a set smaller than this is complete and serves longer queries
+COURSE_SEARCH_CACHE_FETCH = int(os.getenv("COURSE_SEARCH_CACHE_FETCH", "100"))
+
+_WILDCARDS = set("%_\\")
+
+
+def _tier(code, name, q):
+    """SearchCoursesSmart's rank_score, or None when q is in neither field."""
+    if code == q:
+        return 1
+    if code.startswith(q):
+        return 2
+    if name.startswith(q):
+        return 3
+    if q in name:
+        return 4
+    if q in code:
+        return 5
+    return None
+
+
+class CourseSearchCache:
+    def __init__(self, max_entries=COURSE_SEARCH_CACHE_MAX_ENTRIES, ttl=COURSE_SEARCH_CACHE_TTL,
+                 fetch=COURSE_SEARCH_CACHE_FETCH):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.fetch = fetch
+        # normalized query -> ([(code, name, row)], complete, stored_at)
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    @staticmethod
+    def key(query):
+        """Normalized query, or None when it must go to the procedure uncached."""
+        if _WILDCARDS & set(query):
+            return None
+        return normalize(query) or None
+
+    def fetch_limit(self, limit):
+        """How many rows to ask the procedure for on a miss."""
+        return max(limit, self.fetch) if self.enabled and limit > 0 else limit
+
+    def _fresh(self, key, now):
+        entry = self._entries.get(key)
+        if entry is not None and now - entry[2] > self.ttl:
+            del self._entries[key]
+            entry = None
+        return entry
+
+    def _store(self, key, entries, complete, now):
+        self._entries.pop(key, None)
+        self._entries[key] = (entries, complete, now)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            CACHE_EVICTIONS.inc(cache=CACHE_NAME)
+
+    def get(self, query, limit):
+        """Rows for query from the cache (its own entry or a complete prefix's), or None."""
+        key = self.key(query)
+        if key is None or not self.enabled or limit <= 0:
+            return None
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._fresh(key, now)
+            if entry is not None and (entry[1] or len(entry[0]) >= limit):
+                self._entries.move_to_end(key)
+                CACHE_REQUESTS.inc(cache=CACHE_NAME, result="hit")
+                return [row for _, _, row in entry[0][:limit]]
+
+            for end in range(len(key) - 1, 1, -1):
+                prefix = self._fresh(key[:end], now)
+                if prefix is None or not prefix[1]:
+                    continue
+                ranked = []
+                for code, name, row in prefix[0]:
+                    tier = _tier(code, name, key)
+                    if tier is not None:
+                        ranked.append((tier, code, name, row))
+                ranked.sort(key=lambda r: r[:3])
+                entries = [r[1:] for r in ranked]
+                self._entries.move_to_end(key[:end])
+                # keep the prefix's timestamp so derived entries expire with it
+                self._store(key, entries, True, prefix[2])
+                CACHE_REQUESTS.inc(cache=CACHE_NAME, result="prefix")
+                return [row for _, _, row in entries[:limit]]
+
+        CACHE_REQUESTS.inc(cache=CACHE_NAME, result="miss")
+        return None
+
+    def token(self):
+        """Take before calling the procedure whose rows are passed to put()."""
+        with self._lock:
+            return self._generation
+
+    def put(self, query, rows, fetched, token):
+        """
+        Store the rows the procedure returned for `fetched` rows requested;
+        skipped if invalidate() ran since `token` was taken.
+        """
+        key = self.key(query)
+        if key is None or not self.enabled:
+            return
+        entries = [(normalize(r["course_code"]), normalize(r["course_name"]), r) for r in rows]
+        with self._lock:
+            if self._generation != token:
+                return
+            self._store(key, entries, len(rows) < fetched, time.monotonic())
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries)}
+
+
+_cache = CourseSearchCache()
+
+
+def _collect_stats():
+    CACHE_ENTRIES.set(_cache.stats()["entries"], cache=CACHE_NAME)
+
+
+REGISTRY.add_collector(_collect_stats)
+
+
+def get_course_search_cache():
+    return _cache
+
+
+def invalidate_courses():
+    """After writing Courses or Colleges: drop cached results and re-check the n-gram index."""
+    _cache.invalidate()
+    get_course_search().invalidate()
@@ -0,0 +1,232 @@
+"""
+Background resizing of uploaded profile images.
+
+POST /match/profile/image decodes the upload once to reject truncated or
+corrupt files, then writes the raw bytes to <id>.upload. A worker pool
+decodes it again, applies the EXIF orientation, and writes every variant in
+WebP and JPEG:
+
+    <id>_avatar.webp / .jpg   144 x 144 crop (72 px circles at 2x)
+    <id>_card.webp / .jpg     480 x 480 crop
+    <id>_full.webp / .jpg     longest side at most 1280, never upscaled
+
+Variants are re-encoded from pixels only, so EXIF (GPS, camera serials),
+XMP and comments are dropped. The raw upload is deleted once every variant
+is written; if rendering fails it is kept as <id>.failed instead, so the
+only copy is never lost. Each file is written under a temporary name and
+renamed into place, so a half-written image is never served.
+
+A variant requested while its upload is still being encoded waits for it
+(see wait_for), but only in the worker process that accepted the upload.
+Other workers see the <id>.upload file and answer with a retryable 503
+(see is_pending) instead of a 404.
+"""
+
+import atexit
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger("studybuddy.images")
+
+# Pillow releases the GIL while resizing and encoding, so threads run in parallel
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+# how long GET /uploads/<variant> waits for a variant still being encoded
+IMAGE_PENDING_WAIT = float(os.getenv("IMAGE_PENDING_WAIT", "5"))
+# refuse decompression bombs well before Pillow's own 89 MP warning
+Image.MAX_IMAGE_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", str(40_000_000)))
+
+# name -> (size, crop to square)
+VARIANTS = {
+    "avatar": (144, True),
+    "card": (480, True),
+    "full": (1280, False),
+}
+FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+ACCEPTED_FORMATS = {"JPEG", "PNG", "GIF", "WEBP", "MPO"}
+
+_VARIANT_NAME = re.compile(r"^([0-9a-f]{32})_(?:%s)\.(?:%s)$" % ("|".join(VARIANTS), "|".join(FORMATS)))
+
+
+class UnsupportedImage(Exception):
+    pass
+
+
+def variant_name(image_id, variant, ext):
+    return f"{image_id}_{variant}.{ext}"
+
+
+def is_variant_name(filename):
+    return _VARIANT_NAME.match(os.path.basename(filename)) is not None
+
+
+def upload_path(folder, image_id):
+    """Where the raw upload waits for the pipeline."""
+    return os.path.join(folder, f"{image_id}.upload")
+
+
+def variant_names(image_id):
+    """{variant: {ext: filename}} for one upload."""
+    return {
+        variant: {ext: variant_name(image_id, variant, ext) for ext in FORMATS}
+        for variant in VARIANTS
+    }
+
+
+def check_image(stream):
+    """
+    Decode the (first frame of the) upload; raises UnsupportedImage unless it
+    is a complete still or animated picture the pipeline can render.
+    """
+    try:
+        with Image.open(stream) as img:
+            if img.format not in ACCEPTED_FORMATS:
+                raise UnsupportedImage(f"unsupported image format {img.format}")
+            width, height = img.size
+            if width * height > Image.MAX_IMAGE_PIXELS:
+                raise UnsupportedImage("image is too large")
+            # the header alone accepts truncated and corrupt files
+            img.load()
+    except (OSError, SyntaxError, Image.DecompressionBombError, ValueError) as e:
+        raise UnsupportedImage(str(e))
+    finally:
+        stream.seek(0)
+
+
+def _flatten(img):
+    """RGB for JPEG: transparent pixels go white instead of black."""
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        rgba = img.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        return background
+    return img.convert("RGB")
+
+
+def _resize(img, size, crop):
+    if crop:
+        return ImageOps.fit(img, (size, size), Image.Resampling.LANCZOS)
+    resized = img.copy()
+    resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+    return resized
+
+
+def _save(img, folder, name, fmt, options):
+    path = os.path.join(folder, name)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        img.save(tmp, fmt, **options)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def render_variants(source_path, folder, image_id):
+    """Decode once and write every variant; returns the filenames written."""
+    with Image.open(source_path) as img:
+        img.seek(0)  # first frame of animated GIF / WebP
+        img = ImageOps.exif_transpose(img)
+        has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+        base = img.convert("RGBA" if has_alpha else "RGB")
+
+    written = []
+    for variant, (size, crop) in VARIANTS.items():
+        resized = _resize(base, size, crop)
+        for ext, (fmt, options) in FORMATS.items():
+            out = resized if fmt == "WEBP" else _flatten(resized)
+            name = variant_name(image_id, variant, ext)
+            _save(out, folder, name, fmt, options)
+            written.append(name)
+    return written
+
+
+class ImagePipeline:
+    def __init__(self, workers=IMAGE_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="image")
+        # image id -> Future of render_variants
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def submit(self, source_path, folder, image_id):
+        future = self._pool.submit(self._process, source_path, folder, image_id)
+        with self._lock:
+            self._pending[image_id] = future
+        future.add_done_callback(lambda _: self._forget(image_id))
+        return future
+
+    def _forget(self, image_id):
+        with self._lock:
+            self._pending.pop(image_id, None)
+
+    def _process(self, source_path, folder, image_id):
+        try:
+            written = render_variants(source_path, folder, image_id)
+        except Exception:
+            # keep the only copy of the upload, out of is_pending's way
+            failed_path = os.path.join(folder, f"{image_id}.failed")
+            try:
+                os.replace(source_path, failed_path)
+            except OSError:
+                failed_path = source_path
+            logger.exception("could not process uploaded image %s (kept at %s)", image_id, failed_path)
+            raise
+        try:
+            os.remove(source_path)
+        except OSError:
+            pass
+        return written
+
+    def wait_for(self, filename, timeout=IMAGE_PENDING_WAIT):
+        """
+        Block until `filename`'s upload is processed (or timeout); no-op for
+        anything else. Only uploads submitted to this process are known here,
+        so under several workers callers also check is_pending().
+        """
+        match = _VARIANT_NAME.match(os.path.basename(filename))
+        if not match:
+            return
+        with self._lock:
+            future = self._pending.get(match.group(1))
+        if future is not None:
+            try:
+                future.result(timeout=timeout)
+            except Exception:
+                pass
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+
+def is_pending(folder, filename):
+    """True for a variant not written yet whose raw upload is still waiting, in any worker."""
+    match = _VARIANT_NAME.match(filename)
+    if not match or os.path.exists(os.path.join(folder, filename)):
+        return False
+    return os.path.exists(upload_path(folder, match.group(1)))
+
+
+_pipeline = None
+_pipeline_pid = None
+_pipeline_lock = threading.Lock()
+
+
+def get_image_pipeline():
+    """The process's worker pool, started on first use (and again after a fork)."""
+    global _pipeline, _pipeline_pid
+    if _pipeline is not None and _pipeline_pid == os.getpid():
+        return _pipeline
+
+    with _pipeline_lock:
+        if _pipeline is None or _pipeline_pid != os.getpid():
+            _pipeline = ImagePipeline()
+            _pipeline_pid = os.getpid()
+            atexit.register(_pipeline.close)
+        return _pipeline
@@ -0,0 +1,380 @@
+"""
+Parity check + benchmark for the StudyBuddy Match engine (utils/match_engine.py).
+
+Synthetic mode (no database needed):
+    python -m utils.match_benchmark --sizes 10000 100000 1000000
+builds N random profiles (popular intro courses skewed like real
+enrollment), then for sampled users compares the engine's results -- both
+the full scan and the course-index lookup the app uses -- with
+reference_matches(), a row-by-row Python transcription of the
+GetStudyBuddyMatches procedure, and times all three.
+
+Database mode:
+    python -m utils.match_benchmark --db --samples 200
+loads the engine from MySQL and compares it with CALL GetStudyBuddyMatches
+for sampled users, timing both.
+
+Database mode at synthetic sizes:
+    python -m utils.match_benchmark --db --sizes 10000 100000 1000000
+creates a scratch schema (--scratch-db, dropped afterwards unless
+--keep-scratch) with empty copies of Users, Match_Profile,
+Match_Profile_Course and Message_Request and the app's
+GetStudyBuddyMatches. For each size it bulk-loads synthetic_profiles(n)
+(category values limited to what the columns accept), gives every sampled
+user a few pending message requests, and then times and diffs
+CALL GetStudyBuddyMatches against the engine loaded from those tables.
+
+Exits non-zero on any mismatch.
+"""
+
+import argparse
+import os
+import random
+import re
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils.course_index import CourseIndex  # noqa: E402
+from utils.match_engine import CATEGORIES, MIN_SCORE, MatchEngine, ProfileTable, indexed_rank, rank  # noqa: E402
+
+
+def default_age_range(age):
+    """UpsertMatchProfile's default preferred age range."""
+    if age is None:
+        return None, None
+    if age <= 20:
+        return 17, 23
+    return max(17, age - 3), min(80, age + 3)
+
+
+def synthetic_profiles(n, n_courses=1700, n_colleges=40, seed=7, domains=None):
+    """
+    (profile rows, course rows). domains optionally limits a category to
+    {field: (allowed values, nullable)}, e.g. the live column definitions.
+    """
+    domains = domains or {}
+    rng = random.Random(seed)
+    # a few intro courses everybody takes, a long tail of the rest
+    weights = [1.0 / (i + 1) ** 0.9 for i in range(n_courses)]
+    profiles = []
+    courses = []
+    for user_id in range(1, n + 1):
+        age = rng.choice([None] + list(range(17, 41)))
+        lo, hi = default_age_range(age)
+        row = [user_id, rng.choice([None] + list(range(1, n_colleges + 1)))]
+        for field, (values, _any, _points) in CATEGORIES.items():
+            values, nullable = domains.get(field, (values, True))
+            row.append(rng.choice(values + ((None,) if nullable else ())))
+        row += [age, lo, hi]
+        profiles.append(tuple(row))
+        for course_id in set(rng.choices(range(1, n_courses + 1), weights, k=rng.randint(1, 5))):
+            courses.append((user_id, course_id))
+    return profiles, courses
+
+
+def reference_matches(profiles, courses, user_id, limit, blocked=()):
+    """GetStudyBuddyMatches, one candidate at a time, NULLs as in SQL."""
+    by_id = {p[0]: p for p in profiles}
+    me = by_id.get(user_id)
+    if me is None:
+        return []
+    fields = list(CATEGORIES)
+    my_courses = {c for u, c in courses if u == user_id}
+    shared = {}
+    for u, c in courses:
+        if u != user_id and c in my_courses:
+            shared[u] = shared.get(u, 0) + 1
+
+    results = []
+    for other_id, n_shared in shared.items():
+        other = by_id.get(other_id)
+        if other is None or other_id in blocked:
+            continue
+        score = 40 if me[1] is not None and other[1] == me[1] else 0
+        for i, field in enumerate(fields, start=2):
+            _values, any_value, points = CATEGORIES[field]
+            if me[i] == any_value or (me[i] is not None and other[i] == me[i]):
+                score += points
+        score += min(n_shared, 2) * 10
+        if me[7] is not None and other[7] is not None:
+            diff = abs(other[7] - me[7])
+            score += 10 if diff <= 2 else 5 if diff <= 4 else 0
+
+        lo, hi = me[8], me[9]
+        if lo is not None and hi is not None and other[7] is not None and not (lo <= other[7] <= hi):
+            continue
+        if score >= MIN_SCORE:
+            results.append((other_id, score, n_shared))
+
+    results.sort(key=lambda r: (-r[1], -r[2], r[0]))
+    return results[:limit]
+
+
+def _percentiles(samples_ms):
+    ordered = sorted(samples_ms)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]  # noqa: E731
+    return f"p50 {pick(0.50):8.2f} ms   p95 {pick(0.95):8.2f} ms   mean {statistics.mean(ordered):8.2f} ms"
+
+
+def run_synthetic(sizes, samples, limit, reference_max):
+    failures = 0
+    for n in sizes:
+        t0 = time.perf_counter()
+        profiles, courses = synthetic_profiles(n)
+        table = ProfileTable.from_rows(profiles, courses)
+        index = CourseIndex.from_table(table)
+        print(f"\n== {n:,} profiles, {len(courses):,} course rows (built in {time.perf_counter() - t0:.1f}s)")
+
+        rng = random.Random(n)
+        users = rng.sample(range(1, n + 1), min(samples, n))
+        engine_ms, indexed_ms, reference_ms = [], [], []
+        for user_id in users:
+            blocked = set(rng.sample(range(1, n + 1), 3))
+
+            t = time.perf_counter()
+            got = rank(table, user_id, limit, blocked)
+            engine_ms.append((time.perf_counter() - t) * 1000)
+
+            t = time.perf_counter()
+            got_indexed = indexed_rank(table, index, user_id, limit, blocked)
+            indexed_ms.append((time.perf_counter() - t) * 1000)
+            if got_indexed != got:
+                failures += 1
+                print(f"  MISMATCH user {user_id}: indexed {got_indexed[:3]}... scan {got[:3]}...")
+
+            if n <= reference_max:
+                t = time.perf_counter()
+                want = reference_matches(profiles, courses, user_id, limit, blocked)
+                reference_ms.append((time.perf_counter() - t) * 1000)
+                if got != want:
+                    failures += 1
+                    print(f"  MISMATCH user {user_id}: engine {got[:3]}... reference {want[:3]}...")
+
+        print(f"  engine     {_percentiles(engine_ms)}")
+        print(f"  + index    {_percentiles(indexed_ms)}")
+        if reference_ms:
+            print(f"  reference  {_percentiles(reference_ms)}   ({len(reference_ms)} parity checks)")
+        else:
+            print(f"  reference  skipped above --reference-max={reference_max:,}")
+    return failures
+
+
+def _compare_with_procedure(cur, table, index, users, limit):
+    """Engine vs CALL GetStudyBuddyMatches for each user; returns the mismatch count."""
+    engine_ms, proc_ms = [], []
+    failures = 0
+    for user_id in users:
+        cur.execute(
+            "SELECT target_user_id FROM Message_Request "
+            "WHERE requester_user_id = %s AND request_status IN ('pending', 'accepted') "
+            "UNION SELECT requester_user_id FROM Message_Request "
+            "WHERE target_user_id = %s AND request_status IN ('pending', 'accepted')",
+            (user_id, user_id),
+        )
+        blocked = {r[0] for r in cur.fetchall()}
+
+        t = time.perf_counter()
+        got = indexed_rank(table, index, user_id, limit, blocked)
+        engine_ms.append((time.perf_counter() - t) * 1000)
+
+        t = time.perf_counter()
+        cur.callproc("GetStudyBuddyMatches", (user_id, limit))
+        rows = [r for result in cur.stored_results() for r in result.fetchall()]
+        proc_ms.append((time.perf_counter() - t) * 1000)
+
+        # other_user_id, ..., shared_courses, match_score are first / last two columns
+        want = [(int(r[0]), int(r[-1]), int(r[-2])) for r in rows]
+        if got != want:
+            failures += 1
+            print(f"  MISMATCH user {user_id}: engine {got[:3]}... procedure {want[:3]}...")
+
+    print(f"  engine     {_percentiles(engine_ms)}")
+    print(f"  procedure  {_percentiles(proc_ms)}   ({len(users)} parity checks)")
+    return failures
+
+
+def run_db(samples, limit):
+    from db import get_db_connection
+
+    engine = MatchEngine(ttl=float("inf"))
+    t0 = time.perf_counter()
+    table, index = engine._snapshot()
+    print(f"loaded {len(table):,} profiles from MySQL in {time.perf_counter() - t0:.1f}s")
+
+    users = random.Random(1).sample(list(map(int, table.user_ids)), min(samples, len(table)))
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        return _compare_with_procedure(cur, table, index, users, limit)
+    finally:
+        cur.close()
+        conn.close()
+
+
+# copied (empty) into the scratch schema; LIKE keeps indexes but not foreign keys
+SCRATCH_TABLES = ("Users", "Match_Profile", "Match_Profile_Course", "Message_Request")
+LOAD_CHUNK = 5_000
+REQUESTS_PER_SAMPLE = 3
+
+
+def _scratch_connection(schema):
+    from db import _open_connection
+
+    conn = _open_connection()
+    conn.database = schema
+    return conn
+
+
+def _column_domains(cur, schema):
+    """{field: (allowed values, nullable)} for the ENUM category columns of Match_Profile."""
+    cur.execute(
+        "SELECT COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = %s AND TABLE_NAME = 'Match_Profile'",
+        (schema,),
+    )
+    domains = {}
+    for name, col_type, nullable in cur.fetchall():
+        if isinstance(col_type, bytes):
+            col_type = col_type.decode()
+        if name in CATEGORIES and col_type.lower().startswith("enum("):
+            values = tuple(v.replace("''", "'") for v in re.findall(r"'((?:[^']|'')*)'", col_type))
+            domains[name] = (values, nullable == "YES")
+    return domains
+
+
+def _create_scratch(cur, source, scratch):
+    """Empty copies of SCRATCH_TABLES and the app's GetStudyBuddyMatches in `scratch`."""
+    cur.execute(f"CREATE DATABASE IF NOT EXISTS `{scratch}`")
+    for name in reversed(SCRATCH_TABLES):
+        cur.execute(f"DROP TABLE IF EXISTS `{scratch}`.`{name}`")
+    for name in SCRATCH_TABLES:
+        cur.execute(f"CREATE TABLE `{scratch}`.`{name}` LIKE `{source}`.`{name}`")
+
+    cur.execute(f"SHOW CREATE PROCEDURE `{source}`.`GetStudyBuddyMatches`")
+    ddl = cur.fetchone()[2]
+    if isinstance(ddl, bytes):
+        ddl = ddl.decode()
+    cur.execute(f"USE `{scratch}`")
+    cur.execute("DROP PROCEDURE IF EXISTS GetStudyBuddyMatches")
+    # created by whoever runs the benchmark, not the original definer
+    cur.execute(re.sub(r"\bDEFINER\s*=\s*\S+\s+", "", ddl, count=1))
+
+
+def _insert_chunks(cur, sql, rows):
+    for start in range(0, len(rows), LOAD_CHUNK):
+        cur.executemany(sql, rows[start:start + LOAD_CHUNK])
+
+
+def _load_scratch(cur, profiles, courses, requests):
+    """Replace the scratch tables' rows; each chunk commits on its own (autocommit)."""
+    for name in reversed(SCRATCH_TABLES):
+        cur.execute(f"TRUNCATE TABLE `{name}`")
+
+    _insert_chunks(
+        cur,
+        "INSERT INTO Users (user_id, email, password_hash, first_name, last_name, college_id) "
+        "VALUES (%s, %s, %s, %s, %s, %s)",
+        [(p[0], f"bench{p[0]}@example.invalid", "x", "Bench", str(p[0]), p[1]) for p in profiles],
+    )
+    _insert_chunks(
+        cur,
+        "INSERT INTO Match_Profile (user_id, study_style, meeting_pref, study_goal, focus_time_pref, "
+        "noise_pref, age, preferred_min_age, preferred_max_age) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)",
+        [(p[0], *p[2:]) for p in profiles],
+    )
+    _insert_chunks(cur, "INSERT INTO Match_Profile_Course (user_id, course_id) VALUES (%s, %s)", courses)
+    _insert_chunks(
+        cur,
+        "INSERT INTO Message_Request (requester_user_id, target_user_id, request_status) VALUES (%s, %s, %s)",
+        requests,
+    )
+
+    for name in SCRATCH_TABLES:
+        cur.execute(f"ANALYZE TABLE `{name}`")
+        cur.fetchall()
+
+
+def _sample_requests(users, n, rng):
+    """A few pending requests to and from each sampled user, so blocking is exercised."""
+    pairs = set()
+    for user_id in users:
+        for _ in range(REQUESTS_PER_SAMPLE):
+            other = rng.randint(1, n)
+            if other == user_id:
+                continue
+            pair = (user_id, other) if rng.random() < 0.5 else (other, user_id)
+            if pair not in pairs and pair[::-1] not in pairs:
+                pairs.add(pair)
+    return [(a, b, "pending") for a, b in sorted(pairs)]
+
+
+def run_db_sizes(sizes, samples, limit, scratch, keep_scratch=False):
+    source = os.getenv("MYSQL_DB", "StudyBuddy")
+    if scratch == source:
+        raise SystemExit(f"--scratch-db must not be the app database ({source})")
+
+    conn = _scratch_connection(source)
+    cur = conn.cursor()
+    failures = 0
+    try:
+        _create_scratch(cur, source, scratch)
+        domains = _column_domains(cur, scratch)
+
+        for n in sizes:
+            print(f"\n== {n:,} profiles (MySQL scratch schema `{scratch}`) ==")
+            t0 = time.perf_counter()
+            profiles, courses = synthetic_profiles(n, domains=domains)
+            rng = random.Random(1)
+            users = rng.sample(range(1, n + 1), min(samples, n))
+            requests = _sample_requests(users, n, rng)
+
+            _load_scratch(cur, profiles, courses, requests)
+            print(f"loaded {len(profiles):,} profiles, {len(courses):,} course rows, "
+                  f"{len(requests):,} requests in {time.perf_counter() - t0:.1f}s")
+
+            engine = MatchEngine(ttl=float("inf"), connect=lambda: _scratch_connection(scratch))
+            t0 = time.perf_counter()
+            table, index = engine._snapshot()
+            print(f"engine loaded from MySQL in {time.perf_counter() - t0:.1f}s")
+
+            failures += _compare_with_procedure(cur, table, index, users, limit)
+    finally:
+        if not keep_scratch:
+            cur.execute(f"DROP DATABASE IF EXISTS `{scratch}`")
+        cur.close()
+        conn.close()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        help="profile counts (default 10000 100000 1000000; with --db, load these into --scratch-db)")
+    parser.add_argument("--samples", type=int, default=50, help="users scored per size")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--reference-max", type=int, default=100_000,
+                        help="largest size to run the (slow) Python reference on")
+    parser.add_argument("--db", action="store_true", help="compare against GetStudyBuddyMatches in MySQL")
+    parser.add_argument("--scratch-db", default="StudyBuddy_bench",
+                        help="schema created for --db --sizes (must not be MYSQL_DB)")
+    parser.add_argument("--keep-scratch", action="store_true", help="leave the scratch schema in place")
+    args = parser.parse_args()
+
+    if args.db and args.sizes:
+        failures = run_db_sizes(args.sizes, args.samples, args.limit, args.scratch_db, args.keep_scratch)
+    elif args.db:
+        failures = run_db(args.samples, args.limit)
+    else:
+        sizes = args.sizes or [10_000, 100_000, 1_000_000]
+        failures = run_synthetic(sizes, args.samples, args.limit, args.reference_max)
+
+    print("\nOK: engine matches the reference" if not failures else f"\nFAILED: {failures} mismatches")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+LRU cache of /match/suggestions results, keyed by (user_id, limit).
+
+Suggestions only change when a profile or a message request changes, so
+the formatted result list is kept until one of these happens:
+
+- the user saves their own profile,
+- a user sharing one of their courses saves a profile (invalidate_users
+  with everyone on the saved profile's old and new courses),
+- a Message_Request between them is created or answered.
+
+Entries are evicted LRU-first beyond MATCH_CACHE_MAX_ENTRIES or
+MATCH_CACHE_MAX_BYTES. Like the chat cache, invalidation only reaches this
+worker. Every entry also expires MATCH_CACHE_TTL seconds after it was
+stored, which bounds how stale another worker's copy can be.
+
+Set MATCH_CACHE_MAX_ENTRIES=0 to turn the cache off.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from utils.metrics import CACHE_BYTES, CACHE_ENTRIES, CACHE_EVICTIONS, CACHE_REQUESTS, REGISTRY
+
+CACHE_NAME = "suggestions"
+
+MATCH_CACHE_MAX_ENTRIES = int(os.getenv("MATCH_CACHE_MAX_ENTRIES", "5000"))
+MATCH_CACHE_MAX_BYTES = int(os.getenv("MATCH_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+MATCH_CACHE_TTL = float(os.getenv("MATCH_CACHE_TTL", "60"))
+
+# invalidation counters are striped by user so a fill can tell whether it raced one
+_STRIPES = 256
+
+# rough per-row overhead (dict of ~16 columns) on top of the free-text fields
+_ROW_OVERHEAD = 1200
+
+
+def _rows_size(rows):
+    return sum(
+        _ROW_OVERHEAD + sys.getsizeof(r.get("bio") or "") + sys.getsizeof(r.get("profile_image_url") or "")
+        for r in rows
+    )
+
+
+class SuggestionsCache:
+    def __init__(self, max_entries=MATCH_CACHE_MAX_ENTRIES, max_bytes=MATCH_CACHE_MAX_BYTES,
+                 ttl=MATCH_CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # (user_id, limit) -> (rows, size, stored_at)
+        self._entries = OrderedDict()
+        # user_id -> limits cached for that user
+        self._limits = {}
+        self._bytes = 0
+        self._generations = [0] * _STRIPES
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry[1]
+        limits = self._limits.get(key[0])
+        if limits is not None:
+            limits.discard(key[1])
+            if not limits:
+                del self._limits[key[0]]
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            self._drop(next(iter(self._entries)))
+            CACHE_EVICTIONS.inc(cache=CACHE_NAME)
+
+    def get(self, user_id, limit):
+        """Cached rows, or None."""
+        key = (user_id, limit)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[2] > self.ttl:
+                self._drop(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        CACHE_REQUESTS.inc(cache=CACHE_NAME, result="miss" if entry is None else "hit")
+        return None if entry is None else entry[0]
+
+    def token(self, user_id):
+        """Take before computing the rows passed to put()."""
+        with self._lock:
+            return self._generations[user_id % _STRIPES]
+
+    def put(self, user_id, limit, rows, token):
+        """Store rows; skipped if the user was invalidated since `token` was taken."""
+        if not self.enabled:
+            return
+        size = _rows_size(rows)
+        key = (user_id, limit)
+        with self._lock:
+            if self._generations[user_id % _STRIPES] != token:
+                return
+            self._drop(key)
+            self._entries[key] = (rows, size, time.monotonic())
+            self._limits.setdefault(user_id, set()).add(limit)
+            self._bytes += size
+            self._evict()
+
+    def invalidate_users(self, user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._generations[user_id % _STRIPES] += 1
+                for limit in list(self._limits.get(user_id, ())):
+                    self._drop((user_id, limit))
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes}
+
+
+_cache = SuggestionsCache()
+
+
+def _collect_stats():
+    stats = _cache.stats()
+    CACHE_ENTRIES.set(stats["entries"], cache=CACHE_NAME)
+    CACHE_BYTES.set(stats["bytes"], cache=CACHE_NAME)
+
+
+REGISTRY.add_collector(_collect_stats)
+
+
+def get_suggestions_cache():
+    return _cache
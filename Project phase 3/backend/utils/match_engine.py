@@ -0,0 +1,366 @@
+"""
+In-memory, NumPy-vectorized StudyBuddy Match scoring.
+
+Every Match_Profile row is held as int-coded columns (one array per field)
+plus an N x K course matrix (each user's course ids, padded with -1). A
+suggestion request scores the caller against every profile in a handful of
+array operations instead of a GROUP BY over Match_Profile_Course joins.
+
+Rules, filters and ordering are exactly those of the GetStudyBuddyMatches
+procedure (which stays the reference -- see utils/match_benchmark.py for the
+parity check):
+  college +40, study_style +20, meeting_pref +15, study_goal +10,
+  focus_time_pref +5, noise_pref +5 (the caller's 'no preference' /
+  'all of the above' always scores), LEAST(shared_courses, 2) * 10,
+  age within 2 years +10 / within 4 +5;
+  shared_courses > 0, caller's age range, score >= 80, no pending/accepted
+  Message_Request either way; ORDER BY score DESC, shared DESC, user id.
+
+NULL is coded as -1 and never equals anything, like in SQL.
+
+Candidates come from a course -> users inverted index (utils/course_index.py):
+only users sharing a course with the caller are scored, so a request costs
+the size of the caller's courses rather than a scan of every profile.
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+
+from db import get_db_connection
+from utils.course_index import CourseIndex
+
+# seconds before a worker reloads profiles changed by other workers
+MATCH_ENGINE_TTL = float(os.getenv("MATCH_ENGINE_TTL", "300"))
+
+MIN_SCORE = 80
+NULL = -1
+
+# enum columns -> value codes; "any" is the caller value that always scores
+CATEGORIES = {
+    "study_style": (("solo", "pair", "group", "no preference"), "no preference", 20),
+    "meeting_pref": (("online", "in_person", "hybrid", "no preference"), "no preference", 15),
+    "study_goal": (("make friends", "ace tests", "review material", "all of the above"), "all of the above", 10),
+    "focus_time_pref": (("morning", "afternoon", "evening", "night", "no preference"), "no preference", 5),
+    "noise_pref": (("silent", "some noise", "background music", "no preference"), "no preference", 5),
+}
+
+PROFILE_SQL = """
+    SELECT
+        mp.user_id,
+        u.college_id,
+        mp.study_style,
+        mp.meeting_pref,
+        mp.study_goal,
+        mp.focus_time_pref,
+        mp.noise_pref,
+        mp.age,
+        mp.preferred_min_age,
+        mp.preferred_max_age
+    FROM Match_Profile mp
+    JOIN Users u ON u.user_id = mp.user_id
+"""
+COURSES_SQL = "SELECT user_id, course_id FROM Match_Profile_Course"
+
+
+def encode(field, value):
+    if value is None:
+        return NULL
+    values = CATEGORIES[field][0]
+    try:
+        return values.index(value)
+    except ValueError:
+        return NULL
+
+
+def _int_or_null(value):
+    return NULL if value is None else int(value)
+
+
+class ProfileTable:
+    """Columnar snapshot of all match profiles, rows sorted by user_id."""
+
+    def __init__(self, user_ids, columns, courses):
+        self.user_ids = user_ids            # int64[N], sorted
+        self.columns = columns              # name -> int array[N]
+        self.courses = courses              # int32[N, K], -1 padded
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    @classmethod
+    def from_rows(cls, profiles, course_rows):
+        """
+        profiles: (user_id, college_id, study_style, meeting_pref, study_goal,
+        focus_time_pref, noise_pref, age, min_age, max_age) sorted by user_id;
+        course_rows: (user_id, course_id).
+        """
+        n = len(profiles)
+        user_ids = np.fromiter((p[0] for p in profiles), dtype=np.int64, count=n)
+        columns = {
+            "college_id": np.fromiter((_int_or_null(p[1]) for p in profiles), dtype=np.int32, count=n),
+            "age": np.fromiter((_int_or_null(p[7]) for p in profiles), dtype=np.int16, count=n),
+            "min_age": np.fromiter((_int_or_null(p[8]) for p in profiles), dtype=np.int16, count=n),
+            "max_age": np.fromiter((_int_or_null(p[9]) for p in profiles), dtype=np.int16, count=n),
+        }
+        for i, field in enumerate(CATEGORIES, start=2):
+            columns[field] = np.fromiter((encode(field, p[i]) for p in profiles), dtype=np.int8, count=n)
+
+        by_user = {}
+        for user_id, course_id in course_rows:
+            by_user.setdefault(user_id, []).append(course_id)
+        width = max((len(c) for c in by_user.values()), default=1)
+        courses = np.full((n, max(width, 1)), NULL, dtype=np.int32)
+        rows = np.searchsorted(user_ids, np.fromiter(by_user, dtype=np.int64, count=len(by_user)))
+        for row, (user_id, course_ids) in zip(rows, by_user.items()):
+            if row < n and user_ids[row] == user_id:
+                courses[row, :len(course_ids)] = course_ids
+
+        return cls(user_ids, columns, courses)
+
+    def row_of(self, user_id):
+        row = int(np.searchsorted(self.user_ids, user_id))
+        if row < len(self.user_ids) and self.user_ids[row] == user_id:
+            return row
+        return None
+
+    def upsert(self, profile, course_ids):
+        """Copy of the table with one profile replaced or inserted."""
+        user_id = profile[0]
+        values = {
+            "college_id": _int_or_null(profile[1]),
+            "age": _int_or_null(profile[7]),
+            "min_age": _int_or_null(profile[8]),
+            "max_age": _int_or_null(profile[9]),
+        }
+        for i, field in enumerate(CATEGORIES, start=2):
+            values[field] = encode(field, profile[i])
+
+        course_ids = list(course_ids)
+        width = max(self.courses.shape[1], len(course_ids), 1)
+        courses = self.courses
+        if width > courses.shape[1]:
+            courses = np.pad(courses, ((0, 0), (0, width - courses.shape[1])), constant_values=NULL)
+        course_row = np.full(width, NULL, dtype=np.int32)
+        course_row[:len(course_ids)] = course_ids
+
+        row = self.row_of(user_id)
+        if row is not None:
+            columns = {name: col.copy() for name, col in self.columns.items()}
+            for name, value in values.items():
+                columns[name][row] = value
+            courses = courses.copy()
+            courses[row] = course_row
+            return ProfileTable(self.user_ids, columns, courses)
+
+        at = int(np.searchsorted(self.user_ids, user_id))
+        columns = {
+            name: np.insert(col, at, values[name]).astype(col.dtype)
+            for name, col in self.columns.items()
+        }
+        return ProfileTable(
+            np.insert(self.user_ids, at, user_id),
+            columns,
+            np.insert(courses, at, course_row, axis=0),
+        )
+
+    def remove(self, user_id):
+        row = self.row_of(user_id)
+        if row is None:
+            return self
+        return ProfileTable(
+            np.delete(self.user_ids, row),
+            {name: np.delete(col, row) for name, col in self.columns.items()},
+            np.delete(self.courses, row, axis=0),
+        )
+
+
+def indexed_rank(table, index, user_id, limit, blocked=()):
+    """rank() over just the users the course index says share a course."""
+    me = table.row_of(user_id)
+    if me is None:
+        return []
+    other_ids, shared = index.shared_counts(table.courses[me])
+    rows = np.searchsorted(table.user_ids, other_ids)
+    return rank(table, user_id, limit, blocked, candidates=rows, shared=shared)
+
+
+def pair_scores(table, index, user_id):
+    """
+    Every (other_user_id, score, shared) row Match_Score holds for user_id as
+    viewer: shares a course and scores >= 80. The age-range and message
+    request filters are left to read time, as in GetPrecomputedMatches.
+    """
+    me = table.row_of(user_id)
+    if me is None:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int16), np.empty(0, dtype=np.int16)
+    other_ids, shared = index.shared_counts(table.courses[me])
+    keep = other_ids != user_id
+    other_ids, shared = other_ids[keep], shared[keep]
+    score = score_rows(table, me, np.searchsorted(table.user_ids, other_ids), shared)
+    keep = score >= MIN_SCORE
+    return other_ids[keep], score[keep], shared[keep]
+
+
+def shared_course_counts(table, my_courses, candidates=None):
+    """Shared-course count for every row (or just `candidates` rows)."""
+    courses = table.courses if candidates is None else table.courses[candidates]
+    my_courses = np.asarray([c for c in my_courses if c != NULL], dtype=np.int32)
+    if my_courses.size == 0:
+        return np.zeros(len(courses), dtype=np.int16)
+    # courses are distinct per user (primary key), so a row-wise hit count is COUNT(DISTINCT)
+    return np.isin(courses, my_courses).sum(axis=1, dtype=np.int16)
+
+
+def score_rows(table, me, candidates, shared):
+    """Vectorized CalcMatchScore of row `me` against `candidates` rows."""
+    cols = table.columns
+    score = np.zeros(len(candidates), dtype=np.int16)
+
+    my_college = cols["college_id"][me]
+    if my_college != NULL:
+        score += 40 * (cols["college_id"][candidates] == my_college)
+
+    for field, (values, any_value, points) in CATEGORIES.items():
+        mine = cols[field][me]
+        if mine == NULL:
+            continue
+        if mine == values.index(any_value):
+            score += points
+        else:
+            score += points * (cols[field][candidates] == mine)
+
+    score += np.minimum(shared, 2).astype(np.int16) * 10
+
+    my_age = cols["age"][me]
+    if my_age != NULL:
+        ages = cols["age"][candidates]
+        diff = np.abs(ages.astype(np.int16) - my_age)
+        known = ages != NULL
+        score += np.where(known & (diff <= 2), 10, np.where(known & (diff <= 4), 5, 0)).astype(np.int16)
+
+    return score
+
+
+def rank(table, user_id, limit, blocked=(), candidates=None, shared=None):
+    """
+    Top `limit` matches for user_id as [(other_user_id, score, shared)], in
+    GetStudyBuddyMatches order. `blocked` are user ids with a pending or
+    accepted Message_Request either way; `candidates` optionally narrows the
+    scan to these row indices (must include every row sharing a course),
+    with their shared-course counts in `shared` if already known.
+    """
+    me = table.row_of(user_id)
+    if me is None or limit <= 0:
+        return []
+
+    if candidates is None:
+        candidates = np.arange(len(table), dtype=np.int64)
+    if shared is None:
+        shared = shared_course_counts(table, table.courses[me], candidates)
+
+    keep = (shared > 0) & (candidates != me)
+    candidates, shared = candidates[keep], shared[keep]
+
+    cols = table.columns
+    lo, hi = cols["min_age"][me], cols["max_age"][me]
+    if lo != NULL and hi != NULL:
+        ages = cols["age"][candidates]
+        keep = (ages == NULL) | ((ages >= lo) & (ages <= hi))
+        candidates, shared = candidates[keep], shared[keep]
+
+    if len(blocked):
+        keep = ~np.isin(table.user_ids[candidates], np.asarray(list(blocked), dtype=np.int64))
+        candidates, shared = candidates[keep], shared[keep]
+
+    score = score_rows(table, me, candidates, shared)
+    keep = score >= MIN_SCORE
+    candidates, shared, score = candidates[keep], shared[keep], score[keep]
+
+    ids = table.user_ids[candidates]
+    order = np.lexsort((ids, -shared.astype(np.int32), -score.astype(np.int32)))[:limit]
+    return [(int(ids[i]), int(score[i]), int(shared[i])) for i in order]
+
+
+class MatchEngine:
+    def __init__(self, ttl=MATCH_ENGINE_TTL, connect=get_db_connection):
+        self.ttl = ttl
+        self._connect = connect
+        self._table = None
+        self._index = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _fetch(self, user_id=None):
+        """(profile rows, course rows) for everyone, or for one user."""
+        conn = self._connect()
+        cur = conn.cursor()
+        try:
+            if user_id is None:
+                cur.execute(PROFILE_SQL + " ORDER BY mp.user_id")
+                profiles = cur.fetchall()
+                cur.execute(COURSES_SQL + " ORDER BY user_id, course_id")
+                courses = cur.fetchall()
+            else:
+                cur.execute(PROFILE_SQL + " WHERE mp.user_id = %s", (user_id,))
+                profiles = cur.fetchall()
+                cur.execute(COURSES_SQL + " WHERE user_id = %s ORDER BY course_id", (user_id,))
+                courses = cur.fetchall()
+        finally:
+            cur.close()
+            conn.close()
+        return profiles, courses
+
+    def _snapshot(self):
+        """(table, course index) as of one moment, reloading once older than the TTL."""
+        if self._table is None or time.monotonic() - self._loaded_at > self.ttl:
+            with self._lock:
+                if self._table is None or time.monotonic() - self._loaded_at > self.ttl:
+                    table = ProfileTable.from_rows(*self._fetch())
+                    self._table, self._index = table, CourseIndex.from_table(table)
+                    self._loaded_at = time.monotonic()
+        with self._lock:
+            return self._table, self._index
+
+    def table(self):
+        return self._snapshot()[0]
+
+    def refresh_user(self, user_id):
+        """
+        Re-read one profile after this worker committed an upsert (the
+        procedure fills in default age ranges). Other workers see the
+        change after their TTL.
+        """
+        if self._table is None:
+            return
+        profiles, courses = self._fetch(user_id)
+        with self._lock:
+            if self._table is None:
+                return
+            row = self._table.row_of(user_id)
+            old_courses = self._table.courses[row] if row is not None else ()
+            new_courses = [c for _, c in courses] if profiles else ()
+            if profiles:
+                self._table = self._table.upsert(profiles[0], new_courses)
+            else:
+                self._table = self._table.remove(user_id)
+            self._index = self._index.update(user_id, old_courses, new_courses)
+
+    def suggest(self, user_id, limit, blocked=()):
+        table, index = self._snapshot()
+        return indexed_rank(table, index, user_id, limit, blocked)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_match_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = MatchEngine()
+    return _engine
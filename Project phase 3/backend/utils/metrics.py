@@ -0,0 +1,295 @@
+"""
+Minimal in-process metrics registry rendered in the Prometheus text format.
+
+Every request is timed by hooks installed in init_app(); /metrics (see
+routes/monitoring_routes.py) renders the registry for a Prometheus scrape.
+Values are per worker process -- Prometheus sums them across workers.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, request
+
+from db import add_pool_listener, add_statement_listener, get_pool
+
+# seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# bytes
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+# statements per request
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    pairs.extend(f'{n}="{_escape(v)}"' for n, v in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        lines = self.header()
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # per-bucket (non-cumulative) counts + one overflow slot, sum
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][idx] += 1
+            state[1] += value
+
+    def render(self):
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1])) for k, v in self._values.items())
+        lines = self.header()
+        for key, (counts, total) in items:
+            running = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                running += count
+                labels = _format_labels(self.labelnames, key, (("le", _format_value(bound)),))
+                lines.append(f"{self.name}_bucket{labels} {running}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {running}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self.register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self.register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def add_collector(self, fn):
+        """fn() runs right before each render, e.g. to refresh gauges."""
+        self._collectors.append(fn)
+
+    def render(self):
+        for fn in self._collectors:
+            fn()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "studybuddy_http_requests_total",
+    "HTTP requests handled.",
+    ("blueprint", "endpoint", "method", "status"),
+)
+HTTP_LATENCY = REGISTRY.histogram(
+    "studybuddy_http_request_duration_seconds",
+    "Time spent producing the response.",
+    ("blueprint", "endpoint", "method"),
+)
+HTTP_RESPONSE_SIZE = REGISTRY.histogram(
+    "studybuddy_http_response_size_bytes",
+    "Response body size.",
+    ("blueprint", "endpoint"),
+    buckets=SIZE_BUCKETS,
+)
+HTTP_DB_TIME = REGISTRY.histogram(
+    "studybuddy_http_request_db_seconds",
+    "Time spent in MySQL calls per request.",
+    ("blueprint", "endpoint"),
+)
+HTTP_DB_QUERIES = REGISTRY.histogram(
+    "studybuddy_http_request_db_queries",
+    "SQL statements / procedure calls issued per request.",
+    ("blueprint", "endpoint"),
+    buckets=QUERY_COUNT_BUCKETS,
+)
+
+DB_STATEMENT_LATENCY = REGISTRY.histogram(
+    "studybuddy_db_statement_duration_seconds",
+    "Execution time per statement or stored procedure.",
+    ("statement",),
+)
+DB_SLOW_STATEMENTS = REGISTRY.counter(
+    "studybuddy_db_slow_statements_total",
+    "Statements slower than DB_SLOW_QUERY_MS.",
+    ("statement",),
+)
+DB_N_PLUS_ONE = REGISTRY.counter(
+    "studybuddy_db_n_plus_one_total",
+    "Requests that repeated one statement shape DB_N_PLUS_ONE_THRESHOLD+ times.",
+    ("endpoint", "statement"),
+)
+
+POOL_CONNECTIONS = REGISTRY.gauge(
+    "studybuddy_db_pool_connections",
+    "Pooled MySQL connections by state.",
+    ("state",),
+)
+POOL_WAITING = REGISTRY.gauge(
+    "studybuddy_db_pool_waiting",
+    "Threads waiting for a pooled connection.",
+)
+POOL_CHECKOUTS = REGISTRY.counter(
+    "studybuddy_db_pool_checkouts_total",
+    "Connections handed out by the pool since startup.",
+)
+POOL_TIMEOUTS = REGISTRY.counter(
+    "studybuddy_db_pool_timeouts_total",
+    "Checkouts that gave up waiting for a connection.",
+)
+
+CACHE_REQUESTS = REGISTRY.counter(
+    "studybuddy_cache_requests_total",
+    "In-process cache lookups by result (hit/miss).",
+    ("cache", "result"),
+)
+CACHE_EVICTIONS = REGISTRY.counter(
+    "studybuddy_cache_evictions_total",
+    "Entries dropped to stay under a cache's size limits.",
+    ("cache",),
+)
+CACHE_ENTRIES = REGISTRY.gauge(
+    "studybuddy_cache_entries",
+    "Entries currently held by an in-process cache.",
+    ("cache",),
+)
+CACHE_BYTES = REGISTRY.gauge(
+    "studybuddy_cache_bytes",
+    "Approximate memory held by an in-process cache.",
+    ("cache",),
+)
+
+
+def _collect_pool_stats():
+    stats = get_pool().stats()
+    POOL_CONNECTIONS.set(stats["idle"], state="idle")
+    POOL_CONNECTIONS.set(stats["in_use"], state="in_use")
+    POOL_WAITING.set(stats["waiting"])
+
+
+REGISTRY.add_collector(_collect_pool_stats)
+
+
+def _record_pool_event(event):
+    if event == "checkout":
+        POOL_CHECKOUTS.inc()
+    elif event == "timeout":
+        POOL_TIMEOUTS.inc()
+
+
+add_pool_listener(_record_pool_event)
+
+
+def _record_statement(label, elapsed, slow, n_plus_one):
+    DB_STATEMENT_LATENCY.observe(elapsed, statement=label)
+    if slow:
+        DB_SLOW_STATEMENTS.inc(statement=label)
+    if n_plus_one:
+        DB_N_PLUS_ONE.inc(endpoint=request.endpoint or "unmatched", statement=label)
+
+
+def _start_timer():
+    g.metrics_started = time.perf_counter()
+
+
+def _record_request(response):
+    started = g.pop("metrics_started", None)
+    if started is None:
+        return response
+
+    blueprint = request.blueprint or ""
+    endpoint = request.endpoint or "unmatched"
+
+    HTTP_REQUESTS.inc(
+        blueprint=blueprint, endpoint=endpoint,
+        method=request.method, status=response.status_code,
+    )
+    HTTP_LATENCY.observe(
+        time.perf_counter() - started,
+        blueprint=blueprint, endpoint=endpoint, method=request.method,
+    )
+    # streamed responses (send_file, SSE) have no length up front
+    if response.content_length is not None:
+        HTTP_RESPONSE_SIZE.observe(response.content_length, blueprint=blueprint, endpoint=endpoint)
+    HTTP_DB_TIME.observe(g.get("db_seconds", 0.0), blueprint=blueprint, endpoint=endpoint)
+    HTTP_DB_QUERIES.observe(g.get("db_queries", 0), blueprint=blueprint, endpoint=endpoint)
+    return response
+
+
+def init_app(app):
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
+    add_statement_listener(_record_statement)
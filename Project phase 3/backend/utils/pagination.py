@@ -0,0 +1,46 @@
+"""
+Opaque cursors for keyset ("seek") pagination.
+
+A cursor is the sort key of the last row a client saw, as URL-safe base64
+JSON. Clients pass it back unchanged (?before=<cursor>) and never parse it,
+so the key can change shape later without breaking them.
+"""
+
+import base64
+import json
+
+# response header carrying the cursor for the next page; absent on the last page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(key):
+    raw = json.dumps(key, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(str(e))
+    if not isinstance(key, dict):
+        raise InvalidCursor("cursor must encode an object")
+    return key
+
+
+def cursor_id(cursor, field="id"):
+    """Decode a cursor whose key is a single integer id (message pages)."""
+    key = decode_cursor(cursor)
+    if key is None:
+        return None
+    value = key.get(field)
+    if not isinstance(value, int):
+        raise InvalidCursor(f"cursor is missing '{field}'")
+    return value
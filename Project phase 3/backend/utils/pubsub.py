@@ -0,0 +1,202 @@
+"""
+Publish/subscribe for server-pushed events (Server-Sent Events).
+
+Routes publish small JSON-able dicts to a channel ("chat:<group_id>", ...)
+and SSE endpoints subscribe to it. Each worker process has one broker:
+
+- InMemoryBroker (PUBSUB_BACKEND=memory, default): fan-out inside this
+  process only. Fine for the single-process dev server.
+- RedisBroker (PUBSUB_BACKEND=redis, REDIS_URL=...): every publish goes
+  through Redis so subscribers on any worker receive it. Needs the optional
+  `redis` package.
+"""
+
+import json
+import os
+import queue
+import threading
+from collections import defaultdict
+
+# per-subscriber backlog before we give up on a slow client
+SUBSCRIBER_QUEUE_SIZE = 256
+# SSE comment sent when nothing happened for this many seconds
+HEARTBEAT_SECONDS = 15
+
+_CLOSED = object()
+
+
+class SubscriptionClosed(Exception):
+    pass
+
+
+class Subscription:
+    def __init__(self, hub, channel):
+        self.hub = hub
+        self.channel = channel
+        self._queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.closed = False
+
+    def _put(self, payload):
+        try:
+            self._queue.put_nowait(payload)
+        except queue.Full:
+            # client can't keep up; end its stream, EventSource reconnects
+            self.hub._remove(self)
+            self.closed = True
+            try:
+                self._queue.get_nowait()
+                self._queue.put_nowait(_CLOSED)
+            except (queue.Empty, queue.Full):
+                pass
+
+    def get(self, timeout=None):
+        """Next payload, None on timeout; SubscriptionClosed once dropped."""
+        try:
+            payload = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if payload is _CLOSED:
+            raise SubscriptionClosed()
+        return payload
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.hub._remove(self)
+
+
+class InMemoryBroker:
+    """Fans events out to subscribers in this process."""
+
+    def __init__(self):
+        self._subs = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        sub = Subscription(self, channel)
+        with self._lock:
+            self._subs[channel].add(sub)
+        return sub
+
+    def _remove(self, sub):
+        with self._lock:
+            subs = self._subs.get(sub.channel)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subs[sub.channel]
+
+    def _deliver(self, channel, payload):
+        with self._lock:
+            subs = list(self._subs.get(channel, ()))
+        for sub in subs:
+            sub._put(payload)
+
+    def subscriber_count(self, channel=None):
+        with self._lock:
+            if channel is not None:
+                return len(self._subs.get(channel, ()))
+            return sum(len(s) for s in self._subs.values())
+
+    def publish(self, channel, payload):
+        self._deliver(channel, payload)
+
+
+class RedisBroker(InMemoryBroker):
+    """
+    Publishes through Redis; one listener thread per worker pattern-subscribes
+    to every StudyBuddy channel and fans messages out locally.
+    """
+
+    def __init__(self, url, prefix="studybuddy:"):
+        import redis  # optional dependency, only needed for PUBSUB_BACKEND=redis
+
+        super().__init__()
+        self._prefix = prefix
+        self._redis = redis.Redis.from_url(url)
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.psubscribe(f"{prefix}*")
+        self._thread = threading.Thread(target=self._listen, name="pubsub-listener", daemon=True)
+        self._thread.start()
+
+    def _listen(self):
+        for message in self._pubsub.listen():
+            if message.get("type") != "pmessage":
+                continue
+            channel = message["channel"]
+            if isinstance(channel, bytes):
+                channel = channel.decode()
+            try:
+                payload = json.loads(message["data"])
+            except (TypeError, ValueError):
+                continue
+            self._deliver(channel[len(self._prefix):], payload)
+
+    def publish(self, channel, payload):
+        self._redis.publish(f"{self._prefix}{channel}", json.dumps(payload, default=str))
+
+
+_broker = None
+_broker_pid = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker, _broker_pid
+    if _broker is not None and _broker_pid == os.getpid():
+        return _broker
+
+    with _broker_lock:
+        if _broker is None or _broker_pid != os.getpid():
+            backend = os.getenv("PUBSUB_BACKEND", "memory").strip().lower()
+            if backend == "redis":
+                _broker = RedisBroker(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+            else:
+                _broker = InMemoryBroker()
+            _broker_pid = os.getpid()
+        return _broker
+
+
+def format_sse(data, event=None, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def sse_stream(sub, event=None, id_key=None, initial=()):
+    """
+    Generator of SSE frames for a subscription, with heartbeat comments so
+    proxies keep the connection open. A payload's "type" key, if present,
+    overrides the default event name. Unsubscribes when the client leaves.
+
+    `initial` payloads (a replay of what the client missed) go out first.
+    With an `id_key`, ids must increase: live payloads at or below the last
+    replayed id are skipped, so a replay never duplicates a live event.
+    """
+    last_id = None
+    try:
+        yield "retry: 3000\n\n"
+        for payload in initial:
+            if id_key:
+                last_id = payload.get(id_key)
+            yield format_sse(payload, payload.get("type", event), last_id)
+
+        while True:
+            try:
+                payload = sub.get(timeout=HEARTBEAT_SECONDS)
+            except SubscriptionClosed:
+                return
+            if payload is None:
+                yield ": keep-alive\n\n"
+                continue
+
+            event_id = payload.get(id_key) if id_key else None
+            if last_id is not None and event_id is not None and event_id <= last_id:
+                continue
+            yield format_sse(payload, payload.get("type", event), event_id)
+    finally:
+        sub.close()
@@ -0,0 +1,126 @@
+"""
+Serving /uploads: caching headers, conditional requests and byte ranges.
+
+Two kinds of file live under UPLOAD_FOLDER:
+
+- Content-addressed, never rewritten: resources saved as <sha256>.<ext> and
+  profile image variants (<upload id>_<variant>.<ext>, written once). The
+  name is the version, so they get a strong ETag derived from it and
+  `Cache-Control: public, max-age=1 year, immutable`. Browsers never ask
+  for them again.
+- Anything else (older uploads stored under their original name, which a
+  later upload of the same name overwrote). These get `no-cache` plus an
+  mtime/size ETag, so a repeat load is a cheap 304 unless the file changed.
+
+Both answer If-None-Match / If-Modified-Since with 304 and honour Range
+(and If-Range) requests. A video player can then seek and resume without
+downloading the whole file again.
+
+UPLOADS_SENDFILE hands the bytes to the front-end server instead of a
+Python worker. Flask still does the headers and 304s:
+  x-sendfile -- X-Sendfile: <path> (Apache mod_xsendfile, lighttpd)
+  x-accel    -- X-Accel-Redirect: UPLOADS_ACCEL_PREFIX/<file> (nginx internal location)
+Without it, werkzeug hands whole-file responses to the WSGI server's
+wsgi.file_wrapper, which gunicorn serves with sendfile().
+"""
+
+import hashlib
+import mimetypes
+import os
+import re
+import tempfile
+from urllib.parse import quote
+
+from flask import current_app, request, send_file
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+
+from utils.image_pipeline import is_variant_name
+
+UPLOADS_SENDFILE = os.getenv("UPLOADS_SENDFILE", "").strip().lower()
+UPLOADS_ACCEL_PREFIX = os.getenv("UPLOADS_ACCEL_PREFIX", "/protected-uploads/")
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+_SHA256_NAME = re.compile(r"^([0-9a-f]{64})\.[a-z0-9]+$")
+
+# bytes read per chunk while hashing an upload
+_HASH_CHUNK = 1024 * 1024
+
+
+def content_etag(filename):
+    """Strong ETag for a content-addressed / write-once name, else None."""
+    name = os.path.basename(filename)
+    match = _SHA256_NAME.match(name)
+    if match:
+        return match.group(1)
+    if is_variant_name(name):
+        return name.replace(".", "-")
+    return None
+
+
+def save_content_addressed(file_storage, folder, ext):
+    """
+    Stream an upload to <sha256>.<ext> in folder and return that name.
+    Identical uploads share one file.
+    """
+    os.makedirs(folder, exist_ok=True)
+    digest = hashlib.sha256()
+    fd, tmp = tempfile.mkstemp(dir=folder, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = file_storage.stream.read(_HASH_CHUNK)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+        name = f"{digest.hexdigest()}.{ext.lower()}"
+        os.replace(tmp, os.path.join(folder, name))
+        return name
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _cache_headers(response, immutable):
+    if immutable:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+
+def _accel_redirect(path, filename, etag):
+    """Empty response nginx fills from its internal location."""
+    stat = os.stat(path)
+    response = current_app.response_class(
+        mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    )
+    response.headers["X-Accel-Redirect"] = UPLOADS_ACCEL_PREFIX.rstrip("/") + "/" + quote(filename)
+    response.set_etag(etag or f"{stat.st_mtime_ns:x}-{stat.st_size:x}")
+    response.last_modified = int(stat.st_mtime)
+    # nginx does ranges itself; only answer the conditional here
+    return response.make_conditional(request)
+
+
+def send_upload(folder, filename):
+    path = safe_join(folder, filename)
+    if path is None or not os.path.isfile(path):
+        raise NotFound()
+
+    etag = content_etag(filename)
+    if UPLOADS_SENDFILE == "x-accel":
+        response = _accel_redirect(path, filename, etag)
+    else:
+        # conditional=True: 304s plus Range / If-Range (206, 416)
+        response = send_file(path, conditional=True, etag=etag or True)
+    return _cache_headers(response, immutable=etag is not None)
+
+
+def init_app(app):
+    if UPLOADS_SENDFILE == "x-sendfile":
+        app.config["USE_X_SENDFILE"] = True
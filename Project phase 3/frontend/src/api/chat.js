@@ -8,6 +8,16 @@ export async function getChatMessages(groupId, limit = 50) {
   return res.json();
 }
 
+// Only messages newer than afterId (oldest first); [] when nothing is new.
+export async function getChatMessagesAfter(groupId, afterId, limit = 50) {
+  const res = await fetch(
+    `${API_BASE}/groups/${groupId}/chat?after_id=${afterId}&limit=${limit}`
+  );
+  if (res.status === 204) return [];
+  if (!res.ok) throw new Error("Failed to load chat");
+  return res.json();
+}
+
 export async function sendChatMessage(groupId, userId, content) {
   const res = await fetch(`${API_BASE}/groups/${groupId}/chat`, {
     method: "POST",
@@ -19,3 +29,35 @@ export async function sendChatMessage(groupId, userId, content) {
   return res.json();
 }
 
+// Mark the group's chat read up to messageId (or everything when omitted).
+export async function markChatRead(groupId, userId, messageId = null) {
+  const res = await fetch(`${API_BASE}/groups/${groupId}/chat/read`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ user_id: userId, message_id: messageId }),
+  });
+
+  if (!res.ok) throw new Error("Failed to mark chat read");
+  return res.json();
+}
+
+
+// Live chat: Server-Sent Events stream of new messages for a group.
+// Pass afterId (the newest message_id already loaded) and the server first
+// replays anything newer, so nothing sent before the stream opened is lost.
+// Returns the EventSource (call .close() on unmount), or null when the
+// browser has no EventSource support so the caller can fall back to polling.
+export function openChatStream(groupId, onMessage, afterId = null) {
+  if (typeof window === "undefined" || !window.EventSource) return null;
+
+  const query = afterId != null ? `?after_id=${afterId}` : "";
+  const source = new EventSource(`${API_BASE}/groups/${groupId}/chat/stream${query}`);
+  source.addEventListener("message", (e) => {
+    try {
+      onMessage(JSON.parse(e.data));
+    } catch (err) {
+      console.error("Bad chat event:", err);
+    }
+  });
+  return source;
+}
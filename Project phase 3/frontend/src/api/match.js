@@ -44,9 +44,19 @@ export async function saveMatchProfile(payload) {
   });
 }
 
+/**
+ * URL of a resized profile image variant ("avatar" | "card" | "full").
+ * Uploads return the full JPEG URL (<id>_full.jpg); older uploads have no
+ * variants and are returned unchanged.
+ */
+export function imageVariant(url, variant, ext = "webp") {
+  if (!url) return url;
+  return url.replace(/_full\.jpg$/, `_${variant}.${ext}`);
+}
+
 /**
  * Upload a profile image file
- * Returns: { url }
+ * Returns: { url, variants: { avatar|card|full: { webp, jpg } } }
  */
 export async function uploadProfileImage(file) {
   const formData = new FormData();
@@ -116,6 +126,21 @@ export async function fetchInbox(userId, limit = 50) {
   return apiFetch(`/dm/inbox?${params.toString()}`);
 }
 
+// Move the user's read marker forward (to messageId, or the latest message).
+export async function markDirectMessagesRead(conversationId, userId, messageId = null) {
+  return apiFetch(`/dm/${conversationId}/read`, {
+    method: "POST",
+    body: JSON.stringify({ user_id: userId, message_id: messageId }),
+  });
+}
+
+// All unread counts for badges in one call:
+// { dm: { [conversationId]: n }, groups: { [groupId]: n }, total }
+export async function fetchUnreadCounts(userId) {
+  const params = new URLSearchParams({ user_id: String(userId) });
+  return apiFetch(`/unread?${params.toString()}`);
+}
+
 export async function fetchMessageRequests(userId, limit = 50) {
   const params = new URLSearchParams({
     user_id: String(userId),
@@ -140,3 +165,29 @@ export async function respondToMessageRequest(requestId, action, userId) {
   }
   return res.json();
 }
+
+// Live DM events for one user over Server-Sent Events. handlers may have
+// onDm(msg), onMessageRequest(req) and onRequestResponse(res). Returns the
+// EventSource (call .close() when done), or null without EventSource support.
+export function openUserEventStream(userId, handlers = {}) {
+  if (typeof window === "undefined" || !window.EventSource) return null;
+
+  const params = new URLSearchParams({ user_id: String(userId) });
+  const source = new EventSource(`${API_BASE}/dm/stream?${params.toString()}`);
+
+  const listen = (event, handler) => {
+    if (!handler) return;
+    source.addEventListener(event, (e) => {
+      try {
+        handler(JSON.parse(e.data));
+      } catch (err) {
+        console.error(`Bad ${event} event:`, err);
+      }
+    });
+  };
+
+  listen("dm", handlers.onDm);
+  listen("message_request", handlers.onMessageRequest);
+  listen("request_response", handlers.onRequestResponse);
+  return source;
+}
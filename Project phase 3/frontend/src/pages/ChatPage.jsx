@@ -1,7 +1,25 @@
 // Jacob Craig
 
 import { useEffect, useState, useRef } from "react";
-import { getChatMessages, sendChatMessage } from "../api/chat.js";
+import {
+  getChatMessages,
+  getChatMessagesAfter,
+  sendChatMessage,
+  openChatStream,
+} from "../api/chat.js";
+
+// add incoming messages by message_id, oldest first, skipping ones we already have
+function mergeMessages(prev, incoming) {
+  const seen = new Set(prev.map((m) => m.message_id));
+  const added = incoming.filter((m) => !seen.has(m.message_id));
+  if (!added.length) return prev;
+  return [...prev, ...added].sort((a, b) => a.message_id - b.message_id);
+}
+
+// after_id cursor for delta reads and the stream: newest message we hold, or null
+function lastMessageId(list) {
+  return list.length ? list[list.length - 1].message_id : null;
+}
 
 export default function ChatPage({ groupId, groupName, userId, onBack }) {
   const [messages, setMessages] = useState([]);
@@ -9,6 +27,8 @@ export default function ChatPage({ groupId, groupName, userId, onBack }) {
   const [error, setError] = useState("");
   const [loading, setLoading] = useState(false);
   const bottomRef = useRef(null);
+  const messagesRef = useRef([]);
+  const groupRef = useRef(groupId);
 
   const loadMessages = async () => {
     setError("");
@@ -16,19 +36,70 @@ export default function ChatPage({ groupId, groupName, userId, onBack }) {
     try {
       const data = await getChatMessages(groupId, 50);
       console.log("Loaded messages:", data);
-      setMessages(Array.isArray(data) ? [...data].reverse() : []);
+      // the user switched groups while this was in flight
+      if (groupRef.current !== groupId) return null;
+      const loaded = Array.isArray(data) ? [...data].reverse() : [];
+      // merge, don't replace: a stream event may already be in state
+      setMessages((prev) => mergeMessages(prev, loaded));
+      return loaded;
     } catch (err) {
       console.error("Error loading chat:", err);
       setError(err.message || "Failed to load chat messages");
+      return null;
     } finally {
       setLoading(false);
     }
   };
 
+  // polling fallback: ask only for messages newer than the last one we have
+  const loadNewMessages = async () => {
+    const lastId = lastMessageId(messagesRef.current);
+    if (lastId == null) return loadMessages();
+    try {
+      const fresh = await getChatMessagesAfter(groupId, lastId, 50);
+      if (fresh.length) setMessages((prev) => mergeMessages(prev, fresh));
+    } catch (err) {
+      console.error("Error loading chat:", err);
+      setError(err.message || "Failed to load chat messages");
+    }
+  };
+
+  useEffect(() => {
+    messagesRef.current = messages;
+  }, [messages]);
+
   useEffect(() => {
-    loadMessages();
-    const id = setInterval(loadMessages, 5000); // poll every 5s
-    return () => clearInterval(id);
+    let cancelled = false;
+    let stream = null;
+    let pollId = null;
+
+    groupRef.current = groupId;
+    messagesRef.current = [];
+    setMessages([]);
+
+    // history first, then subscribe with the same after_id cursor the
+    // polling fallback uses: the server replays anything committed in
+    // between, so nothing falls in the gap (0 = an empty chat: replay all)
+    loadMessages().then((loaded) => {
+      if (cancelled) return;
+      const afterId = loaded ? lastMessageId(loaded) ?? 0 : null;
+
+      // new messages are pushed over SSE; only poll if the browser can't stream
+      stream = openChatStream(
+        groupId,
+        (msg) => setMessages((prev) => mergeMessages(prev, [msg])),
+        afterId
+      );
+      if (!stream) {
+        pollId = setInterval(loadNewMessages, 5000); // poll every 5s
+      }
+    });
+
+    return () => {
+      cancelled = true;
+      if (stream) stream.close();
+      if (pollId) clearInterval(pollId);
+    };
   }, [groupId]);
 
   // auto-scroll whenever messages change
@@ -46,7 +117,8 @@ export default function ChatPage({ groupId, groupName, userId, onBack }) {
     try {
       await sendChatMessage(groupId, userId, input.trim());
       setInput("");
-      await loadMessages();
+      // the chat stream delivers our own message too
+      if (!window.EventSource) await loadNewMessages();
     } catch (err) {
       console.error("Error sending message:", err);
       setError(err.message || "Failed to send message");
@@ -1,6 +1,6 @@
 // Jacob Craig
 
-import { useEffect, useState } from "react";
+import { useEffect, useRef, useState } from "react";
 import {
   saveMatchProfile,
   fetchMatchSuggestions,
@@ -12,6 +12,8 @@ import {
   fetchInbox,
   fetchMessageRequests,
   respondToMessageRequest,
+  openUserEventStream,
+  imageVariant,
 } from "../api/match";
 import { searchCourses } from "../api/studygroups";
 import { API_BASE } from "../api/base";
@@ -62,6 +64,12 @@ export default function StudyBuddyMatch() {
 
   const [selectedMatch, setSelectedMatch] = useState(null); // profile popup
 
+  // live event handlers read the open conversation through this ref
+  const activeConversationRef = useRef(null);
+  useEffect(() => {
+    activeConversationRef.current = activeConversation;
+  }, [activeConversation]);
+
   // ---------------------------
   // 1) Load logged-in user
   // ---------------------------
@@ -152,6 +160,50 @@ export default function StudyBuddyMatch() {
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [showChatDock, hasProfile, currentUser]);
 
+  // Live DMs / message requests / request responses while the dock is open
+  useEffect(() => {
+    const userId = currentUser?.user_id;
+    if (!showChatDock || !hasProfile || !userId) return;
+
+    const source = openUserEventStream(userId, {
+      onDm: (msg) => {
+        const convo = activeConversationRef.current;
+        if (convo && convo.conversation_id === msg.conversation_id) {
+          setDmMessages((prev) =>
+            prev.some((m) => m.message_id === msg.message_id)
+              ? prev
+              : [
+                  ...prev,
+                  {
+                    ...msg,
+                    first_name: convo.partner.first_name,
+                    last_name: convo.partner.last_name,
+                  },
+                ]
+          );
+        }
+        loadInbox();
+      },
+      onMessageRequest: () => loadInbox(),
+      onRequestResponse: (res) => {
+        setActiveConversation((prev) => {
+          if (!prev || prev.conversation_id !== res.conversation_id) return prev;
+          return {
+            ...prev,
+            requestStatus: res.request_status,
+            isRequestFlow: res.request_status === "pending",
+          };
+        });
+        loadInbox();
+      },
+    });
+
+    return () => {
+      if (source) source.close();
+    };
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [showChatDock, hasProfile, currentUser]);
+
   function handleChange(e) {
     const { name, value } = e.target;
     setProfile((prev) => ({
@@ -750,7 +802,7 @@ export default function StudyBuddyMatch() {
                     {profile.profile_image_url && (
                       <div style={{ marginTop: "0.5rem" }}>
                         <img
-                          src={profile.profile_image_url}
+                          src={imageVariant(profile.profile_image_url, "avatar")}
                           alt="Profile preview"
                           style={{
                             width: "64px",
@@ -984,7 +1036,7 @@ export default function StudyBuddyMatch() {
                         >
                           {m.profile_image_url ? (
                             <img
-                              src={m.profile_image_url}
+                              src={imageVariant(m.profile_image_url, "avatar")}
                               alt={`${m.first_name} ${m.last_name}`}
                               style={{
                                 width: "44px",
@@ -1404,7 +1456,7 @@ export default function StudyBuddyMatch() {
             >
               {selectedMatch.profile_image_url && (
                 <img
-                  src={selectedMatch.profile_image_url}
+                  src={imageVariant(selectedMatch.profile_image_url, "avatar")}
                   alt={`${selectedMatch.first_name} ${selectedMatch.last_name}`}
                   style={{
                     width: "72px",